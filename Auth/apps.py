@@ -1,6 +1,26 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import post_migrate
 
 
 class AuthConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Auth'
+
+    def ready(self):
+        # connects signals which invalidate cached roles and revoke signed tokens
+        from . import roles, tokens  # noqa: F401
+        post_migrate.connect(_create_user_email_index, sender=self)
+
+
+def _create_user_email_index(using: str, **kwargs) -> None:
+    """Index email of auth.User, which is looked up by uniqueness check of UserSerializer.
+
+    auth.User is not a model of this app, so the index can't be declared in its Meta.
+    """
+    from django.contrib.auth.models import User
+
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS auth_user_email_idx "
+                       f"ON {connection.ops.quote_name(User._meta.db_table)} (email)")
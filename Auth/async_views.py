@@ -0,0 +1,91 @@
+"""Async views of registration and password change.
+
+Passwords are hashed in Auth.hashing.password_hash_pool, so under ASGI a burst of
+registrations doesn't block event loop and thread of sync views.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.http import HttpRequest, JsonResponse, QueryDict
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from rest_framework import exceptions
+
+from common.async_views import aauthenticate, limit_db_connections
+from common.views import is_superuser
+from .hashing import password_hash_pool, PasswordHashingOverloaded
+from .models import UserSerializer, UserUpdateSerializer
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@limit_db_connections
+async def registration(request: HttpRequest) -> JsonResponse:
+    try:
+        user = await aauthenticate(request)
+    except exceptions.AuthenticationFailed as exc:
+        return JsonResponse({"detail": exc.detail}, status=401)
+    if user is not None:
+        return JsonResponse({"detail": "You do not have permission to perform this action."}, status=403)
+
+    serializer = UserSerializer(data=_get_request_data(request))
+    # uniqueness of username and email is checked with queries
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse(serializer.errors, status=400)
+    try:
+        password = await password_hash_pool.make_password(serializer.validated_data["password"])
+    except PasswordHashingOverloaded:
+        return _overloaded_response()
+    user = await sync_to_async(serializer.save)(password=password)
+    return JsonResponse({"id": user.id}, status=201)
+
+
+@csrf_exempt
+@require_http_methods(["PUT", "PATCH"])
+@limit_db_connections
+async def change_password(request: HttpRequest, pk: int) -> JsonResponse:
+    try:
+        user = await aauthenticate(request)
+    except exceptions.AuthenticationFailed as exc:
+        return JsonResponse({"detail": exc.detail}, status=401)
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+    # like DRF, so middlewares see authenticated user
+    request.user = user
+    if not await sync_to_async(is_superuser)(user):
+        return JsonResponse({"detail": "You do not have permission to perform this action."}, status=403)
+
+    instance = await User.objects.filter(pk=pk).afirst()
+    if instance is None:
+        return JsonResponse({"detail": "No User matches the given query."}, status=404)
+    serializer = UserUpdateSerializer(instance, data=_get_request_data(request),
+                                      partial=request.method == "PATCH")
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+
+    if "password" in serializer.validated_data:
+        try:
+            instance.password = await password_hash_pool.make_password(serializer.validated_data["password"])
+        except PasswordHashingOverloaded:
+            return _overloaded_response()
+        await instance.asave(update_fields=["password"])
+    return JsonResponse({"id": instance.id})
+
+
+def _get_request_data(request: HttpRequest) -> dict:
+    if request.content_type == "application/json":
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else {}
+    if request.method == "POST":
+        return request.POST.dict()
+    return QueryDict(request.body).dict()
+
+
+def _overloaded_response() -> JsonResponse:
+    response = JsonResponse({"detail": "Too many passwords are being hashed, retry later."}, status=503)
+    response["Retry-After"] = "1"
+    return response
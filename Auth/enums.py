@@ -13,3 +13,18 @@ class RoleRequestStatus(models.TextChoices):
     OPENED = 'opened', 'Opened'
     APPROVED = 'approved', 'Approved'
     CANCELLED = 'cancelled', 'Cancelled'
+
+
+# bit of role in UserWithRoles.role_mask, new roles must be added to the end of Role to keep stored masks valid
+ROLE_BITS: dict[str, int] = {role.value: 1 << index for index, role in enumerate(Role)}
+
+
+def get_role_mask(roles) -> int:
+    mask = 0
+    for role in roles:
+        mask |= ROLE_BITS[role]
+    return mask
+
+
+def get_roles_of_mask(mask: int) -> tuple[str, ...]:
+    return tuple(role for role, bit in ROLE_BITS.items() if mask & bit)
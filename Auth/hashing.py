@@ -0,0 +1,77 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+
+class PasswordHashingOverloaded(Exception):
+    pass
+
+
+class PasswordHashPool:
+    """Bounded pool of threads hashing passwords for async views.
+
+    PBKDF2 of hashlib releases GIL, so hashing runs in parallel with event loop
+    and sync views. If more than max_pending passwords wait for hashing,
+    new ones are rejected with PasswordHashingOverloaded.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.max_seen_pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def make_password(self, password: str) -> str:
+        """Return hash of password.
+
+        :raises PasswordHashingOverloaded: If queue of pool is full
+        """
+        self._acquire_slot()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), make_password, password)
+        finally:
+            self._release_slot()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "pending": self.pending,
+                "max_seen_pending": self.max_seen_pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+    def _acquire_slot(self) -> None:
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHashingOverloaded()
+            self.pending += 1
+            self.max_seen_pending = max(self.max_seen_pending, self.pending)
+
+    def _release_slot(self) -> None:
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix="password-hash")
+            return self._executor
+
+
+password_hash_pool = PasswordHashPool(
+    workers=settings.PASSWORD_HASHING["WORKERS"],
+    max_pending=settings.PASSWORD_HASHING["MAX_PENDING"],
+)
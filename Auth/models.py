@@ -1,21 +1,67 @@
+import functools
+import operator
 import re
 
 from django.db import models
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.lookups import Exact
 from django.contrib.auth.models import User
 from django.contrib.postgres.fields import ArrayField
 from rest_framework import serializers
 
+from common.instrumentation import TimedSerializerMixin
 from . import enums, validators
 
 
+def has_role(role: str, prefix: str = "") -> Q:
+    """Return condition of UserWithRoles having role, matching its partial index.
+
+    :param prefix: path to UserWithRoles from filtered model, e.g. 'userwithroles__'
+    """
+    bit = enums.ROLE_BITS[role]
+    return Q(Exact(F(f"{prefix}role_mask").bitand(bit), bit))
+
+
 class UserWithRoles(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
     roles = ArrayField(models.CharField(
         choices=enums.Role.choices
     ), default=list)
+    # bits of enums.ROLE_BITS, computed by database from roles, so it is in sync after any write
+    role_mask = models.GeneratedField(
+        expression=functools.reduce(operator.add, (
+            Case(When(roles__contains=[role], then=Value(bit)), default=Value(0))
+            for role, bit in enums.ROLE_BITS.items()
+        )),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user"], condition=has_role(role), name=f"userwithroles_{role}_idx")
+            for role in enums.Role.values
+        ]
+
+
+class TokenVersion(models.Model):
+    """Version of signed tokens of user, tokens with lower version are revoked.
 
+    Row exists only for users who ever revoked their tokens. It has no foreign key,
+    so it outlives deleted user and keeps tokens of such user revoked.
+    """
+    user_id = models.IntegerField(primary_key=True)
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
-class UserSerializer(serializers.ModelSerializer):
+
+class DeniedToken(models.Model):
+    """Revoked signed token, kept until it expires."""
+    jti = models.CharField(max_length=32, primary_key=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     @staticmethod
     def validate_username(value):
         # username contains from 3 to 20 word symbols or number symbols or _ or -
@@ -52,7 +98,16 @@ class UserSerializer(serializers.ModelSerializer):
         extra_kwargs = {'email': {'required': True}}
 
 
-class UserUpdateSerializer(serializers.ModelSerializer):
+class UserPublicSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Read only serializer of user without password."""
+
+    class Meta:
+        model = User
+        fields = ('username', 'email', 'id')
+        read_only_fields = fields
+
+
+class UserUpdateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     def validate_password(self, value):
         return validators.validate_password(value)
 
@@ -61,7 +116,7 @@ class UserUpdateSerializer(serializers.ModelSerializer):
         fields = ('password',)
 
 
-class UserWithRolesSerializer(serializers.ModelSerializer):
+class UserWithRolesSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = UserWithRoles
         fields = ('user', 'roles')
@@ -75,14 +130,58 @@ class RoleRequest(models.Model):
                               default=enums.RoleRequestStatus.OPENED, max_length=10)
     message = models.TextField(blank=True, null=False, default="")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "status", "date"], name="rolerequest_user_status_date"),
+            models.Index(fields=["status", "date"], name="rolerequest_status_date"),
+            # default ordering of list of all role requests
+            models.Index(fields=["date", "id"], name="rolerequest_date_id"),
+        ]
+
 
-class RoleRequestCreateSerializer(serializers.ModelSerializer):
+class RoleRequestCreateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = RoleRequest
         fields = ('expected_role', 'message', 'user', 'id')
 
 
-class RoleRequestGetSerializer(serializers.ModelSerializer):
+class RoleRequestGetSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = RoleRequest
         fields = ('expected_role', 'message', 'user', 'id', 'date', 'status')
+
+
+class RoleRequestFilterSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=enums.RoleRequestStatus.choices, required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        date_from, date_to = attrs.get("date_from"), attrs.get("date_to")
+        if date_from and date_to and date_from > date_to:
+            raise serializers.ValidationError("date_from must not be after date_to")
+        return attrs
+
+
+class RoleRequestModerationFilterSerializer(RoleRequestFilterSerializer):
+    # only opened requests are moderated
+    status = None
+    expected_role = serializers.ChoiceField(choices=enums.Role.choices, required=False)
+
+
+class RoleRequestStatusSerializer(serializers.Serializer):
+    """Status set to one role request by moderator."""
+    status = serializers.ChoiceField(choices=[enums.RoleRequestStatus.APPROVED, enums.RoleRequestStatus.CANCELLED])
+
+
+class RoleRequestModerationSerializer(serializers.Serializer):
+    """Role requests to approve or cancel, selected by 'ids' or by 'filter'."""
+    action = serializers.ChoiceField(choices=["approve", "cancel"])
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False,
+                                max_length=100_000)
+    filter = RoleRequestModerationFilterSerializer(required=False)
+
+    def validate(self, attrs):
+        if ("ids" in attrs) == ("filter" in attrs):
+            raise serializers.ValidationError("Exactly one of ids and filter is required")
+        return attrs
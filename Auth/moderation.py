@@ -0,0 +1,69 @@
+"""Bulk moderation of role requests in one set-based statement.
+
+Statuses of opened requests are changed by one UPDATE. On approval the same statement
+adds expected roles to UserWithRoles.roles of their users, creating missing rows, and
+increments TokenVersion of these users, because their signed tokens have old roles.
+"""
+from django.db import connection, transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from Auth.enums import RoleRequestStatus
+from Auth.models import RoleRequest, TokenVersion, UserWithRoles
+from Auth.roles import invalidate_user_roles
+from Auth.tokens import revocations
+
+
+def moderate_role_requests(role_requests: QuerySet, approve: bool) -> dict[str, int]:
+    """Approve or cancel opened ones of role_requests.
+
+    :param role_requests: queryset of RoleRequest selecting requests to moderate
+    :param approve: grant expected roles if True, otherwise cancel requests
+    :returns: number of moderated requests and number of users who got roles
+    """
+    opened, params = role_requests.filter(status=RoleRequestStatus.OPENED).values("id").query.sql_with_params()
+    status = RoleRequestStatus.APPROVED if approve else RoleRequestStatus.CANCELLED
+    # status is checked again, so a request changed by concurrent moderation is skipped
+    sql = f"""
+        WITH moderated AS (
+            UPDATE {_table(RoleRequest)} SET status = %s
+            WHERE id IN ({opened}) AND status = %s
+            RETURNING user_id, expected_role
+        )
+    """
+    params = [status, *params, RoleRequestStatus.OPENED]
+    if approve:
+        sql += f"""
+        , granted AS (
+            INSERT INTO {_table(UserWithRoles)} AS granted_user (user_id, roles)
+            SELECT user_id, array_agg(DISTINCT expected_role) FROM moderated GROUP BY user_id
+            ON CONFLICT (user_id) DO UPDATE SET roles = granted_user.roles || ARRAY(
+                SELECT unnest(EXCLUDED.roles) EXCEPT SELECT unnest(granted_user.roles)
+            )
+            RETURNING user_id
+        ), versions AS (
+            INSERT INTO {_table(TokenVersion)} AS token_version (user_id, version, updated_at)
+            SELECT user_id, 1, %s FROM granted
+            ON CONFLICT (user_id) DO UPDATE SET version = token_version.version + 1, updated_at = %s
+            RETURNING user_id, version
+        )
+        SELECT (SELECT count(*) FROM moderated), user_id, version FROM versions
+        UNION ALL SELECT (SELECT count(*) FROM moderated), NULL, NULL
+        """
+        now = timezone.now()
+        params += [now, now]
+    else:
+        sql += "SELECT (SELECT count(*) FROM moderated), NULL, NULL"
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    versions = {user_id: version for _, user_id, version in rows if user_id is not None}
+    for user_id, version in versions.items():
+        invalidate_user_roles(user_id)
+        revocations.set_version(user_id, version)
+    return {"moderated": rows[0][0], "granted_users": len(versions)}
+
+
+def _table(model) -> str:
+    return connection.ops.quote_name(model._meta.db_table)
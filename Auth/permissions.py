@@ -1,17 +1,12 @@
-from django.contrib.auth.models import User
 from rest_framework import permissions
 from rest_framework.request import Request
 
-from Auth.enums import Role
-from Auth.models import UserWithRoles, RoleRequest
+from Auth.enums import Role, get_role_mask
+from Auth.models import RoleRequest
+from Auth.roles import get_user_role_mask, user_have_role
 
-
-def _user_have_role(user: User, role: Role) -> bool:
-    user_roles = UserWithRoles.objects.filter(user=user)
-    if not user_roles.exists():
-        return False
-    user_roles = user_roles.get()
-    return role in user_roles.roles
+# roles which can see role requests of other users and moderate them
+ROLE_REQUEST_MODERATORS_MASK = get_role_mask((Role.ADMIN, Role.SUPERUSER))
 
 
 class IsNotAuthenticated(permissions.BasePermission):
@@ -25,7 +20,7 @@ class IsSuperUserOrReadOnly(permissions.BasePermission):
             return True
         if not request.user.is_authenticated:
             return False
-        return _user_have_role(request.user, Role.SUPERUSER)
+        return user_have_role(request.user, Role.SUPERUSER)
 
 
 class IsOwnerOfRoleRequest(permissions.BasePermission):
@@ -43,8 +38,7 @@ class IsOwnerOfRoleRequest(permissions.BasePermission):
             role_request = view.get_object()
             user = request.user
             return (self._is_owner(request, role_request) or
-                    _user_have_role(user, Role.ADMIN) or
-                    _user_have_role(user, Role.SUPERUSER))
+                    bool(get_user_role_mask(user) & ROLE_REQUEST_MODERATORS_MASK))
         except AssertionError:
             return True
 
@@ -54,3 +48,8 @@ class IsOwnerOfRoleRequest(permissions.BasePermission):
         if role_request.user.id != user.id:
             return False
         return True
+
+
+class IsRoleRequestModerator(permissions.BasePermission):
+    def has_permission(self, request: Request, view):
+        return bool(get_user_role_mask(request.user) & ROLE_REQUEST_MODERATORS_MASK)
@@ -0,0 +1,170 @@
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from Auth.enums import ROLE_BITS, get_roles_of_mask
+from Auth.models import UserWithRoles
+
+
+class RoleCache:
+    """Bounded process-wide LRU of user roles with time to live.
+
+    Values are role masks of Auth.enums.ROLE_BITS, a user without UserWithRoles is cached as 0.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[int, tuple[float, int]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.request_hits = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id: int) -> int | None:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(user_id, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def count_request_hit(self) -> None:
+        with self._lock:
+            self.request_hits += 1
+
+    def set(self, user_id: int, role_mask: int) -> None:
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, role_mask)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.request_hits = self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+role_cache = RoleCache(
+    max_size=settings.ROLE_CACHE["MAX_SIZE"],
+    ttl=settings.ROLE_CACHE["TTL"],
+)
+
+# user_id -> role mask, lives only while RequestRoleCacheMiddleware handles a request
+_request_roles: ContextVar[dict[int, int] | None] = ContextVar("request_roles", default=None)
+
+
+def get_user_role_mask(user: User) -> int:
+    """Return role mask of user, loading it from database at most once per request.
+
+    :param user: user or anonymous user
+    :returns: bits of Auth.enums.ROLE_BITS, 0 if user has no UserWithRoles
+    """
+    if user.pk is None:
+        return 0
+    # user authenticated by signed token has snapshot of roles
+    token_role_mask = getattr(user, "token_role_mask", None)
+    if token_role_mask is not None:
+        return token_role_mask
+    request_roles = _request_roles.get()
+    if request_roles is not None and user.pk in request_roles:
+        role_cache.count_request_hit()
+        return request_roles[user.pk]
+
+    role_mask = role_cache.get(user.pk)
+    if role_mask is None:
+        role_mask = _load_user_role_mask(user.pk)
+        role_cache.set(user.pk, role_mask)
+    if request_roles is not None:
+        request_roles[user.pk] = role_mask
+    return role_mask
+
+
+def _load_user_role_mask(user_id: int) -> int:
+    return UserWithRoles.objects.filter(user_id=user_id).values_list("role_mask", flat=True).first() or 0
+
+
+def get_user_roles(user: User) -> tuple[str, ...]:
+    """Return roles of user in order of Auth.enums.Role, see get_user_role_mask."""
+    return get_roles_of_mask(get_user_role_mask(user))
+
+
+def user_have_role(user: User, role: str) -> bool:
+    return bool(get_user_role_mask(user) & ROLE_BITS[role])
+
+
+def get_role_cache_stats() -> dict[str, int]:
+    return {
+        "request_hits": role_cache.request_hits,
+        "hits": role_cache.hits,
+        "misses": role_cache.misses,
+        "evictions": role_cache.evictions,
+        "size": len(role_cache),
+    }
+
+
+def clear_role_cache() -> None:
+    role_cache.clear()
+    request_roles = _request_roles.get()
+    if request_roles is not None:
+        request_roles.clear()
+
+
+def invalidate_user_roles(user_id: int) -> None:
+    role_cache.invalidate(user_id)
+    request_roles = _request_roles.get()
+    if request_roles is not None:
+        request_roles.pop(user_id, None)
+
+
+@receiver(post_save, sender=UserWithRoles)
+@receiver(post_delete, sender=UserWithRoles)
+def _invalidate_on_user_with_roles_change(sender, instance: UserWithRoles, **kwargs):
+    invalidate_user_roles(instance.user_id)
+
+
+class RequestRoleCacheMiddleware:
+    """Open request scope of role cache, so roles of a user are loaded once per request."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _request_roles.set({})
+        try:
+            return self.get_response(request)
+        finally:
+            _request_roles.reset(token)
+
+    async def __acall__(self, request):
+        token = _request_roles.set({})
+        try:
+            return await self.get_response(request)
+        finally:
+            _request_roles.reset(token)
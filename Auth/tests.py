@@ -1,14 +1,27 @@
 # TODO: unique of pair role and user
+import json
+import tempfile
 from datetime import date
+from io import StringIO
 
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from rest_framework.response import Response
 
-from .enums import Role, RoleRequestStatus
-from .models import RoleRequest
+from .enums import ROLE_BITS, Role, RoleRequestStatus, get_roles_of_mask
+from .hashing import PasswordHashPool, PasswordHashingOverloaded
+from .models import DeniedToken, RoleRequest, UserWithRoles, has_role
+from .roles import RoleCache, clear_role_cache, get_role_cache_stats, get_user_roles, user_have_role
+from .tokens import issue_token, revocations
 from .test_utils import (
+    create_or_get_superuser,
     get_superuser_client,
     create_unique_user,
     generate_username,
@@ -17,6 +30,7 @@ from .test_utils import (
 )
 from Posts.test_utils import create_post
 from Posts.serializers import PostSerializer
+from common.profiling import list_profiles
 from common.tests import HTTPAsserts
 
 
@@ -267,6 +281,80 @@ class UserTestCase(TestCase, HTTPAsserts):
         self.assertTrue(expected_data[1] in response.data,
                         msg="Response not expected. Second user isn't in response")
 
+    def test_get_one_posts_are_paginated(self):
+        su_client: APIClient = get_superuser_client()
+        user: User = create_unique_user()
+        give_role(user, Role.WRITER)
+        posts = [create_post(owner=user.id) for _ in range(3)]
+
+        response: Response = su_client.get(f"{self.path}{user.id}/?posts_page_size=2")
+        self.assert_http_200(response)
+        self.assertEqual([posts[2].id, posts[1].id], [post["id"] for post in response.data["posts"]])
+        response = su_client.get(response.data["posts_next"])
+        self.assert_http_200(response)
+        self.assertEqual([posts[0].id], [post["id"] for post in response.data["posts"]])
+        self.assertIsNone(response.data["posts_next"])
+
+    def test_sparse_fields(self):
+        su_client: APIClient = get_superuser_client()
+        user: User = create_unique_user()
+        response: Response = su_client.get(f"{self.path}?fields=id,username")
+        self.assert_http_200(response)
+        self.assertIn({"id": user.id, "username": user.username}, response.data)
+        response = su_client.get(f"{self.path}{user.id}/?fields=username&posts=count")
+        self.assert_http_200(response)
+        self.assertEqual({"username": user.username, "roles": [], "posts_count": 0}, response.data)
+        response = su_client.get(f"{self.path}?fields=id,password")
+        self.assert_http_400(response)
+
+    def test_get_one_posts_ids_and_count(self):
+        su_client: APIClient = get_superuser_client()
+        user: User = create_unique_user()
+        give_role(user, Role.WRITER)
+        posts = [create_post(owner=user.id) for _ in range(2)]
+
+        response: Response = su_client.get(f"{self.path}{user.id}/?posts=ids")
+        self.assert_http_200(response)
+        self.assertEqual([posts[1].id, posts[0].id], response.data["posts"])
+        response = su_client.get(f"{self.path}{user.id}/?posts=count")
+        self.assert_http_200(response)
+        self.assertEqual(2, response.data["posts_count"])
+        self.assertNotIn("posts", response.data)
+        response = su_client.get(f"{self.path}{user.id}/?posts=invalid")
+        self.assert_http_400(response)
+
+    def test_get_one_query_count_does_not_depend_on_posts(self):
+        su_client: APIClient = get_superuser_client()
+        user: User = create_unique_user()
+        give_role(user, Role.WRITER)
+        for _ in range(5):
+            create_post(owner=user.id)
+        clear_role_cache()
+        # user, roles and page of posts
+        with self.assertNumQueries(3):
+            response: Response = su_client.get(f"{self.path}{user.id}/")
+        self.assert_http_200(response)
+
+    def test_stream_get_all(self):
+        su_client: APIClient = get_superuser_client()
+        user = create_unique_user()
+        response = su_client.get(f"{self.path}?stream=true")
+        data = json.loads(b"".join(response.streaming_content))
+        self.assertIn({"id": user.id, "username": user.username, "email": user.email}, data)
+
+    def test_paginated_get_all(self):
+        su_client: APIClient = get_superuser_client()
+        users = [create_unique_user() for _ in range(3)]
+        response: Response = su_client.get(f"{self.path}?page_size=2")
+        self.assert_http_200(response)
+        self.assertEqual(2, len(response.data["results"]))
+        for instance in response.data["results"]:
+            self.assertNotIn("password", instance)
+
+        response = su_client.get(response.data["next"])
+        self.assert_http_200(response)
+        self.assertIn(users[-1].id, [instance["id"] for instance in response.data["results"]])
+
     @staticmethod
     def _get_expected_data_for_output_data_test() -> dict[str, any]:
         user: User = create_unique_user()
@@ -278,6 +366,7 @@ class UserTestCase(TestCase, HTTPAsserts):
             "username": user.username,
             "email": user.email,
             "posts": [post_serialized.data],
+            "posts_next": None,
             "roles": [Role.WRITER]
         }
         return expected_data
@@ -609,9 +698,542 @@ class RoleRequestTestCase(TestCase, HTTPAsserts):
         self.assertTrue(hasattr(response, "data"), msg="Response has not data")
         self.assertEqual(0, len(response.data))
 
+    def test_output_data_on_get_all_contains_only_own_requests(self):
+        owner_client = get_authenticated_client()
+        other_client = get_authenticated_client()
+        own_ids = {self._create_role_request(owner_client).data["id"] for _ in range(2)}
+        self._create_role_request(other_client)
+
+        response: Response = owner_client.get(self.path)
+        self.assert_http_200(response)
+        self.assertEqual(own_ids, {instance["id"] for instance in response.data})
+
+    def test_staff_get_all(self):
+        owner_client = get_authenticated_client()
+        role_request_id = self._create_role_request(owner_client).data["id"]
+        staff_user = create_unique_user()
+        staff_user.is_staff = True
+        staff_user.save()
+        staff_client = APIClient()
+        staff_client.force_authenticate(staff_user)
+
+        response: Response = staff_client.get(self.path)
+        self.assert_http_200(response)
+        # list of all role requests is always paginated
+        self.assertIn(role_request_id, [instance["id"] for instance in response.data["results"]])
+
+    def test_pages_of_all(self):
+        user = create_unique_user()
+        ids = [RoleRequest.objects.create(user=user, expected_role=Role.WRITER).id for _ in range(5)]
+        RoleRequest.objects.filter(id=ids[0]).update(date=date(2000, 3, 4))
+        client = get_superuser_client()
+        for ordering, expected_ids in (("-date", [*reversed(ids[1:]), ids[0]]), ("id", ids)):
+            with self.subTest(ordering=ordering):
+                url, received_ids = f"{self.path}?page_size=2&ordering={ordering}", []
+                while url:
+                    response: Response = client.get(url)
+                    self.assert_http_200(response)
+                    received_ids += [instance["id"] for instance in response.data["results"]]
+                    url = response.data["next"]
+                self.assertEqual(expected_ids, received_ids)
+
+    def test_filter_get_all(self):
+        owner_client = get_authenticated_client()
+        opened_id = self._create_role_request(owner_client).data["id"]
+        approved_id = self._create_role_request(owner_client).data["id"]
+        RoleRequest.objects.filter(id=approved_id).update(status=RoleRequestStatus.APPROVED,
+                                                          date=date(2000, 3, 4))
+        to_test = {
+            f"?status={RoleRequestStatus.OPENED}": [opened_id],
+            f"?status={RoleRequestStatus.APPROVED}": [approved_id],
+            "?date_to=2000-12-31": [approved_id],
+            "?date_from=2001-01-01": [opened_id],
+        }
+        for query, expected_ids in to_test.items():
+            response: Response = owner_client.get(f"{self.path}{query}")
+            self.assert_http_200_with_addition(response, f" Case: {query}")
+            self.assertEqual(expected_ids, [instance["id"] for instance in response.data])
+
+    def test_invalid_filter_get_all(self):
+        client = get_authenticated_client()
+        for query in ["?status=invalid", "?date_from=x", "?date_from=2001-01-01&date_to=2000-01-01"]:
+            response: Response = client.get(f"{self.path}{query}")
+            self.assert_http_400_with_addition(response, f" Case: {query}")
+
     def _create_role_request(self, client):
         data = {"message": "Give me role", "expected_role": Role.WRITER}
         response: Response = client.post(self.path, data=data)
         self.assert_http_201(response)
         return response
 
+
+
+class RoleCacheTestCase(TestCase):
+    def setUp(self):
+        clear_role_cache()
+
+    def test_roles_loaded_once(self):
+        user = create_unique_user()
+        give_role(user, Role.WRITER)
+        with self.assertNumQueries(1):
+            get_user_roles(user)
+            get_user_roles(user)
+        self.assertEqual((Role.WRITER,), get_user_roles(user))
+        stats = get_role_cache_stats()
+        self.assertEqual(1, stats["misses"])
+        self.assertEqual(2, stats["hits"])
+
+    def test_invalidate_on_save(self):
+        user = create_unique_user()
+        self.assertEqual((), get_user_roles(user))
+        give_role(user, Role.ADMIN)
+        self.assertEqual((Role.ADMIN,), get_user_roles(user))
+
+    def test_invalidate_on_delete(self):
+        user = create_unique_user()
+        give_role(user, Role.ADMIN)
+        get_user_roles(user)
+        UserWithRoles.objects.get(user=user).delete()
+        self.assertEqual((), get_user_roles(user))
+
+    def test_superuser_request_loads_roles_once(self):
+        owner_client = get_authenticated_client()
+        role_request = owner_client.post("/role-requests/", data={"expected_role": Role.WRITER})
+        su_client = get_superuser_client()
+        clear_role_cache()
+        # admin and superuser roles are checked by one bitwise operation
+        response: Response = su_client.get(f"/role-requests/{role_request.data['id']}/")
+        self.assertEqual(200, response.status_code)
+        stats = get_role_cache_stats()
+        self.assertEqual(1, stats["misses"])
+        self.assertEqual(0, stats["request_hits"])
+
+    def test_lru_eviction(self):
+        cache = RoleCache(max_size=2, ttl=60)
+        cache.set(1, 0)
+        cache.set(2, 0)
+        cache.get(1)
+        cache.set(3, 0)
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(0, cache.get(1))
+        self.assertEqual(1, cache.evictions)
+
+    def test_ttl(self):
+        cache = RoleCache(max_size=2, ttl=-1)
+        cache.set(1, 0)
+        self.assertIsNone(cache.get(1))
+
+
+class AsyncPasswordTestCase(TestCase, HTTPAsserts):
+    def test_registration(self):
+        data = generate_dict_to_request_to_create_unique_user()
+        response = APIClient().post("/async/registration/", data=data, format="json")
+        self.assert_http_201(response)
+        user = User.objects.get(id=response.json()["id"])
+        self.assertTrue(user.check_password(data["password"]))
+
+    def test_invalid_registration(self):
+        data = generate_dict_to_request_to_create_unique_user(password="x")
+        response = APIClient().post("/async/registration/", data=data)
+        self.assertEqual(400, response.status_code)
+        self.assertIn("password", response.json())
+
+    def test_authenticated_cannot_register(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=create_unique_user())}")
+        response = client.post("/async/registration/", data=generate_dict_to_request_to_create_unique_user())
+        self.assertEqual(403, response.status_code)
+
+    def test_change_password(self):
+        user = create_unique_user()
+        su_token = Token.objects.create(user=create_or_get_superuser())
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {su_token}")
+        response = client.patch(f"/async/users/{user.id}/password/", data={"password": "<NewPaSSW0RD>"},
+                                format="json")
+        self.assert_http_200(response)
+        user.refresh_from_db()
+        self.assertTrue(user.check_password("<NewPaSSW0RD>"))
+
+    def test_who_cannot_change_password(self):
+        user = create_unique_user()
+        authenticated_client = APIClient()
+        authenticated_client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=create_unique_user())}")
+        for client, expected_status in [(APIClient(), 401), (authenticated_client, 403)]:
+            response = client.patch(f"/async/users/{user.id}/password/", data={"password": "<NewPaSSW0RD>"},
+                                    format="json")
+            self.assertEqual(expected_status, response.status_code)
+
+    def test_overloaded_pool(self):
+        pool = PasswordHashPool(workers=1, max_pending=0)
+        with self.assertRaises(PasswordHashingOverloaded):
+            async_to_sync(pool.make_password)("<PaSSW0RD>")
+        self.assertEqual(1, pool.stats()["rejected"])
+
+    def test_pool_stats(self):
+        pool = PasswordHashPool(workers=1, max_pending=1)
+        async_to_sync(pool.make_password)("<PaSSW0RD>")
+        stats = pool.stats()
+        self.assertEqual(0, stats["pending"])
+        self.assertEqual(1, stats["max_seen_pending"])
+        self.assertEqual(1, stats["completed"])
+
+
+class ProfilingTestCase(TestCase, HTTPAsserts):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = self.settings(PROFILING={"DIR": directory.name, "MAX_PROFILES": 2})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_profile_of_superuser(self):
+        user = create_unique_user()
+        response: Response = get_superuser_client().get(f"/users/{user.id}/", HTTP_X_PROFILE="1")
+        self.assert_http_200(response)
+        profiles = list_profiles()
+        self.assertEqual(1, len(profiles))
+        self.assertEqual(response["X-Profile-Id"], profiles[0]["id"])
+        self.assertEqual("UserViewSet.retrieve", profiles[0]["view"])
+        self.assertEqual(200, profiles[0]["status"])
+
+    def test_profile_by_query_param(self):
+        response: Response = get_superuser_client().get("/users/?profile=1")
+        self.assert_http_200(response)
+        self.assertTrue(response.has_header("X-Profile-Id"))
+
+    def test_flag_of_other_users_is_ignored(self):
+        response: Response = get_authenticated_client().get("/users/", HTTP_X_PROFILE="1")
+        self.assertFalse(response.has_header("X-Profile-Id"))
+        response = get_superuser_client().get("/users/")
+        self.assertFalse(response.has_header("X-Profile-Id"))
+        self.assertEqual([], list_profiles())
+
+    def test_ring_buffer_keeps_newest_profiles(self):
+        client = get_superuser_client()
+        ids = [client.get("/users/", HTTP_X_PROFILE="1")["X-Profile-Id"] for _ in range(3)]
+        self.assertEqual(ids[:0:-1], [profile["id"] for profile in list_profiles()])
+
+    def test_command(self):
+        profile_id = get_superuser_client().get("/users/", HTTP_X_PROFILE="1")["X-Profile-Id"]
+        out = StringIO()
+        call_command("profiles", stdout=out)
+        self.assertIn(f"{profile_id}  ", out.getvalue())
+        self.assertIn("GET /users/", out.getvalue())
+        out = StringIO()
+        call_command("profiles", profile_id, "--limit", "5", stdout=out)
+        self.assertIn("function calls", out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("profiles", "missing")
+
+
+class SignedTokenTestCase(TestCase, HTTPAsserts):
+    def setUp(self):
+        revocations.clear()
+
+    @staticmethod
+    def _get_client(token: str) -> APIClient:
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        return client
+
+    def test_obtain_and_authenticate_without_queries(self):
+        user = create_unique_user(username="signed")
+        user.set_password("<PasSWORD1>")
+        user.save()
+        response: Response = APIClient().post("/tokens/", {"username": "signed", "password": "<PasSWORD1>"})
+        self.assert_http_201(response)
+        client = self._get_client(response.data["token"])
+        revocations.refresh()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get("/role-requests/")
+        self.assert_http_200(response)
+        sqls = " ".join(query["sql"] for query in queries)
+        self.assertNotIn("authtoken_token", sqls)
+        self.assertNotIn("auth_user", sqls)
+        self.assertNotIn("userwithroles", sqls.lower())
+        self.assertEqual(1, len(queries), sqls)
+
+        response = client.post("/role-requests/", {"expected_role": Role.WRITER, "message": "signed"})
+        self.assert_http_201(response)
+        self.assertEqual(user.id, RoleRequest.objects.get(id=response.data["id"]).user_id)
+
+    def test_wrong_credentials(self):
+        create_unique_user(username="signed")
+        response: Response = APIClient().post("/tokens/", {"username": "signed", "password": "wrong"})
+        self.assert_http_400(response)
+
+    def test_roles_of_token(self):
+        token, _ = issue_token(create_or_get_superuser())
+        user = create_unique_user()
+        response: Response = self._get_client(token).patch(f"/users/{user.id}/", {"password": "<PasSWORD2>"})
+        self.assert_http_200(response)
+
+        token, _ = issue_token(create_unique_user())
+        response = self._get_client(token).patch(f"/users/{user.id}/", {"password": "<PasSWORD2>"})
+        self.assertEqual(403, response.status_code)
+
+    def test_invalid_tokens(self):
+        token, _ = issue_token(create_unique_user())
+        payload, signature = token.split(".")
+        for invalid in (payload + "." + signature[::-1], payload[:-2] + "." + signature, "garbage", "a.b"):
+            response: Response = self._get_client(invalid).get("/role-requests/")
+            self.assertEqual(401, response.status_code, invalid)
+        with self.settings(SECRET_KEY="other"):
+            response = self._get_client(token).get("/role-requests/")
+        self.assertEqual(401, response.status_code)
+
+    def test_expired_token(self):
+        with self.settings(SIGNED_TOKENS={"TTL": -1, "REVOCATION_REFRESH": 5}):
+            token, _ = issue_token(create_unique_user())
+        response: Response = self._get_client(token).get("/role-requests/")
+        self.assertEqual(401, response.status_code)
+        self.assertEqual("Token has expired.", response.data["detail"])
+
+    def test_revoke(self):
+        user = create_unique_user()
+        token, _ = issue_token(user)
+        other_token, _ = issue_token(user)
+        client = self._get_client(token)
+        self.assert_http_204(client.post("/tokens/revoke/"))
+        self.assertEqual(401, client.get("/role-requests/").status_code)
+        self.assert_http_200(self._get_client(other_token).get("/role-requests/"))
+        # deny-list of another process is loaded from database
+        revocations.clear()
+        self.assertEqual(401, client.get("/role-requests/").status_code)
+
+    def test_revoke_all(self):
+        user = create_unique_user()
+        tokens = [issue_token(user)[0] for _ in range(2)]
+        self.assert_http_204(self._get_client(tokens[0]).post("/tokens/revoke-all/"))
+        for token in tokens:
+            self.assertEqual(401, self._get_client(token).get("/role-requests/").status_code)
+        revocations.clear()
+        self.assertEqual(401, self._get_client(tokens[1]).get("/role-requests/").status_code)
+        self.assert_http_200(self._get_client(issue_token(user)[0]).get("/role-requests/"))
+
+    def test_change_of_roles_revokes_tokens(self):
+        user = create_unique_user()
+        token, _ = issue_token(user)
+        give_role(user, Role.WRITER)
+        self.assertEqual(401, self._get_client(token).get("/role-requests/").status_code)
+
+    def test_change_of_user_revokes_tokens(self):
+        changes = {"is_active": False, "is_superuser": True, "is_staff": True, "password": "<PasSWORD2>"}
+        for name, value in changes.items():
+            with self.subTest(field=name):
+                user = create_unique_user()
+                token, _ = issue_token(user)
+                if name == "password":
+                    user.set_password(value)
+                else:
+                    setattr(user, name, value)
+                user.save()
+                client = self._get_client(token)
+                self.assertEqual(401, client.get("/role-requests/").status_code)
+                self.assertEqual(401, client.post("/tokens/revoke-all/").status_code)
+
+    def test_other_change_of_user_keeps_tokens(self):
+        user = create_unique_user()
+        token, _ = issue_token(user)
+        user = User.objects.get(id=user.id)
+        user.first_name = "Other"
+        with self.assertNumQueries(1):
+            user.save()
+        self.assert_http_200(self._get_client(token).get("/role-requests/"))
+
+    def test_deletion_of_user_revokes_tokens(self):
+        user = create_unique_user()
+        token, _ = issue_token(user)
+        user.delete()
+        client = self._get_client(token)
+        self.assertEqual(401, client.get("/role-requests/").status_code)
+        self.assertEqual(401, client.post("/tokens/revoke-all/").status_code)
+        # versions of deleted users are loaded from database by other processes
+        revocations.clear()
+        self.assertEqual(401, client.get("/role-requests/").status_code)
+
+    def test_expired_denied_tokens_are_removed(self):
+        DeniedToken.objects.create(jti="expired", expires_at="2000-01-01T00:00:00Z")
+        token, _ = issue_token(create_unique_user())
+        self.assert_http_204(self._get_client(token).post("/tokens/revoke/"))
+        self.assertFalse(DeniedToken.objects.filter(jti="expired").exists())
+        self.assertEqual(1, DeniedToken.objects.count())
+
+    def test_revoke_requires_signed_token(self):
+        response: Response = get_authenticated_client().post("/tokens/revoke/")
+        self.assert_http_400(response)
+
+    def test_async_view(self):
+        token, _ = issue_token(create_or_get_superuser())
+        user = create_unique_user()
+        response = self._get_client(token).put(f"/async/users/{user.id}/password/", {"password": "<PasSWORD2>"},
+                                              format="json")
+        self.assert_http_200(response)
+
+
+class RoleMaskTestCase(TestCase, HTTPAsserts):
+    def test_mask_follows_roles(self):
+        user = create_unique_user()
+        give_role(user, Role.WRITER)
+        give_role(user, Role.ADMIN)
+        user_with_roles = UserWithRoles.objects.get(user=user)
+        self.assertEqual(ROLE_BITS[Role.WRITER] | ROLE_BITS[Role.ADMIN], user_with_roles.role_mask)
+        UserWithRoles.objects.filter(user=user).update(roles=[Role.MODERATOR])
+        user_with_roles.refresh_from_db()
+        self.assertEqual(ROLE_BITS[Role.MODERATOR], user_with_roles.role_mask)
+        self.assertEqual((Role.MODERATOR,), get_roles_of_mask(user_with_roles.role_mask))
+
+    def test_user_have_role(self):
+        user = create_unique_user()
+        give_role(user, Role.EDITOR)
+        clear_role_cache()
+        self.assertTrue(user_have_role(user, Role.EDITOR))
+        self.assertFalse(user_have_role(user, Role.WRITER))
+        self.assertEqual((Role.EDITOR,), get_user_roles(user))
+
+    def test_filter_users_by_role(self):
+        writers = [create_unique_user() for _ in range(2)]
+        for writer in writers:
+            give_role(writer, Role.WRITER)
+        moderator = create_unique_user()
+        give_role(moderator, Role.MODERATOR)
+        give_role(writers[0], Role.MODERATOR)
+
+        response: Response = APIClient().get("/users/?role=moderator&page_size=10")
+        self.assert_http_200(response)
+        self.assertEqual({writers[0].id, moderator.id}, {user["id"] for user in response.data["results"]})
+        response = APIClient().get("/users/?role=writer&stream=1")
+        self.assertEqual({writer.id for writer in writers},
+                         {user["id"] for user in json.loads(b"".join(response.streaming_content))})
+
+    def test_filter_users_by_unknown_role(self):
+        response: Response = APIClient().get("/users/?role=king")
+        self.assert_http_400(response)
+
+    def test_filter_by_role_uses_partial_index(self):
+        sql, params = User.objects.filter(has_role(Role.MODERATOR, prefix="userwithroles__")).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("EXPLAIN " + sql, params)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+        self.assertIn("userwithroles_moderator_idx", plan)
+
+
+class RoleRequestModerationTestCase(TestCase, HTTPAsserts):
+    @staticmethod
+    def _create_role_request(user: User, role: Role, **kwargs) -> RoleRequest:
+        return RoleRequest.objects.create(user=user, expected_role=role, **kwargs)
+
+    def test_approve_by_ids_in_one_statement(self):
+        users = [create_unique_user() for _ in range(3)]
+        give_role(users[0], Role.WRITER)
+        requests = [self._create_role_request(users[0], Role.WRITER),
+                    self._create_role_request(users[0], Role.EDITOR),
+                    self._create_role_request(users[0], Role.MODERATOR),
+                    self._create_role_request(users[1], Role.EDITOR)]
+        untouched = self._create_role_request(users[2], Role.EDITOR)
+        closed = self._create_role_request(users[2], Role.WRITER, status=RoleRequestStatus.CANCELLED)
+        UserWithRoles.objects.filter(user=users[1]).delete()
+        client = get_superuser_client()
+        ids = [request.id for request in requests] + [closed.id]
+
+        with CaptureQueriesContext(connection) as queries:
+            response: Response = client.post("/role-requests/moderate/", {"action": "approve", "ids": ids},
+                                             format="json")
+        self.assert_http_200(response)
+        self.assertEqual({"moderated": 4, "granted_users": 2}, response.data)
+        self.assertEqual(1, sum("UPDATE" in query["sql"] for query in queries))
+
+        statuses = RoleRequest.objects.filter(id__in=[request.id for request in requests]).values_list("status")
+        self.assertEqual({(RoleRequestStatus.APPROVED,)}, set(statuses))
+        self.assertEqual(RoleRequestStatus.OPENED, RoleRequest.objects.get(id=untouched.id).status)
+        self.assertEqual(RoleRequestStatus.CANCELLED, RoleRequest.objects.get(id=closed.id).status)
+        roles = UserWithRoles.objects.get(user=users[0]).roles
+        self.assertEqual(3, len(roles))
+        self.assertEqual({Role.WRITER, Role.EDITOR, Role.MODERATOR}, set(roles))
+        self.assertEqual([Role.EDITOR], UserWithRoles.objects.get(user=users[1]).roles)
+        self.assertTrue(user_have_role(users[0], Role.MODERATOR))
+
+    def test_cancel_by_filter(self):
+        user = create_unique_user()
+        writer_request = self._create_role_request(user, Role.WRITER)
+        editor_request = self._create_role_request(user, Role.EDITOR)
+        response: Response = get_superuser_client().post(
+            "/role-requests/moderate/", {"action": "cancel", "filter": {"expected_role": Role.WRITER}}, format="json")
+        self.assert_http_200(response)
+        self.assertEqual({"moderated": 1, "granted_users": 0}, response.data)
+        self.assertEqual(RoleRequestStatus.CANCELLED, RoleRequest.objects.get(id=writer_request.id).status)
+        self.assertEqual(RoleRequestStatus.OPENED, RoleRequest.objects.get(id=editor_request.id).status)
+        self.assertEqual([], UserWithRoles.objects.get(user=user).roles)
+
+    def test_approval_revokes_signed_tokens(self):
+        user = create_unique_user()
+        request = self._create_role_request(user, Role.WRITER)
+        token, _ = issue_token(user)
+        get_superuser_client().post("/role-requests/moderate/", {"action": "approve", "ids": [request.id]},
+                                    format="json")
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.assertEqual(401, client.get("/role-requests/").status_code)
+
+    def test_approve_one_by_update(self):
+        user = create_unique_user()
+        request = self._create_role_request(user, Role.WRITER)
+        token, _ = issue_token(user)
+        response: Response = get_admin_client().patch(f"/role-requests/{request.id}/",
+                                                      {"status": RoleRequestStatus.APPROVED}, format="json")
+        self.assert_http_200(response)
+        self.assertEqual(RoleRequestStatus.APPROVED, response.data["status"])
+        self.assertEqual([Role.WRITER], UserWithRoles.objects.get(user=user).roles)
+        self.assertTrue(user_have_role(user, Role.WRITER))
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.assertEqual(401, client.get("/role-requests/").status_code)
+
+        response = get_admin_client().patch(f"/role-requests/{request.id}/",
+                                            {"status": RoleRequestStatus.CANCELLED}, format="json")
+        self.assert_http_400(response)
+
+    def test_owner_cannot_approve_by_update(self):
+        user = create_unique_user()
+        request = self._create_role_request(user, Role.WRITER)
+        client = APIClient()
+        client.force_authenticate(user)
+        response: Response = client.patch(f"/role-requests/{request.id}/", {"status": RoleRequestStatus.APPROVED},
+                                          format="json")
+        self.assert_http_200(response)
+        self.assertEqual(RoleRequestStatus.OPENED, RoleRequest.objects.get(id=request.id).status)
+        self.assertEqual([], UserWithRoles.objects.get(user=user).roles)
+
+    def test_admin_cannot_approve_admin_role_by_update(self):
+        request = self._create_role_request(create_unique_user(), Role.ADMIN)
+        response: Response = get_admin_client().patch(f"/role-requests/{request.id}/",
+                                                      {"status": RoleRequestStatus.APPROVED}, format="json")
+        self.assertEqual(403, response.status_code)
+
+    def test_admin_cannot_grant_admin_role(self):
+        user = create_unique_user()
+        requests = [self._create_role_request(user, Role.ADMIN), self._create_role_request(user, Role.WRITER)]
+        response: Response = get_admin_client().post(
+            "/role-requests/moderate/", {"action": "approve", "ids": [request.id for request in requests]},
+            format="json")
+        self.assert_http_200(response)
+        self.assertEqual(1, response.data["moderated"])
+        self.assertEqual([Role.WRITER], UserWithRoles.objects.get(user=user).roles)
+
+    def test_permissions_and_validation(self):
+        response: Response = get_authenticated_client().post(
+            "/role-requests/moderate/", {"action": "approve", "ids": [1]}, format="json")
+        self.assertEqual(403, response.status_code)
+        client = get_superuser_client()
+        for data in ({"action": "approve"}, {"action": "grant", "ids": [1]},
+                     {"action": "approve", "ids": [1], "filter": {}}, {"action": "approve", "ids": []}):
+            self.assert_http_400(client.post("/role-requests/moderate/", data, format="json"))
+
+
+class UserEmailIndexTestCase(TestCase):
+    def test_index_is_created_by_migrate(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, User._meta.db_table)
+        self.assertEqual(["email"], constraints["auth_user_email_idx"]["columns"])
@@ -0,0 +1,227 @@
+"""Stateless signed access tokens.
+
+Token is '<payload>.<signature>', both in unpadded urlsafe base64. Payload is JSON with
+user id, flags of user, snapshot of UserWithRoles.roles, version, expiration time and unique id,
+signature is HMAC-SHA256 of payload with a key derived from SECRET_KEY. So a request with
+token is authenticated and its roles are checked without queries.
+
+Tokens are revoked one by one through DeniedToken or all tokens of user by increment of
+TokenVersion, which also happens when roles, flags or password of user change and when
+user is deleted. Every process keeps the
+deny-list and versions changed during the last SIGNED_TOKENS['TTL'] in memory and reloads
+them every SIGNED_TOKENS['REVOCATION_REFRESH'] seconds.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+from Auth.enums import get_role_mask
+from Auth.models import DeniedToken, TokenVersion, UserWithRoles
+from Auth.roles import get_user_roles
+
+KEYWORD = "Bearer"
+
+
+def _get_key() -> bytes:
+    return hashlib.sha256(b"Auth.tokens:" + settings.SECRET_KEY.encode()).digest()
+
+
+def _sign(payload: bytes) -> bytes:
+    return hmac.new(_get_key(), payload, hashlib.sha256).digest()
+
+
+def _encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def issue_token(user: User) -> tuple[str, datetime]:
+    """Return signed token of user and its expiration time."""
+    expires_at = int(time.time() + settings.SIGNED_TOKENS["TTL"])
+    version = TokenVersion.objects.filter(user_id=user.pk).values_list("version", flat=True).first() or 0
+    payload = {
+        "uid": user.pk,
+        "su": user.is_superuser,
+        "st": user.is_staff,
+        "roles": list(get_user_roles(user)),
+        "ver": version,
+        "exp": expires_at,
+        "jti": secrets.token_hex(16),
+    }
+    encoded_payload = _encode(json.dumps(payload, separators=(",", ":")).encode())
+    token = f"{encoded_payload}.{_encode(_sign(encoded_payload.encode()))}"
+    return token, datetime.fromtimestamp(expires_at, tz=timezone.utc)
+
+
+def decode_token(token: str) -> dict:
+    """Return payload of valid token.
+
+    :raises exceptions.AuthenticationFailed: If token is malformed, forged, expired or revoked
+    """
+    encoded_payload, _, signature = token.partition(".")
+    try:
+        is_signed = hmac.compare_digest(_decode(signature), _sign(encoded_payload.encode()))
+        payload = json.loads(_decode(encoded_payload)) if is_signed else None
+    except (ValueError, UnicodeError):
+        raise exceptions.AuthenticationFailed("Invalid token.")
+    if payload is None:
+        raise exceptions.AuthenticationFailed("Invalid token.")
+    if payload["exp"] <= time.time():
+        raise exceptions.AuthenticationFailed("Token has expired.")
+    if revocations.is_revoked(payload):
+        raise exceptions.AuthenticationFailed("Token has been revoked.")
+    return payload
+
+
+def get_token_user(payload: dict) -> User:
+    """Return unsaved user of payload, its roles are returned by get_user_role_mask without queries."""
+    user = User(pk=payload["uid"], is_superuser=payload["su"], is_staff=payload["st"], is_active=True)
+    user.token_role_mask = get_role_mask(payload["roles"])
+    return user
+
+
+class Revocations:
+    """Process-wide copy of deny-list and recently changed token versions."""
+
+    def __init__(self, refresh_interval: float, ttl: float):
+        self.refresh_interval = refresh_interval
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # jti -> expiration timestamp
+        self._denied: dict[str, float] = {}
+        # user id -> version
+        self._versions: dict[int, int] = {}
+        self._loaded_at = float("-inf")
+
+    def is_revoked(self, payload: dict) -> bool:
+        if time.monotonic() - self._loaded_at > self.refresh_interval:
+            self.refresh()
+        return payload["jti"] in self._denied or payload["ver"] < self._versions.get(payload["uid"], 0)
+
+    def refresh(self) -> None:
+        now = datetime.now(tz=timezone.utc)
+        denied = dict(DeniedToken.objects.filter(expires_at__gt=now).values_list("jti", "expires_at"))
+        # older versions matter only while tokens issued before them are not expired
+        versions = dict(TokenVersion.objects.filter(updated_at__gt=now - timedelta(seconds=self.ttl))
+                        .values_list("user_id", "version"))
+        with self._lock:
+            self._denied = {jti: expires_at.timestamp() for jti, expires_at in denied.items()}
+            self._versions = versions
+            self._loaded_at = time.monotonic()
+
+    def deny(self, jti: str, expires_at: float) -> None:
+        with self._lock:
+            self._denied[jti] = expires_at
+
+    def set_version(self, user_id: int, version: int) -> None:
+        with self._lock:
+            self._versions[user_id] = max(version, self._versions.get(user_id, 0))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._denied = {}
+            self._versions = {}
+            self._loaded_at = float("-inf")
+
+
+revocations = Revocations(
+    refresh_interval=settings.SIGNED_TOKENS["REVOCATION_REFRESH"],
+    ttl=settings.SIGNED_TOKENS["TTL"],
+)
+
+
+def revoke_token(payload: dict) -> None:
+    """Deny token of payload until it expires, expired entries of deny-list are removed."""
+    now = datetime.now(tz=timezone.utc)
+    DeniedToken.objects.filter(expires_at__lte=now).delete()
+    DeniedToken.objects.get_or_create(jti=payload["jti"], defaults={
+        "expires_at": datetime.fromtimestamp(payload["exp"], tz=timezone.utc),
+    })
+    revocations.deny(payload["jti"], payload["exp"])
+
+
+def revoke_user_tokens(user_id: int) -> None:
+    """Revoke all issued tokens of user by one upsert of TokenVersion."""
+    table = connection.ops.quote_name(TokenVersion._meta.db_table)
+    now = datetime.now(tz=timezone.utc)
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {table} AS token_version (user_id, version, updated_at) VALUES (%s, 1, %s)
+            ON CONFLICT (user_id) DO UPDATE SET version = token_version.version + 1, updated_at = EXCLUDED.updated_at
+            RETURNING version
+        """, [user_id, now])
+        version = cursor.fetchone()[0]
+    revocations.set_version(user_id, version)
+
+
+@receiver(post_save, sender=UserWithRoles)
+def _revoke_on_roles_change(sender, instance: UserWithRoles, created: bool, **kwargs):
+    # tokens contain snapshot of roles
+    if not created:
+        revoke_user_tokens(instance.user_id)
+
+
+# fields of User which are in token or make it invalid
+_REVOKING_USER_FIELDS = ("is_active", "is_superuser", "is_staff", "password")
+
+
+def _get_loaded_revoking_fields(instance: User) -> dict:
+    # deferred fields are absent from __dict__ and are not loaded here
+    return {name: instance.__dict__[name] for name in _REVOKING_USER_FIELDS if name in instance.__dict__}
+
+
+@receiver(post_init, sender=User)
+def _remember_revoking_fields(sender, instance: User, **kwargs):
+    instance._loaded_revoking_fields = _get_loaded_revoking_fields(instance)
+
+
+@receiver(post_save, sender=User)
+def _revoke_on_user_change(sender, instance: User, created: bool, update_fields=None, **kwargs):
+    loaded = instance._loaded_revoking_fields
+    instance._loaded_revoking_fields = current = _get_loaded_revoking_fields(instance)
+    if created or (update_fields is not None and not set(_REVOKING_USER_FIELDS) & set(update_fields)):
+        return
+    # a field which was deferred at load time and is set now may have changed
+    if any(name not in loaded or loaded[name] != value for name, value in current.items()):
+        revoke_user_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def _revoke_on_user_delete(sender, instance: User, **kwargs):
+    revoke_user_tokens(instance.pk)
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """Authenticate by header 'Authorization: Bearer <token>' without queries."""
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != KEYWORD.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed("Invalid token header.")
+        try:
+            token = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed("Invalid token.")
+        payload = decode_token(token)
+        return get_token_user(payload), payload
+
+    def authenticate_header(self, request):
+        return KEYWORD
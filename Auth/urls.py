@@ -1,7 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from . import views
+from . import views, async_views
 
 app_name = "Auth"
 
@@ -9,7 +9,10 @@ router = DefaultRouter()
 router.register(r"users", views.UserViewSet, basename="user")
 router.register(r"registration", views.RegistrationViewSet, basename="registration")
 router.register(r"role-requests", views.RoleRequestCRUDViewSet, basename="create-role-request")
+router.register(r"tokens", views.SignedTokenViewSet, basename="token")
 
 urlpatterns = [
     path("", include(router.urls)),
+    path("async/registration/", async_views.registration, name="async-registration"),
+    path("async/users/<int:pk>/password/", async_views.change_password, name="async-change-password"),
 ]
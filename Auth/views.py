@@ -1,38 +1,67 @@
 from django.contrib.auth.models import User
-from rest_framework import status, viewsets
+from rest_framework import status, viewsets, serializers
+from rest_framework.authtoken.serializers import AuthTokenSerializer
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.viewsets import GenericViewSet
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.request import Request
 
 from Posts.models import Post
 from Posts.serializers import PostSerializer
+from common.instrumentation import InstrumentedViewMixin
+from common.pagination import KeysetPagination
 from common.views import (
     ModelViewSetWithCustomMixin,
+    ProfilingMixin,
     ReturnIdOnlyInCreateMixin,
     get_dict_from_request,
-    is_superuser, return_modified_response,
+    is_superuser,
 )
+from .enums import Role, RoleRequestStatus
 from .models import (
-    UserWithRoles,
+    has_role,
     UserWithRolesSerializer,
     UserSerializer,
+    UserPublicSerializer,
     UserUpdateSerializer,
     RoleRequest,
     RoleRequestCreateSerializer,
     RoleRequestGetSerializer,
+    RoleRequestFilterSerializer,
+    RoleRequestModerationSerializer,
+    RoleRequestStatusSerializer,
 )
+from .moderation import moderate_role_requests
+from .roles import get_user_roles
+from .tokens import issue_token, revoke_token, revoke_user_tokens
 from .permissions import (
     IsNotAuthenticated,
     IsSuperUserOrReadOnly,
-    IsOwnerOfRoleRequest
+    IsOwnerOfRoleRequest,
+    IsRoleRequestModerator,
 )
 
 
+class UserPostsPagination(KeysetPagination):
+    """Pagination of posts embedded into user profile, the newest first."""
+    cursor_query_param = "posts_cursor"
+    page_size_query_param = "posts_page_size"
+    ordering_query_param = "posts_ordering"
+    orderings = {
+        "-id": ("-id",),
+    }
+    default_ordering = "-id"
+    opt_in = False
+
+
 class UserViewSet(ModelViewSetWithCustomMixin):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsSuperUserOrReadOnly]
+    pagination_class = KeysetPagination
+    posts_modes = ("full", "ids", "count")
 
     def create(self, request: Request, *args, **kwargs):
         response = super().create(request, *args, **kwargs)
@@ -48,39 +77,74 @@ class UserViewSet(ModelViewSetWithCustomMixin):
         serializer.is_valid(raise_exception=True)
         serializer.save()
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == "retrieve":
+            queryset = queryset.only(*self._get_public_fields())
+        return queryset
+
+    def get_readable_fields(self) -> list[str]:
+        return list(UserPublicSerializer.Meta.fields)
+
+    def _get_public_fields(self) -> tuple[str, ...]:
+        return self.get_requested_fields() or UserPublicSerializer.Meta.fields
+
     def retrieve(self, request: Request, *args, **kwargs):
-        response = super().retrieve(request, *args, **kwargs)
+        """Return user with roles and a page of posts of the user.
 
-        data = self._serialize_and_get_extra_info_about_user(response)
-        data = {**response.data, **data}
-        del data["password"]
+        Query param 'posts' chooses how posts are embedded: 'full' (default) or 'ids'
+        return a page with link to the next one in 'posts_next', 'count' returns only 'posts_count'.
+        """
+        user = self.get_object()
+        data = {
+            **{name: getattr(user, name) for name in self._get_public_fields()},
+            "roles": list(get_user_roles(user)),
+            **self._get_posts_of_user(request, user),
+        }
         return Response(data)
 
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == "list" and "role" in self.request.query_params:
+            queryset = queryset.filter(has_role(self._get_role_param(), prefix="userwithroles__"))
+        return queryset
+
+    def _get_role_param(self) -> str:
+        role = self.request.query_params["role"]
+        if role not in Role.values:
+            raise serializers.ValidationError({"role": f"Must be one of {Role.values}"})
+        return role
+
     def list(self, request, *args, **kwargs):
-        response: Response = super().list(request, *args, **kwargs)
-        data = response.data
-        self._delete_password_from_list(response)
-        return return_modified_response(response, data=data)
+        """Return users, query param 'role' leaves only users with the role."""
+        # only public columns are selected, rows are already in output format
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = queryset.values(*self._get_public_fields())
+        if self.is_stream_requested(request):
+            return self.get_streaming_response(queryset, to_representation=dict)
 
-    @staticmethod
-    def _delete_password_from_list(response):
-        data = response.data
-        for instance in data:
-            del instance["password"]
-        return data
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(list(queryset))
 
-    @staticmethod
-    def _serialize_and_get_extra_info_about_user(response: Response) -> dict[str, any]:
-        user_id = response.data.get("id")
-        user_roles = UserWithRoles.objects.get(user_id=user_id)
-        posts = Post.objects.filter(owner_id=user_id).all()
-        posts_serializer = PostSerializer(posts, many=True)
-        data = {
-            "roles": user_roles.roles,
-            "posts": posts_serializer.data,
-            **response.data
-        }
-        return data
+    def _get_posts_of_user(self, request: Request, user: User) -> dict[str, any]:
+        mode = request.query_params.get("posts", "full")
+        if mode not in self.posts_modes:
+            raise serializers.ValidationError({"posts": f"Must be one of {list(self.posts_modes)}"})
+        posts = Post.objects.filter(owner_id=user.id)
+        if mode == "count":
+            return {"posts_count": posts.count()}
+
+        if mode == "ids":
+            posts = posts.values("id")
+        paginator = UserPostsPagination()
+        page = paginator.paginate_queryset(posts, request, view=self)
+        if mode == "ids":
+            data = [row["id"] for row in page]
+        else:
+            data = PostSerializer(page, many=True).data
+        return {"posts": data, "posts_next": paginator.get_next_link()}
 
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
@@ -97,17 +161,60 @@ class UserViewSet(ModelViewSetWithCustomMixin):
         return Response(serializer.data)
 
 
-class RegistrationViewSet(GenericViewSet, ReturnIdOnlyInCreateMixin):
+class SignedTokenViewSet(ProfilingMixin, InstrumentedViewMixin, GenericViewSet):
+    """Issue and revoke signed tokens of Auth.tokens."""
+    serializer_class = AuthTokenSerializer
+
+    def get_permissions(self):
+        if self.action == "create":
+            return [AllowAny()]
+        return [IsAuthenticated()]
+
+    def create(self, request: Request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        token, expires_at = issue_token(serializer.validated_data["user"])
+        return Response({"token": token, "expires_at": expires_at}, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=["post"])
+    def revoke(self, request: Request):
+        """Revoke signed token of request."""
+        if not isinstance(request.auth, dict):
+            return Response({"detail": "Request is not authenticated by signed token."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        revoke_token(request.auth)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=False, methods=["post"], url_path="revoke-all")
+    def revoke_all(self, request: Request):
+        """Revoke all signed tokens of user."""
+        revoke_user_tokens(request.user.pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class RegistrationViewSet(InstrumentedViewMixin, GenericViewSet, ReturnIdOnlyInCreateMixin):
     serializer_class = UserSerializer
     http_method_names = ["post"]
     queryset = User.objects.all()
     permission_classes = [IsNotAuthenticated]
 
 
-class RoleRequestCRUDViewSet(viewsets.ModelViewSet):
+class RoleRequestPagination(KeysetPagination):
+    """Pagination of role requests, the newest first by default."""
+    orderings = {
+        "-date": ("-date", "-id"),
+        "id": ("id",),
+    }
+    default_ordering = "-date"
+
+
+class RoleRequestCRUDViewSet(ProfilingMixin, InstrumentedViewMixin, viewsets.ModelViewSet):
     serializer_class = RoleRequestCreateSerializer
     queryset = RoleRequest.objects.all()
     permission_classes = [IsAuthenticated, IsOwnerOfRoleRequest]
+    pagination_class = RoleRequestPagination
+    # roles granted only by superusers, admins can't moderate requests of them
+    superuser_granted_roles = (Role.ADMIN, Role.SUPERUSER)
 
     def create(self, request: Request, *args, **kwargs):
         if "user" in request.data.keys():
@@ -130,6 +237,8 @@ class RoleRequestCRUDViewSet(viewsets.ModelViewSet):
         return serializer
 
     def update(self, request: Request, *args, **kwargs):
+        if self._is_status_change():
+            return self._moderate_one(request)
         self.get_object()
         user = request.user
         data = {**get_dict_from_request(request), "user": user.id}
@@ -148,47 +257,100 @@ class RoleRequestCRUDViewSet(viewsets.ModelViewSet):
             instance._prefetched_objects_cache = {}
         return serializer
 
+    def _moderate_one(self, request: Request):
+        """Approve or cancel opened role request the same way as moderate does."""
+        serializer = RoleRequestStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        instance = self.get_object()
+        if not is_superuser(request.user) and instance.expected_role in self.superuser_granted_roles:
+            raise PermissionDenied("Only superusers can moderate requests of this role.")
+        approve = serializer.validated_data["status"] == RoleRequestStatus.APPROVED
+        if not moderate_role_requests(RoleRequest.objects.filter(pk=instance.pk), approve=approve)["moderated"]:
+            raise ValidationError({"status": "Only opened role request can be moderated."})
+        instance.refresh_from_db()
+        return Response(RoleRequestGetSerializer(instance).data)
+
     def list(self, request: Request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
+        queryset = self._filter_queryset_by_visibility(queryset, request.user)
+        queryset = self._filter_queryset_by_query_params(queryset, request)
 
         page = self.paginate_queryset(queryset)
         if page is not None:
-            serializer = self.get_serializer(page, many=True)
+            serializer = RoleRequestGetSerializer(page, many=True)
             return self.get_paginated_response(serializer.data)
 
         serializer = RoleRequestGetSerializer(queryset, many=True)
-        response = Response(serializer.data)
-        return self._cut_response_by_owner_if_need(request, response)
+        return Response(serializer.data)
 
-    def _cut_response_by_owner_if_need(self, request, response):
-        user = request.user
-        if is_superuser(user):
-            return response
-        user_instances = self._filter_response_by_user(response, user)
-        return self._return_modified_response(response, data=user_instances)
+    @property
+    def paginator(self):
+        paginator = super().paginator
+        # list of all role requests is always paginated
+        if paginator is not None and self._sees_all_role_requests(self.request.user):
+            paginator.opt_in = False
+        return paginator
 
-    def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        serializer = RoleRequestGetSerializer(instance=instance)
-        return Response(serializer.data)
+    @staticmethod
+    def _sees_all_role_requests(user) -> bool:
+        return user.is_staff or is_superuser(user)
 
     @staticmethod
-    def _filter_response_by_user(response, user):
-        user_instances = []
-        for instance in response.data:
-            if instance["user"] == user.id:
-                user_instances.append(instance)
-        return user_instances
+    def _filter_queryset_by_visibility(queryset, user):
+        """Leave only role requests of user, staff and superusers see all of them."""
+        if RoleRequestCRUDViewSet._sees_all_role_requests(user):
+            return queryset
+        return queryset.filter(user_id=user.id)
 
     @staticmethod
-    def _return_modified_response(response, **kwargs) -> Response:
-        default_kwargs = dict(
-            data=response.data,
-            headers=response.headers,
-            exception=response.exception,
-            content_type=response.content_type,
-            template_name=response.template_name,
-            status=status.HTTP_200_OK
-        )
-        finally_kwargs = {**default_kwargs, **kwargs}
-        return Response(**finally_kwargs)
+    def _filter_queryset_by_query_params(queryset, request):
+        params = RoleRequestFilterSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return RoleRequestCRUDViewSet._apply_filters(queryset, params.validated_data)
+
+    @staticmethod
+    def _apply_filters(queryset, filters: dict):
+        if "status" in filters:
+            queryset = queryset.filter(status=filters["status"])
+        if "expected_role" in filters:
+            queryset = queryset.filter(expected_role=filters["expected_role"])
+        if "date_from" in filters:
+            queryset = queryset.filter(date__gte=filters["date_from"])
+        if "date_to" in filters:
+            queryset = queryset.filter(date__lte=filters["date_to"])
+        return queryset
+
+    def get_permissions(self):
+        if self.action == "moderate":
+            return [IsAuthenticated(), IsRoleRequestModerator()]
+        if self._is_status_change():
+            return [IsAuthenticated()]
+        return super().get_permissions()
+
+    def _is_status_change(self) -> bool:
+        """Return whether moderator changes status, status in data of other users is ignored."""
+        return (self.action in ("update", "partial_update") and "status" in self.request.data
+                and IsRoleRequestModerator().has_permission(self.request, self))
+
+    @action(detail=False, methods=["post"])
+    def moderate(self, request: Request):
+        """Approve or cancel opened role requests selected by 'ids' or 'filter' in one statement.
+
+        Approval adds expected roles to roles of users. Requests which user can't moderate are skipped.
+        """
+        serializer = RoleRequestModerationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        queryset = RoleRequest.objects.all()
+        if "ids" in data:
+            queryset = queryset.filter(id__in=data["ids"])
+        else:
+            queryset = self._apply_filters(queryset, data["filter"])
+        if not is_superuser(request.user):
+            queryset = queryset.exclude(expected_role__in=self.superuser_granted_roles)
+        return Response(moderate_role_requests(queryset, approve=data["action"] == "approve"))
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        serializer = RoleRequestGetSerializer(instance=instance)
+        return Response(serializer.data)
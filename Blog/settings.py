@@ -49,11 +49,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'common.instrumentation.RequestMetricsMiddleware',
+    'common.traffic.TrafficCaptureMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'Auth.roles.RequestRoleCacheMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -141,7 +144,84 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication'
+        'rest_framework.authentication.TokenAuthentication',
+        'Auth.tokens.SignedTokenAuthentication',
     ],
 }
 LOGIN_REDIRECT_URL = '/'
+
+# Opt-in keyset pagination of lists, see common/pagination.py
+PAGINATION = {
+    'PAGE_SIZE': 50,
+    'MAX_PAGE_SIZE': 500,
+}
+
+# Cache of GET responses of posts and bodies, see common/response_cache.py;
+# BACKEND is common.response_cache.LocMemResponseCache or common.response_cache.FileResponseCache,
+# which is required with several worker processes, otherwise a worker serves stale responses until TTL
+RESPONSE_CACHE = {
+    'BACKEND': os.getenv('RESPONSE_CACHE_BACKEND', 'common.response_cache.LocMemResponseCache'),
+    'MAX_SIZE': int(os.getenv('RESPONSE_CACHE_MAX_SIZE', 10_000)),
+    # directory of FileResponseCache owned and writable only by user of the app, created if it doesn't exist
+    'LOCATION': os.getenv('RESPONSE_CACHE_LOCATION'),
+    # seconds, bounds staleness of responses written by another process
+    'TTL': float(os.getenv('RESPONSE_CACHE_TTL', 60)),
+}
+
+# Process-wide cache of serialized posts assembled into lists, see Posts/serializers.py
+POST_FRAGMENT_CACHE = {
+    'MAX_SIZE': int(os.getenv('POST_FRAGMENT_CACHE_MAX_SIZE', 50_000)),
+}
+
+# Precomputed hot posts, see Posts/ranking.py
+HOT_POSTS = {
+    'SIZE': int(os.getenv('HOT_POSTS_SIZE', 100)),
+    'RECENCY_SECONDS': 45_000,
+}
+
+# Max number of async views using database at once in one worker, see common/async_views.py
+ASYNC_DB_CONNECTIONS = int(os.getenv('ASYNC_DB_CONNECTIONS', 20))
+
+# Pool hashing passwords in async views, see Auth/hashing.py
+PASSWORD_HASHING = {
+    'WORKERS': int(os.getenv('PASSWORD_HASHING_WORKERS', os.cpu_count() or 1)),
+    'MAX_PENDING': int(os.getenv('PASSWORD_HASHING_MAX_PENDING', 64)),
+}
+
+# Per-request SQL and timing metrics, see common/instrumentation.py
+REQUEST_METRICS = {
+    # share of measured requests from 0 to 1
+    'SAMPLE_RATE': float(os.getenv('REQUEST_METRICS_SAMPLE_RATE', 0.1)),
+    # measured requests slower than this are logged with their slowest queries
+    'SLOW_REQUEST_MS': float(os.getenv('REQUEST_METRICS_SLOW_REQUEST_MS', 500)),
+    'SLOW_QUERIES': 5,
+}
+
+# cProfile captures of requests of superusers, see common/profiling.py
+PROFILING = {
+    # directory of profiles, temporary directory by default
+    'DIR': os.getenv('PROFILING_DIR'),
+    # the oldest profiles over this number are removed
+    'MAX_PROFILES': int(os.getenv('PROFILING_MAX_PROFILES', 50)),
+}
+
+# Sampled capture of requests for replay, see common/traffic.py
+TRAFFIC_CAPTURE = {
+    # share of requests appended to PATH from 0 to 1, replayed by benchmarks/replay.py
+    'SAMPLE_RATE': float(os.getenv('TRAFFIC_CAPTURE_SAMPLE_RATE', 0)),
+    'PATH': os.getenv('TRAFFIC_CAPTURE_PATH', str(BASE_DIR / 'traffic.jsonl')),
+}
+
+# Stateless signed access tokens, see Auth/tokens.py
+SIGNED_TOKENS = {
+    # seconds of life of signed token
+    'TTL': int(os.getenv('SIGNED_TOKENS_TTL', 900)),
+    # seconds between reloads of revoked tokens by every process
+    'REVOCATION_REFRESH': float(os.getenv('SIGNED_TOKENS_REVOCATION_REFRESH', 5)),
+}
+
+# Process-wide cache of UserWithRoles.roles, see Auth/roles.py
+ROLE_CACHE = {
+    'MAX_SIZE': int(os.getenv('ROLE_CACHE_MAX_SIZE', 10_000)),
+    'TTL': float(os.getenv('ROLE_CACHE_TTL', 60)),
+}
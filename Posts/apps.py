@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class PostsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Posts'
+
+    def ready(self):
+        # connects signals which maintain search vectors, hot posts and cached responses
+        from . import caching, ranking, search  # noqa: F401
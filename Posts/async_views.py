@@ -0,0 +1,55 @@
+"""Async read views of posts and bodies.
+
+They return the same data as PostViewSet and BodyViewSet, but read database with
+async ORM, so under ASGI one worker keeps many slow connections open.
+"""
+from django.http import HttpRequest, JsonResponse
+from django.views.decorators.http import require_GET
+from rest_framework import exceptions
+
+from common.async_views import aget_drf_request, exception_response, json_response, limit_db_connections
+from Posts import models, serializers
+from Posts.views import PostViewSet, PostKeysetPagination, BodyViewSet
+
+
+@require_GET
+@limit_db_connections
+async def post_list(request: HttpRequest) -> JsonResponse:
+    try:
+        drf_request = await aget_drf_request(request, PostViewSet.permission_classes)
+        paginator = PostKeysetPagination()
+        queryset = models.Post.objects.all()
+        page = await paginator.apaginate_queryset(queryset, drf_request)
+    except exceptions.APIException as exc:
+        return exception_response(exc)
+
+    serializer = serializers.PostSerializer()
+    if page is not None:
+        data = [serializer.to_representation(post) for post in page]
+        return json_response({"next": paginator.get_next_link(), "results": data})
+    return json_response([serializer.to_representation(post) async for post in queryset])
+
+
+@require_GET
+@limit_db_connections
+async def post_detail(request: HttpRequest, pk: int) -> JsonResponse:
+    return await _retrieve(request, pk, models.Post, serializers.PostSerializer,
+                           PostViewSet.permission_classes)
+
+
+@require_GET
+@limit_db_connections
+async def body_detail(request: HttpRequest, pk: int) -> JsonResponse:
+    return await _retrieve(request, pk, models.Body, serializers.BodySerializer,
+                           BodyViewSet.permission_classes)
+
+
+async def _retrieve(request: HttpRequest, pk: int, model, serializer_class, permission_classes) -> JsonResponse:
+    try:
+        await aget_drf_request(request, permission_classes)
+        instance = await model.objects.aget(pk=pk)
+    except exceptions.APIException as exc:
+        return exception_response(exc)
+    except model.DoesNotExist:
+        return exception_response(exceptions.NotFound(f"No {model.__name__} matches the given query."))
+    return json_response(serializer_class(instance).data)
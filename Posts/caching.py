@@ -0,0 +1,44 @@
+"""Invalidation of cached responses of PostViewSet and BodyViewSet."""
+from collections.abc import Iterable
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from common.response_cache import LocMemResponseCache, invalidate_responses
+from Posts.models import Body, Post
+
+POSTS_CACHE_NAME = "posts"
+BODIES_CACHE_NAME = "bodies"
+
+# (post id, version, shape of output) -> (data, JSON) of serialized post, see PostListSerializer
+post_fragment_cache = LocMemResponseCache(max_size=settings.POST_FRAGMENT_CACHE["MAX_SIZE"])
+
+
+def invalidate_post_responses(post_ids: Iterable[int]) -> None:
+    """Make cached responses of posts stale once current transaction is committed."""
+    _invalidate_on_commit([f"{POSTS_CACHE_NAME}:list", *(f"{POSTS_CACHE_NAME}:{post_id}" for post_id in post_ids)])
+
+
+def invalidate_body_responses(body_ids: Iterable[int]) -> None:
+    """Make cached responses of bodies stale once current transaction is committed."""
+    # posts with included bodies are tagged with list of bodies
+    _invalidate_on_commit([f"{BODIES_CACHE_NAME}:list", *(f"{BODIES_CACHE_NAME}:{body_id}" for body_id in body_ids)])
+
+
+def _invalidate_on_commit(tags: list[str]) -> None:
+    # otherwise a concurrent read before commit would cache old data under new versions
+    transaction.on_commit(lambda: invalidate_responses(tags))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def _invalidate_post(sender, instance: Post, **kwargs):
+    invalidate_post_responses([instance.id])
+
+
+@receiver(post_save, sender=Body)
+@receiver(post_delete, sender=Body)
+def _invalidate_body(sender, instance: Body, **kwargs):
+    invalidate_body_responses([instance.id])
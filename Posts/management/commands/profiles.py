@@ -0,0 +1,36 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from common.profiling import list_profiles, load_stats
+
+
+class Command(BaseCommand):
+    help = "List profiles of requests captured with 'X-Profile: 1' or summarize one of them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("profile_id", nargs="?", help="Id of profile to summarize")
+        parser.add_argument("--sort", default="cumulative", help="pstats sort key of summary")
+        parser.add_argument("--limit", type=int, default=30, help="Number of functions in summary")
+
+    def handle(self, *args, **options):
+        if options["profile_id"] is None:
+            self._list()
+            return
+        try:
+            stats = load_stats(options["profile_id"], stream=self.stdout)
+        except FileNotFoundError:
+            raise CommandError(f"Profile {options['profile_id']} does not exist")
+        stats.strip_dirs().sort_stats(options["sort"]).print_stats(options["limit"])
+
+    def _list(self):
+        profiles = list_profiles()
+        if not profiles:
+            self.stdout.write("No profiles")
+            return
+        for profile in profiles:
+            created_at = datetime.fromtimestamp(profile["created_at"]).isoformat(sep=" ", timespec="seconds")
+            self.stdout.write(
+                f"{profile['id']}  {created_at}  {profile['status']}  {profile['duration_ms']:8.1f} ms  "
+                f"{profile['method']} {profile['path']}  {profile['view']}  user {profile['user']}"
+            )
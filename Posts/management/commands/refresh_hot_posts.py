@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from Posts.ranking import refresh_hot_posts
+
+
+class Command(BaseCommand):
+    help = "Refresh precomputed hot posts from posts changed since the last refresh."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Recompute from all posts")
+
+    def handle(self, *args, **options):
+        result = refresh_hot_posts(full=options["full"])
+        mode = "full" if result["full"] else "incremental"
+        self.stdout.write(f"Refreshed hot posts ({mode}): {result['changed']} changes, {result['size']} posts")
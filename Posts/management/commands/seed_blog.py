@@ -0,0 +1,159 @@
+import random
+import time
+from collections.abc import Iterable
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from Auth.enums import Role, RoleRequestStatus
+from Auth.models import UserWithRoles, RoleRequest, has_role
+from Posts.models import Body, Post
+from Posts.ranking import refresh_hot_posts
+from Posts.search import update_search_vectors
+
+SEED_PASSWORD = "<PasSWORD1>"
+# posts are created evenly over this period before now
+SEED_PERIOD_SECONDS = 30 * 24 * 3600
+
+
+class Command(BaseCommand):
+    help = "Fill database with generated users, roles, posts and role requests via COPY FROM STDIN."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=0)
+        parser.add_argument("--posts", type=int, default=0)
+        parser.add_argument("--role-requests", type=int, default=0)
+        parser.add_argument("--seed", type=int, default=0, help="Seed of random generator")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        with transaction.atomic(), connection.cursor() as cursor:
+            user_ids = self._copy_users(cursor, options["users"], rng)
+            writer_ids = self._get_writer_ids(user_ids, options["posts"])
+            self._copy_posts(cursor, options["posts"], writer_ids, rng)
+            self._copy_role_requests(cursor, options["role_requests"], user_ids, rng)
+
+    def _copy_users(self, cursor, count: int, rng: random.Random) -> list[int]:
+        if count <= 0:
+            return []
+        first_id = _get_next_id(cursor, User)
+        user_ids = list(range(first_id, first_id + count))
+        password = make_password(SEED_PASSWORD)
+        now = timezone.now()
+        users = ((user_id, f"seed-{user_id}", f"seed-{user_id}@mail.ru", password,
+                  False, False, True, "", "", now) for user_id in user_ids)
+        self._copy(cursor, User, ("id", "username", "email", "password", "is_superuser",
+                                  "is_staff", "is_active", "first_name", "last_name", "date_joined"), users)
+        roles = ((user_id, _generate_roles(rng)) for user_id in user_ids)
+        self._copy(cursor, UserWithRoles, ("user", "roles"), roles)
+        return user_ids
+
+    @staticmethod
+    def _get_writer_ids(user_ids: list[int], posts_count: int) -> list[int]:
+        if posts_count <= 0:
+            return []
+        # ids are written in bulk, so query is faster than keeping roles of every generated user
+        writer_ids = list(UserWithRoles.objects.filter(has_role(Role.WRITER))
+                          .values_list("user_id", flat=True))
+        if not writer_ids:
+            raise CommandError("There are no writers to own posts, add --users")
+        return writer_ids
+
+    def _copy_posts(self, cursor, count: int, writer_ids: list[int], rng: random.Random) -> None:
+        if count <= 0:
+            return
+        first_body_id = _get_next_id(cursor, Body)
+        first_post_id = _get_next_id(cursor, Post)
+        body_ids = range(first_body_id, first_body_id + count)
+        # generation of text is slower than COPY, so texts are taken from small pool
+        texts = [_generate_text(rng) for _ in range(1000)]
+        now = timezone.now()
+        bodies = ((body_id, rng.choice(texts), now) for body_id in body_ids)
+        self._copy(cursor, Body, ("id", "text", "updated_at"), bodies)
+        posts = (self._generate_post(post_id, body_id, writer_ids, now, rng)
+                 for post_id, body_id in zip(range(first_post_id, first_post_id + count), body_ids))
+        columns = ("id", "owner", "title", "body", "is_restricted", "rating", "created_at", "updated_at")
+        self._copy(cursor, Post, columns, posts)
+        start = time.perf_counter()
+        update_search_vectors(Post.objects.filter(id__gte=first_post_id))
+        self.stdout.write(f"Search vectors of posts in {time.perf_counter() - start:.1f}s")
+        start = time.perf_counter()
+        refresh_hot_posts(full=True)
+        self.stdout.write(f"Hot posts in {time.perf_counter() - start:.1f}s")
+
+    @staticmethod
+    def _generate_post(post_id: int, body_id: int, writer_ids: list[int], now, rng: random.Random) -> tuple:
+        created_at = now - timedelta(seconds=rng.uniform(0, SEED_PERIOD_SECONDS))
+        return (post_id, rng.choice(writer_ids), f"seed post {post_id}", body_id,
+                rng.random() < 0.1, round(rng.uniform(0, 10), 2), created_at, created_at)
+
+    def _copy_role_requests(self, cursor, count: int, user_ids: list[int], rng: random.Random) -> None:
+        if count <= 0:
+            return
+        if not user_ids:
+            user_ids = list(User.objects.values_list("id", flat=True))
+        if not user_ids:
+            raise CommandError("There are no users to own role requests, add --users")
+        first_id = _get_next_id(cursor, RoleRequest)
+        today = timezone.now().date()
+        roles, statuses = list(Role.values), list(RoleRequestStatus.values)
+        role_requests = ((role_request_id, today - timedelta(days=rng.randrange(3650)), rng.choice(user_ids),
+                          rng.choice(roles), rng.choice(statuses), "Give me role")
+                         for role_request_id in range(first_id, first_id + count))
+        self._copy(cursor, RoleRequest, ("id", "date", "user", "expected_role", "status", "message"),
+                   role_requests)
+
+    def _copy(self, cursor, model: type[models.Model], field_names: tuple[str, ...], rows: Iterable) -> None:
+        table = connection.ops.quote_name(model._meta.db_table)
+        columns = ", ".join(connection.ops.quote_name(model._meta.get_field(name).column)
+                            for name in field_names)
+        start = time.perf_counter()
+        count = 0
+        with cursor.copy(f"COPY {table} ({columns}) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row(row)
+                count += 1
+        _sync_id_sequence(cursor, model)
+        # without statistics planner treats loaded table as empty until autovacuum analyzes it
+        cursor.execute(f"ANALYZE {table}")
+        self.stdout.write(f"{model.__name__}: {count} rows in {time.perf_counter() - start:.1f}s")
+
+
+def _get_next_id(cursor, model: type[models.Model]) -> int:
+    table = connection.ops.quote_name(model._meta.db_table)
+    cursor.execute(f"SELECT COALESCE(MAX({connection.ops.quote_name(model._meta.pk.column)}), 0) + 1 FROM {table}")
+    return cursor.fetchone()[0]
+
+
+def _sync_id_sequence(cursor, model: type[models.Model]) -> None:
+    """Move sequence of primary key after copied ids, so next inserts don't conflict."""
+    if not isinstance(model._meta.pk, models.AutoField | models.BigAutoField):
+        return
+    # name of table is case sensitive, so it is quoted inside of argument too
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = model._meta.pk.column
+    cursor.execute(
+        f"SELECT setval(pg_get_serial_sequence(%s, %s), MAX({connection.ops.quote_name(column)})) FROM {table}",
+        [table, column],
+    )
+
+
+def _generate_roles(rng: random.Random) -> list[str]:
+    chance = rng.random()
+    if chance < 0.1:
+        return []
+    if chance < 0.12:
+        return [Role.WRITER, Role.MODERATOR]
+    return [Role.WRITER]
+
+
+_WORDS = ("lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit",
+          "sed", "do", "eiusmod", "tempor", "incididunt", "ut", "labore", "et", "dolore")
+
+
+def _generate_text(rng: random.Random) -> str:
+    return " ".join(rng.choices(_WORDS, k=rng.randint(20, 200)))
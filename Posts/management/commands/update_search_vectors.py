@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from Posts.models import Post
+from Posts.search import update_search_vectors
+
+
+class Command(BaseCommand):
+    help = "Recompute stored search vectors of posts, e.g. after rows were loaded bypassing ORM."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--only-missing", action="store_true", help="Update only posts without vector")
+
+    def handle(self, *args, **options):
+        posts = Post.objects.all()
+        if options["only_missing"]:
+            posts = posts.filter(search_vector__isnull=True)
+        count = update_search_vectors(posts)
+        self.stdout.write(f"Updated {count} posts")
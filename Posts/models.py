@@ -1,9 +1,13 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.utils import timezone
 
 
 class Body(models.Model):
     text = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
 
 
 class Post(models.Model):
@@ -12,3 +16,27 @@ class Post(models.Model):
     body = models.OneToOneField(Body, on_delete=models.CASCADE)
     is_restricted = models.BooleanField(default=False)
     rating = models.FloatField(default=0)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    # title and text of body, maintained by Posts.search
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="post_search_vector_idx"),
+            # posts of user in profile
+            models.Index(fields=["owner", "id"], name="post_owner_id_idx"),
+            # keyset pagination by rating
+            models.Index(fields=["rating", "id"], name="post_rating_id_idx"),
+        ]
+
+
+class HotPost(models.Model):
+    """Precomputed top of posts by hot score, maintained by Posts.ranking."""
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True)
+    score = models.FloatField(db_index=True)
+
+
+class PostRankingChange(models.Model):
+    """Id of post changed since the last refresh of HotPost."""
+    post_id = models.BigIntegerField(primary_key=True)
@@ -0,0 +1,126 @@
+"""Hot posts ranking.
+
+Hot score is ln(1 + rating) + created_at / RECENCY_SECONDS, so a post gains one point
+of score for every RECENCY_SECONDS it is newer. Order of unchanged posts by such score
+doesn't change with time, that is why HotPost is refreshed only from changed posts.
+Restricted posts are not ranked.
+
+HotPost keeps top of 2 * SIZE posts, so posts leaving the top are replaced
+without full recomputation, and /posts/hot/ serves top SIZE of them. Changed posts
+falling below the lowest score of HotPost are dropped from it, and HotPost is recomputed
+when less than SIZE posts are left not below that score.
+"""
+from collections.abc import Iterable
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from Posts.models import HotPost, Post, PostRankingChange
+
+
+def get_hot_posts_size() -> int:
+    return settings.HOT_POSTS["SIZE"]
+
+
+def get_hot_posts(limit: int | None = None, related: Iterable[str] = ()):
+    """Return list of hot posts, the hottest first.
+
+    :param limit: max number of posts, size of hot posts by default
+    :param related: relations of post to load with select_related
+    """
+    limit = min(limit or get_hot_posts_size(), get_hot_posts_size())
+    related = ["post", *(f"post__{name}" for name in related)]
+    hot_posts = HotPost.objects.select_related(*related).order_by("-score")[:limit]
+    return [hot_post.post for hot_post in hot_posts]
+
+
+def mark_posts_changed(post_ids: Iterable[int]) -> None:
+    changes = [PostRankingChange(post_id=post_id) for post_id in post_ids]
+    PostRankingChange.objects.bulk_create(changes, ignore_conflicts=True)
+
+
+def refresh_hot_posts(full: bool = False) -> dict[str, int]:
+    """Recompute HotPost in set-based SQL.
+
+    :param full: recompute from all posts instead of changed ones
+    :returns: number of processed changes and size of HotPost
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        changed = 0
+        if not full:
+            threshold = _get_threshold(cursor)
+            changed = _apply_changes(cursor, threshold)
+            # posts which left the top can't be replaced from changes only
+            full = _count_not_below(cursor, threshold) < get_hot_posts_size()
+        if full:
+            _recompute_all(cursor)
+        return {"changed": changed, "full": int(full), "size": HotPost.objects.count()}
+
+
+def _get_threshold(cursor) -> float | None:
+    """Return min score of full HotPost, posts out of HotPost are not hotter than it.
+
+    :returns: None if HotPost is not full, so it has every ranked post
+    """
+    cursor.execute(f"SELECT COUNT(*), MIN(score) FROM {_table(HotPost)}")
+    count, min_score = cursor.fetchone()
+    return min_score if count >= _get_capacity() else None
+
+
+def _apply_changes(cursor, threshold: float | None) -> int:
+    cursor.execute(f"DELETE FROM {_table(PostRankingChange)} RETURNING post_id")
+    post_ids = [row[0] for row in cursor.fetchall()]
+    if not post_ids:
+        return 0
+    cursor.execute(f"DELETE FROM {_table(HotPost)} WHERE post_id = ANY(%s)", [post_ids])
+    # changed posts below threshold may be not hotter than posts out of HotPost
+    cursor.execute(f"""
+        INSERT INTO {_table(HotPost)} (post_id, score)
+        SELECT * FROM (
+            SELECT id, {_SCORE_SQL} AS score FROM {_table(Post)}
+            WHERE id = ANY(%s) AND NOT is_restricted
+        ) AS changed
+        WHERE %s::double precision IS NULL OR score >= %s
+    """, [settings.HOT_POSTS["RECENCY_SECONDS"], post_ids, threshold, threshold])
+    cursor.execute(f"""
+        DELETE FROM {_table(HotPost)} WHERE post_id IN (
+            SELECT post_id FROM {_table(HotPost)} ORDER BY score DESC OFFSET %s
+        )
+    """, [_get_capacity()])
+    return len(post_ids)
+
+
+def _count_not_below(cursor, threshold: float | None) -> int:
+    cursor.execute(f"SELECT COUNT(*) FROM {_table(HotPost)} WHERE %s::double precision IS NULL OR score >= %s",
+                   [threshold, threshold])
+    return cursor.fetchone()[0]
+
+
+def _recompute_all(cursor) -> None:
+    cursor.execute(f"DELETE FROM {_table(PostRankingChange)}")
+    cursor.execute(f"DELETE FROM {_table(HotPost)}")
+    cursor.execute(f"""
+        INSERT INTO {_table(HotPost)} (post_id, score)
+        SELECT id, {_SCORE_SQL} AS score FROM {_table(Post)}
+        WHERE NOT is_restricted
+        ORDER BY score DESC LIMIT %s
+    """, [settings.HOT_POSTS["RECENCY_SECONDS"], _get_capacity()])
+
+
+_SCORE_SQL = "LN(1 + GREATEST(rating, 0)) + EXTRACT(EPOCH FROM created_at) / %s"
+
+
+def _get_capacity() -> int:
+    return 2 * get_hot_posts_size()
+
+
+def _table(model) -> str:
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def _mark_post_changed(sender, instance: Post, **kwargs):
+    mark_posts_changed([instance.id])
@@ -0,0 +1,45 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db.models import F, FloatField, OuterRef, QuerySet, Subquery
+from django.db.models.functions import Cast
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from Posts.models import Body, Post
+
+SEARCH_CONFIG = "english"
+
+
+def get_search_vector() -> SearchVector:
+    """Vector of title (weight A) and text of body (weight B) of post."""
+    body_text = Subquery(Body.objects.filter(id=OuterRef("body_id")).values("text")[:1])
+    return (SearchVector("title", weight="A", config=SEARCH_CONFIG) +
+            SearchVector(body_text, weight="B", config=SEARCH_CONFIG))
+
+
+def update_search_vectors(posts: QuerySet | None = None) -> int:
+    """Recompute stored search vector of posts in one UPDATE.
+
+    :param posts: posts to update, all posts by default
+    :returns: number of updated posts
+    """
+    if posts is None:
+        posts = Post.objects.all()
+    return posts.update(search_vector=get_search_vector())
+
+
+def search_posts(text: str) -> QuerySet:
+    """Return posts matching text annotated with 'rank'."""
+    query = SearchQuery(text, search_type="websearch", config=SEARCH_CONFIG)
+    # ts_rank returns real, double precision keeps the value exact in cursor of keyset pagination
+    rank = Cast(SearchRank(F("search_vector"), query), FloatField())
+    return Post.objects.filter(search_vector=query).annotate(rank=rank)
+
+
+@receiver(post_save, sender=Post)
+def _update_search_vector_of_post(sender, instance: Post, **kwargs):
+    update_search_vectors(Post.objects.filter(id=instance.id))
+
+
+@receiver(post_save, sender=Body)
+def _update_search_vector_of_body_post(sender, instance: Body, **kwargs):
+    update_search_vectors(Post.objects.filter(body_id=instance.id))
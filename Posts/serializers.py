@@ -1,14 +1,96 @@
 import re
+from collections import Counter
 
 from django.contrib.auth.models import User
+from django.db import transaction
 from rest_framework import serializers
 
-from Auth.models import UserWithRoles
-from Auth.enums import Role
+from Auth.enums import Role, get_role_mask
+from Auth.models import UserPublicSerializer, UserWithRoles
+from Auth.roles import get_user_role_mask
 from Posts import models
+from Posts.caching import invalidate_post_responses, post_fragment_cache
+from Posts.ranking import mark_posts_changed
+from Posts.search import update_search_vectors
+from common.instrumentation import TimedSerializerMixin, timed_serialization
+from common.renderers import PreRenderedList, render_json_fragment
 
+OWNER_ROLES_MASK = get_role_mask((Role.WRITER, Role.ADMIN, Role.SUPERUSER))
+
+
+def can_own_posts(role_mask: int) -> bool:
+    return bool(role_mask & OWNER_ROLES_MASK)
+
+
+class PostListSerializer(serializers.ListSerializer):
+    """Serialize posts reusing their cached data and JSON.
+
+    Entry of post_fragment_cache is keyed by id and updated_at of post and by shape of output,
+    so a changed post or differently requested fields never get a stale entry. Only missed
+    posts are serialized, PreRenderedJSONRenderer joins JSON of all of them into response.
+    """
+
+    def to_representation(self, data) -> PreRenderedList:
+        with timed_serialization():
+            return self._to_representation(data)
+
+    def _to_representation(self, data) -> PreRenderedList:
+        posts = data.all() if hasattr(data, "all") else data
+        shape = self._get_shape()
+        if shape is None:
+            items = [self.child.to_representation(post) for post in posts]
+            return PreRenderedList(items, fragments=[render_json_fragment(item) for item in items], serializer=self)
+
+        items, fragments = [], []
+        for post in posts:
+            key = self._get_fragment_key(post, shape)
+            entry = post_fragment_cache.get(key)
+            if entry is None:
+                item = self.child.to_representation(post)
+                entry = (item, render_json_fragment(item))
+                post_fragment_cache.set(key, entry)
+            items.append(entry[0])
+            fragments.append(entry[1])
+        return PreRenderedList(items, fragments=fragments, serializer=self)
+
+    @property
+    def data(self) -> PreRenderedList:
+        data = super().data
+        return PreRenderedList(data, fragments=self._data.fragments, serializer=self)
+
+    def _get_shape(self) -> tuple[tuple[str, ...], tuple[str, ...]] | None:
+        """Return fields and included relations of output, None if output can't be cached."""
+        include = tuple(name for name in self.context.get("include", ()) if name in self.child.fields)
+        if "owner" in include:
+            # users have no time of change
+            return None
+        return tuple(self.child.fields), include
+
+    @staticmethod
+    def _get_fragment_key(post: models.Post, shape: tuple[tuple[str, ...], tuple[str, ...]]) -> str:
+        fields, include = shape
+        version = post.updated_at.isoformat()
+        if "body" in include:
+            version += "/" + post.body.updated_at.isoformat()
+        return f"{post.id}:{version}:{','.join(fields)}:{','.join(include)}"
+
+
+class PostSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Post with ids of owner and body.
+
+    Owner and body are inlined if they are in 'include' of context,
+    they should be loaded with select_related to avoid a query per post.
+    """
+
+    def to_representation(self, instance: models.Post):
+        data = super().to_representation(instance)
+        include = self.context.get("include", ())
+        if "owner" in include and "owner" in data:
+            data["owner"] = UserPublicSerializer(instance.owner).data
+        if "body" in include and "body" in data:
+            data["body"] = BodySerializer(instance.body).data
+        return data
 
-class PostSerializer(serializers.ModelSerializer):
     def validate_owner(self, owner: User):
         return self._check_user_can_be_owner(owner)
 
@@ -20,10 +102,7 @@ class PostSerializer(serializers.ModelSerializer):
         :raises serializers.ValidationError: If user can't be owner
         :returns: user from param user
         """
-        user_roles = UserWithRoles.objects.get(user=user)
-        if Role.WRITER in user_roles.roles or \
-                Role.ADMIN in user_roles.roles or \
-                Role.SUPERUSER in user_roles.roles:
+        if can_own_posts(get_user_role_mask(user)):
             return user
         else:
             raise serializers.ValidationError(f"{user} cannot own any post")
@@ -42,11 +121,109 @@ class PostSerializer(serializers.ModelSerializer):
         return round(value, 2)
 
     class Meta:
-        fields = '__all__'
+        exclude = ('search_vector', 'created_at', 'updated_at')
         model = models.Post
+        list_serializer_class = PostListSerializer
+
+
+class PostBulkItemSerializer(PostSerializer):
+    """Validate one post of bulk creation without queries.
+
+    Owner, body and uniqueness of title are checked for all posts at once by PostBulkCreateSerializer.
+    """
+    owner = serializers.IntegerField()
+    body = serializers.IntegerField()
+
+    def validate_owner(self, owner: int):
+        return owner
+
+    class Meta(PostSerializer.Meta):
+        extra_kwargs = {"title": {"validators": []}}
+
+
+class PostBulkCreateSerializer(serializers.ListSerializer):
+    """Validate and create list of posts with constant number of queries.
+
+    Errors are returned per item in order of input, valid items get empty dict.
+    """
+    child = PostBulkItemSerializer()
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("allow_empty", False)
+        super().__init__(*args, **kwargs)
+
+    def to_internal_value(self, data) -> list[dict]:
+        if not self._is_list_of_allowed_size(data):
+            # raises error of input format
+            return super().to_internal_value(data)
+
+        attrs, errors = [], []
+        for item in data:
+            try:
+                attrs.append(self.child.run_validation(item))
+                errors.append({})
+            except serializers.ValidationError as exc:
+                attrs.append(None)
+                errors.append(exc.detail)
+
+        valid_items = [(item, item_errors) for item, item_errors in zip(attrs, errors) if item is not None]
+        self._check_owners(valid_items)
+        self._check_titles(valid_items)
+        self._check_bodies(valid_items)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return attrs
+
+    def _is_list_of_allowed_size(self, data) -> bool:
+        if not isinstance(data, list) or not data:
+            return False
+        return self.max_length is None or len(data) <= self.max_length
+
+    @staticmethod
+    def _check_owners(items: list[tuple[dict, dict]]) -> None:
+        owner_ids = {item["owner"] for item, _ in items}
+        role_mask_by_owner = dict(UserWithRoles.objects.filter(user_id__in=owner_ids)
+                                  .values_list("user_id", "role_mask"))
+        for item, item_errors in items:
+            if not can_own_posts(role_mask_by_owner.get(item["owner"], 0)):
+                item_errors["owner"] = [f"User {item['owner']} cannot own any post"]
+
+    @staticmethod
+    def _check_titles(items: list[tuple[dict, dict]]) -> None:
+        titles = Counter(item["title"] for item, _ in items)
+        existing_titles = set(models.Post.objects.filter(title__in=titles).values_list("title", flat=True))
+        for item, item_errors in items:
+            if item["title"] in existing_titles or titles[item["title"]] > 1:
+                item_errors["title"] = ["post with this title already exists."]
+
+    @staticmethod
+    def _check_bodies(items: list[tuple[dict, dict]]) -> None:
+        body_ids = Counter(item["body"] for item, _ in items)
+        post_by_body = dict(models.Body.objects.filter(id__in=body_ids).values_list("id", "post"))
+        for item, item_errors in items:
+            body_id = item["body"]
+            if body_id not in post_by_body:
+                item_errors["body"] = [f'Invalid pk "{body_id}" - object does not exist.']
+            elif post_by_body[body_id] is not None or body_ids[body_id] > 1:
+                item_errors["body"] = ["post with this body already exists."]
+
+    def create(self, validated_data: list[dict]) -> list[models.Post]:
+        posts = []
+        for item in validated_data:
+            item = dict(item)
+            item["owner_id"], item["body_id"] = item.pop("owner"), item.pop("body")
+            posts.append(models.Post(**item))
+        with transaction.atomic():
+            posts = models.Post.objects.bulk_create(posts)
+            # bulk_create doesn't send post_save
+            post_ids = [post.id for post in posts]
+            update_search_vectors(models.Post.objects.filter(id__in=post_ids))
+            mark_posts_changed(post_ids)
+            invalidate_post_responses(post_ids)
+        return posts
 
 
-class BodySerializer(serializers.ModelSerializer):
+class BodySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
-        fields = '__all__'
+        exclude = ('updated_at',)
         model = models.Body
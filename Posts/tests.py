@@ -0,0 +1,820 @@
+import base64
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from Posts.models import Post
+from Auth.models import RoleRequest, UserWithRoles
+from Auth.enums import Role
+from Auth.test_utils import create_unique_user, get_authenticated_client, get_superuser_client, give_role
+from Posts.caching import post_fragment_cache
+from Posts.management.commands.seed_blog import SEED_PASSWORD
+from Posts.ranking import get_hot_posts, refresh_hot_posts
+from Posts.serializers import PostSerializer
+from Posts.test_utils import create_body, create_post, get_create_dict_for_post
+from Posts.views import BodyViewSet
+from common.response_cache import (
+    FileResponseCache,
+    LocMemResponseCache,
+    clear_response_cache,
+    get_response_cache_stats,
+)
+from common.tests import HTTPAsserts
+from common.traffic import REDACTED_PASSWORD, read_records
+
+
+class PostPaginationTestCase(TestCase, HTTPAsserts):
+    path: str = "/posts/"
+
+    def test_not_paginated_by_default(self):
+        create_post()
+        response: Response = APIClient().get(self.path)
+        self.assert_http_200(response)
+        self.assertIsInstance(response.data, list)
+
+    def test_walk_pages_by_id(self):
+        posts = [create_post() for _ in range(5)]
+        ids = self._walk_pages(f"{self.path}?page_size=2")
+        self.assertEqual([post.id for post in posts], ids)
+
+    def test_walk_pages_by_rating(self):
+        ratings = [3, 1, 3, 2, 3, 1]
+        for rating in ratings:
+            create_post(rating=rating)
+        ids = self._walk_pages(f"{self.path}?page_size=2&ordering=-rating")
+        expected = Post.objects.order_by("-rating", "-id").values_list("id", flat=True)
+        self.assertEqual(list(expected), ids)
+
+    def test_page_size_is_capped(self):
+        with self.settings(PAGINATION={"PAGE_SIZE": 2, "MAX_PAGE_SIZE": 3}):
+            for _ in range(4):
+                create_body()
+            response: Response = APIClient().get("/bodies/?page_size=100")
+        self.assert_http_200(response)
+        self.assertEqual(3, len(response.data["results"]))
+        self.assertIsNotNone(response.data["next"])
+
+    def test_invalid_cursor(self):
+        response: Response = APIClient().get(f"{self.path}?cursor=invalid")
+        self.assertEqual(404, response.status_code)
+
+    def test_cursor_of_wrong_shape(self):
+        cursors = [
+            ("id", {"o": "id", "p": 1}),
+            ("id", {"o": ["id"], "p": [1]}),
+            ("id", ["id", [1]]),
+            ("id", {"o": "id", "p": ["abc"]}),
+            ("id", {"o": "id", "p": [None]}),
+            ("id", {"o": "id", "p": [[1]]}),
+            ("id", {"o": "id", "p": [{"id": 1}]}),
+            ("rating", {"o": "rating", "p": [[1], 2]}),
+            ("rating", {"o": "rating", "p": [1, "abc"]}),
+        ]
+        for ordering, data in cursors:
+            cursor = base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+            with self.subTest(data=data):
+                response: Response = APIClient().get(f"{self.path}?page_size=1&ordering={ordering}&cursor={cursor}")
+                self.assertEqual(404, response.status_code)
+
+    def test_cursor_of_other_ordering(self):
+        for _ in range(3):
+            create_post()
+        response: Response = APIClient().get(f"{self.path}?page_size=1&ordering=rating")
+        response = APIClient().get(response.data["next"].replace("ordering=rating", "ordering=id"))
+        self.assertEqual(404, response.status_code)
+
+    def _walk_pages(self, url: str) -> list[int]:
+        client = APIClient()
+        ids = []
+        while url:
+            response: Response = client.get(url)
+            self.assert_http_200(response)
+            ids.extend(post["id"] for post in response.data["results"])
+            url = response.data["next"]
+        return ids
+
+
+class StreamingListTestCase(TestCase):
+    def setUp(self):
+        # responses are invalidated on commit, which never happens in TestCase
+        clear_response_cache()
+
+    def test_stream_has_shape_of_list(self):
+        for _ in range(5):
+            create_post()
+        client = APIClient()
+        for path in ["/posts/", "/bodies/"]:
+            response = client.get(path)
+            streaming_response = client.get(f"{path}?stream=true")
+            self.assertTrue(streaming_response.streaming)
+            content = b"".join(streaming_response.streaming_content)
+            self.assertEqual(response.json(), json.loads(content))
+
+    def test_stream_in_chunks(self):
+        for _ in range(5):
+            create_body()
+        with patch.object(BodyViewSet, "stream_chunk_size", 2):
+            response = APIClient().get("/bodies/?stream=1")
+            chunks = list(response.streaming_content)
+        # brackets and three chunks of rows
+        self.assertEqual(5, len(chunks))
+        self.assertEqual(5, len(json.loads(b"".join(chunks))))
+
+    def test_stream_empty_list(self):
+        response = APIClient().get("/bodies/?stream=1")
+        self.assertEqual([], json.loads(b"".join(response.streaming_content)))
+
+
+class PostBulkCreateTestCase(TestCase, HTTPAsserts):
+    path: str = "/posts/bulk/"
+
+    def test_bulk_create(self):
+        data = [get_create_dict_for_post() for _ in range(3)]
+        response: Response = APIClient().post(self.path, data=data, format="json")
+        self.assert_http_201(response)
+        self.assertEqual(3, len(response.data))
+        titles = Post.objects.filter(id__in=[item["id"] for item in response.data]).values_list("title", flat=True)
+        self.assertEqual({item["title"] for item in data}, set(titles))
+
+    def test_query_count_does_not_depend_on_size(self):
+        data = [get_create_dict_for_post() for _ in range(10)]
+        # owners, titles, bodies, savepoint, insert, search vectors, ranking changes and release of savepoint
+        with self.assertNumQueries(8):
+            response: Response = APIClient().post(self.path, data=data, format="json")
+        self.assert_http_201(response)
+
+    def test_errors_per_item(self):
+        existing_post = create_post()
+        not_writer = create_unique_user()
+        duplicated_title = get_create_dict_for_post()
+        data = [
+            get_create_dict_for_post(),
+            get_create_dict_for_post(title=existing_post.title),
+            get_create_dict_for_post(owner=not_writer.id),
+            get_create_dict_for_post(body=existing_post.body_id),
+            get_create_dict_for_post(rating=11),
+            duplicated_title,
+            {**get_create_dict_for_post(), "title": duplicated_title["title"]},
+        ]
+        response: Response = APIClient().post(self.path, data=data, format="json")
+        self.assert_http_400(response)
+        errors = response.data
+        self.assertEqual({}, errors[0])
+        self.assertIn("title", errors[1])
+        self.assertIn("owner", errors[2])
+        self.assertIn("body", errors[3])
+        self.assertIn("rating", errors[4])
+        self.assertIn("title", errors[5])
+        self.assertIn("title", errors[6])
+        self.assertFalse(Post.objects.filter(title=data[0]["title"]).exists())
+
+    def test_invalid_input(self):
+        client = APIClient()
+        for data in [[], {"title": "x"}]:
+            response: Response = client.post(self.path, data=data, format="json")
+            self.assert_http_400_with_addition(response, f" Case: {data}")
+
+
+class SeedBlogTestCase(TestCase):
+    def test_seed(self):
+        call_command("seed_blog", users=20, posts=30, role_requests=10, stdout=StringIO())
+        self.assertEqual(30, Post.objects.filter(title__startswith="seed post").count())
+        self.assertEqual(20, UserWithRoles.objects.filter(user__username__startswith="seed-").count())
+        self.assertEqual(10, RoleRequest.objects.count())
+        self.assertTrue(User.objects.filter(username__startswith="seed-").first().check_password(SEED_PASSWORD))
+        # sequences are moved after copied rows
+        create_post()
+
+    def test_posts_without_writers(self):
+        with self.assertRaises(CommandError):
+            call_command("seed_blog", posts=1, stdout=StringIO())
+
+
+class AsyncReadTestCase(TestCase, HTTPAsserts):
+    def test_same_data_as_sync_views(self):
+        post = create_post()
+        client = APIClient()
+        for path in ["posts/", f"posts/{post.id}/", f"bodies/{post.body_id}/", "posts/?page_size=1"]:
+            response = client.get(f"/{path}")
+            async_response = client.get(f"/async/{path}")
+            self.assert_http_200(async_response)
+            self.assertEqual(response.json(), async_response.json(), msg=f"Case: {path}")
+
+    def test_walk_pages(self):
+        posts = [create_post() for _ in range(3)]
+        client = APIClient()
+        ids = []
+        url = "/async/posts/?page_size=2"
+        while url:
+            data = client.get(url).json()
+            ids.extend(post["id"] for post in data["results"])
+            url = data["next"]
+        self.assertEqual([post.id for post in posts], ids)
+
+    def test_errors(self):
+        client = APIClient()
+        self.assertEqual(404, client.get("/async/posts/0/").status_code)
+        self.assertEqual(404, client.get("/async/bodies/0/").status_code)
+        self.assertEqual(404, client.get("/async/posts/?cursor=invalid").status_code)
+        self.assertEqual(405, client.post("/async/posts/").status_code)
+
+    def test_invalid_token(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION="Token invalid")
+        self.assertEqual(401, client.get("/async/posts/").status_code)
+
+
+class PostSearchTestCase(TestCase, HTTPAsserts):
+    path: str = "/posts/search/"
+
+    def test_search_by_title_and_body(self):
+        by_title = create_post(title="Gardening tomatoes")
+        by_body = create_post(body=create_body(text="My tomatoes are red").id)
+        create_post(title="Unrelated post")
+        response: Response = APIClient().get(f"{self.path}?q=tomato")
+        self.assert_http_200(response)
+        ids = [post["id"] for post in response.data["results"]]
+        # match in title weights more
+        self.assertEqual([by_title.id, by_body.id], ids)
+
+    def test_vector_follows_body_update(self):
+        post = create_post()
+        body = post.body
+        body.text = "Completely new words"
+        body.save()
+        response: Response = APIClient().get(f"{self.path}?q=completely")
+        self.assertEqual([post.id], [post["id"] for post in response.data["results"]])
+
+    def test_bulk_created_posts_are_searchable(self):
+        data = [get_create_dict_for_post(title=f"Bulk search {i}") for i in range(2)]
+        APIClient().post("/posts/bulk/", data=data, format="json")
+        response: Response = APIClient().get(f"{self.path}?q=bulk")
+        self.assertEqual(2, len(response.data["results"]))
+
+    def test_walk_pages(self):
+        posts = [create_post(title=f"Paged search {i}") for i in range(5)]
+        client = APIClient()
+        ids = []
+        url = f"{self.path}?q=paged&page_size=2"
+        while url:
+            response: Response = client.get(url)
+            self.assert_http_200(response)
+            ids.extend(post["id"] for post in response.data["results"])
+            url = response.data["next"]
+        self.assertEqual(sorted(post.id for post in posts), sorted(ids))
+        self.assertEqual(len(posts), len(ids))
+
+    def test_query_is_required(self):
+        response: Response = APIClient().get(self.path)
+        self.assert_http_400(response)
+
+
+class HotPostsTestCase(TestCase, HTTPAsserts):
+    path: str = "/posts/hot/"
+
+    def test_order_by_rating_and_recency(self):
+        now = timezone.now()
+        old_rated = create_post(rating=10)
+        Post.objects.filter(id=old_rated.id).update(created_at=now - timedelta(days=10))
+        new = create_post(rating=1)
+        rated = create_post(rating=5)
+        restricted = create_post(rating=10, is_restricted=True)
+        refresh_hot_posts()
+
+        response: Response = APIClient().get(self.path)
+        self.assert_http_200(response)
+        ids = [post["id"] for post in response.data]
+        self.assertEqual([rated.id, new.id, old_rated.id], ids)
+        self.assertNotIn(restricted.id, ids)
+
+    def test_incremental_refresh(self):
+        with self.settings(HOT_POSTS={"SIZE": 2, "RECENCY_SECONDS": 45_000}):
+            posts = [create_post(rating=i) for i in range(5)]
+            self.assertEqual({"changed": 5, "full": 0, "size": 4}, refresh_hot_posts())
+            self.assertEqual([posts[4], posts[3]], get_hot_posts())
+
+            posts[0].rating = 10
+            posts[0].save()
+            result = refresh_hot_posts()
+            self.assertEqual({"changed": 1, "full": 0, "size": 4}, result)
+            self.assertEqual([posts[0], posts[4]], get_hot_posts())
+
+            posts[0].delete()
+            posts[4].is_restricted = True
+            posts[4].save()
+            refresh_hot_posts()
+            self.assertEqual([posts[3], posts[2]], get_hot_posts())
+
+    def test_score_drop_pulls_posts_from_outside(self):
+        with self.settings(HOT_POSTS={"SIZE": 2, "RECENCY_SECONDS": 45_000}):
+            posts = [create_post(rating=i) for i in range(6, 11)]
+            refresh_hot_posts(full=True)
+            for post in posts[2:]:
+                post.rating = 0
+                post.save()
+            self.assertEqual(1, refresh_hot_posts()["full"])
+            self.assertEqual([posts[1], posts[0]], get_hot_posts())
+
+    def test_query_count(self):
+        for _ in range(3):
+            create_post()
+        refresh_hot_posts()
+        with self.assertNumQueries(1):
+            response: Response = APIClient().get(f"{self.path}?limit=2")
+        self.assertEqual(2, len(response.data))
+
+    def test_invalid_limit(self):
+        for limit in ("-1", "0", "two"):
+            with self.subTest(limit=limit):
+                self.assert_http_400(APIClient().get(f"{self.path}?limit={limit}"))
+
+
+class PostIncludeTestCase(TestCase, HTTPAsserts):
+    path: str = "/posts/"
+
+    def test_retrieve_with_owner_and_body(self):
+        post = create_post()
+        response: Response = APIClient().get(f"{self.path}{post.id}/?include=owner,body")
+        self.assert_http_200(response)
+        owner = post.owner
+        self.assertEqual({"username": owner.username, "email": owner.email, "id": owner.id},
+                         response.data["owner"])
+        self.assertEqual({"id": post.body.id, "text": post.body.text}, response.data["body"])
+
+    def test_ids_by_default(self):
+        post = create_post()
+        response: Response = APIClient().get(f"{self.path}{post.id}/?include=body")
+        self.assertEqual(post.owner.id, response.data["owner"])
+        self.assertEqual(post.body.id, response.data["body"]["id"])
+
+    def test_query_count_does_not_depend_on_size(self):
+        for _ in range(5):
+            create_post()
+        refresh_hot_posts()
+        paths = [f"{self.path}?include=owner,body", f"{self.path}?include=owner,body&page_size=3",
+                 f"{self.path}hot/?include=owner,body", f"{self.path}search/?q=test&include=owner,body"]
+        for path in paths:
+            with self.subTest(path=path), self.assertNumQueries(1):
+                response: Response = APIClient().get(path)
+                self.assert_http_200(response)
+
+    def test_unknown_relation(self):
+        response: Response = APIClient().get(f"{self.path}?include=owner,password")
+        self.assert_http_400(response)
+
+
+class SparseFieldsetsTestCase(TestCase, HTTPAsserts):
+    def test_list_and_retrieve(self):
+        post = create_post(rating=3)
+        client = APIClient()
+        response: Response = client.get("/posts/?fields=id,title")
+        self.assert_http_200(response)
+        self.assertEqual([{"id": post.id, "title": post.title}], response.data)
+        response = client.get(f"/posts/{post.id}/?fields=rating")
+        self.assert_http_200(response)
+        self.assertEqual({"rating": 3}, response.data)
+
+    def test_only_requested_columns_are_loaded(self):
+        body = create_body(text="long text")
+        with CaptureQueriesContext(connection) as queries:
+            response: Response = APIClient().get("/bodies/?fields=id")
+        self.assertEqual([{"id": body.id}], response.data)
+        self.assertNotIn('"text"', queries[-1]["sql"])
+
+    def test_with_pagination_and_include(self):
+        posts = [create_post(rating=i) for i in range(3)]
+        response: Response = APIClient().get("/posts/?fields=title,owner&include=owner,body"
+                                             "&ordering=-rating&page_size=2")
+        self.assert_http_200(response)
+        self.assertEqual(["title", "owner"], list(response.data["results"][0]))
+        self.assertEqual(posts[2].owner.username, response.data["results"][0]["owner"]["username"])
+        response = APIClient().get(response.data["next"])
+        self.assertEqual([posts[0].title], [post["title"] for post in response.data["results"]])
+
+    def test_invalid_fields(self):
+        for fields in ("", "id,unknown"):
+            with self.subTest(fields=fields):
+                response: Response = APIClient().get(f"/posts/?fields={fields}")
+                self.assert_http_400(response)
+
+    def test_writes_ignore_fields(self):
+        response: Response = APIClient().post("/bodies/?fields=text", data={"text": "text"})
+        self.assert_http_201(response)
+        self.assertEqual(["id"], list(response.data))
+
+
+class ConditionalGetTestCase(TestCase, HTTPAsserts):
+    def setUp(self):
+        # responses are invalidated on commit, which never happens in TestCase
+        clear_response_cache()
+
+    def test_retrieve_not_modified(self):
+        post = create_post()
+        client = APIClient()
+        response: Response = client.get(f"/posts/{post.id}/")
+        self.assert_http_200(response)
+        etag = response["ETag"]
+        self.assertFalse(etag.startswith("W/"))
+
+        with patch.object(PostSerializer, "to_representation") as to_representation:
+            response = client.get(f"/posts/{post.id}/", HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(304, response.status_code)
+            response = client.get(f"/posts/{post.id}/", HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+            self.assertEqual(304, response.status_code)
+        to_representation.assert_not_called()
+
+        post.rating = 5
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+        response = client.get(f"/posts/{post.id}/", HTTP_IF_NONE_MATCH=etag)
+        self.assert_http_200(response)
+        self.assertNotEqual(etag, response["ETag"])
+
+    def test_list_page_not_modified(self):
+        posts = [create_post() for _ in range(3)]
+        client = APIClient()
+        response: Response = client.get("/posts/?page_size=2")
+        etag = response["ETag"]
+        self.assertTrue(etag.startswith("W/"))
+        response = client.get("/posts/?page_size=2", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+
+        # change out of page doesn't change the page
+        with self.captureOnCommitCallbacks(execute=True):
+            posts[2].save()
+        response = client.get("/posts/?page_size=2", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+        with self.captureOnCommitCallbacks(execute=True):
+            posts[0].delete()
+        response = client.get("/posts/?page_size=2", HTTP_IF_NONE_MATCH=etag)
+        self.assert_http_200(response)
+
+    def test_unpaginated_list_not_modified_by_aggregate(self):
+        posts = [create_post() for _ in range(3)]
+        client = APIClient()
+        etag = client.get("/posts/?include=body")["ETag"]
+        self.assertTrue(etag.startswith("W/"))
+        clear_response_cache()
+        with CaptureQueriesContext(connection) as queries:
+            response: Response = client.get("/posts/?include=body", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(1, len(queries))
+        self.assertIn("COUNT(", queries[0]["sql"])
+
+        posts[0].body.text = "changed text"
+        with self.captureOnCommitCallbacks(execute=True):
+            posts[0].body.save()
+        response = client.get("/posts/?include=body", HTTP_IF_NONE_MATCH=etag)
+        self.assert_http_200(response)
+        etag = response["ETag"]
+        # deletion doesn't change the latest version
+        with self.captureOnCommitCallbacks(execute=True):
+            posts[1].delete()
+        response = client.get("/posts/?include=body", HTTP_IF_NONE_MATCH=etag)
+        self.assert_http_200(response)
+        self.assertEqual(2, len(response.data))
+
+    def test_list_ignores_if_modified_since(self):
+        for _ in range(3):
+            create_post()
+        client = APIClient()
+        response: Response = client.get("/posts/?page_size=2")
+        self.assertFalse(response.has_header("Last-Modified"))
+        response = client.get("/posts/?page_size=2", HTTP_IF_MODIFIED_SINCE="Fri, 01 Jan 2100 00:00:00 GMT")
+        self.assert_http_200(response)
+
+    def test_etag_depends_on_query_and_included_body(self):
+        post = create_post()
+        client = APIClient()
+        etag = client.get(f"/posts/{post.id}/?include=body")["ETag"]
+        self.assertNotEqual(etag, client.get(f"/posts/{post.id}/")["ETag"])
+        post.body.text = "changed text"
+        with self.captureOnCommitCallbacks(execute=True):
+            post.body.save()
+        response: Response = client.get(f"/posts/{post.id}/?include=body", HTTP_IF_NONE_MATCH=etag)
+        self.assert_http_200(response)
+        self.assertNotIn("ETag", client.get(f"/posts/{post.id}/?include=owner"))
+
+    def test_bodies(self):
+        body = create_body()
+        client = APIClient()
+        etag = client.get(f"/bodies/{body.id}/")["ETag"]
+        response: Response = client.get(f"/bodies/{body.id}/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+
+
+class ResponseCacheTestCase(TestCase, HTTPAsserts):
+    def setUp(self):
+        clear_response_cache()
+
+    def test_hit_without_serialization(self):
+        post = create_post()
+        client = APIClient()
+        response: Response = client.get(f"/posts/{post.id}/")
+        self.assertEqual("MISS", response["X-Cache"])
+        with patch.object(PostSerializer, "to_representation") as to_representation, self.assertNumQueries(0):
+            cached_response = client.get(f"/posts/{post.id}/")
+        to_representation.assert_not_called()
+        self.assertEqual("HIT", cached_response["X-Cache"])
+        self.assertEqual(response.content, cached_response.content)
+        self.assertEqual(response["ETag"], cached_response["ETag"])
+        self.assertEqual({"hits": 1, "misses": 1, "evictions": 0}, _without_size(get_response_cache_stats()))
+
+    def test_conditional_hit(self):
+        body = create_body()
+        client = APIClient()
+        etag = client.get(f"/bodies/{body.id}/")["ETag"]
+        response: Response = client.get(f"/bodies/{body.id}/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+        self.assertEqual("HIT", response["X-Cache"])
+
+    def test_invalidated_by_writes(self):
+        post = create_post()
+        other_post = create_post()
+        client = APIClient()
+        for path in ("/posts/", f"/posts/{post.id}/", f"/posts/{other_post.id}/", f"/posts/{post.id}/?include=body"):
+            client.get(path)
+
+        post.rating = 7
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+        self.assertEqual("HIT", client.get(f"/posts/{other_post.id}/")["X-Cache"])
+        response: Response = client.get(f"/posts/{post.id}/")
+        self.assertEqual("MISS", response["X-Cache"])
+        self.assertEqual(7, response.data["rating"])
+        self.assertEqual("MISS", client.get("/posts/")["X-Cache"])
+
+        post.body.text = "changed text"
+        with self.captureOnCommitCallbacks(execute=True):
+            post.body.save()
+        response = client.get(f"/posts/{post.id}/?include=body")
+        self.assertEqual("changed text", response.data["body"]["text"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other_post.delete()
+        self.assertEqual(404, client.get(f"/posts/{other_post.id}/").status_code)
+        self.assertEqual([post.id], [row["id"] for row in client.get("/posts/").data])
+
+    def test_invalidated_after_commit(self):
+        post = create_post()
+        client = APIClient()
+        client.get(f"/posts/{post.id}/")
+        with self.captureOnCommitCallbacks(execute=True):
+            post.rating = 7
+            post.save()
+            # response read before commit is still of old version
+            self.assertEqual("HIT", client.get(f"/posts/{post.id}/")["X-Cache"])
+        self.assertEqual("MISS", client.get(f"/posts/{post.id}/")["X-Cache"])
+
+    def test_bulk_create_invalidates_list(self):
+        client = get_superuser_client()
+        client.get("/posts/")
+        data = [get_create_dict_for_post()]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assert_http_201(client.post("/posts/bulk/", data=data, format="json"))
+        self.assertEqual(1, len(client.get("/posts/").data))
+
+    def test_shared_by_users_with_same_permissions(self):
+        post = create_post()
+        APIClient().get(f"/posts/{post.id}/")
+        response: Response = get_authenticated_client().get(f"/posts/{post.id}/")
+        self.assertEqual("HIT", response["X-Cache"])
+
+    def test_browsable_api_is_not_shared(self):
+        post = create_post()
+        for user in (create_unique_user(), create_unique_user()):
+            client = APIClient()
+            client.force_authenticate(user)
+            response: Response = client.get(f"/posts/{post.id}/?format=api")
+            self.assert_http_200(response)
+            self.assertFalse(response.has_header("X-Cache"))
+            self.assertIn(user.username, response.content.decode())
+
+    def test_not_cached(self):
+        post = create_post()
+        client = APIClient()
+        for path in (f"/posts/{post.id}/?include=owner", "/posts/?stream=true", "/posts/hot/"):
+            with self.subTest(path=path):
+                client.get(path)
+                self.assertFalse(client.get(path).has_header("X-Cache"))
+
+
+class ResponseCacheBackendTestCase(TestCase):
+    def test_lru_eviction(self):
+        with tempfile.TemporaryDirectory() as location:
+            for cache in (LocMemResponseCache(max_size=2), FileResponseCache(max_size=2, location=location)):
+                with self.subTest(cache=type(cache).__name__):
+                    cache.set("a", 1)
+                    cache.set("b", {"content": b"2"})
+                    # file backend orders entries by time of access
+                    time.sleep(0.01)
+                    self.assertEqual(1, cache.get("a"))
+                    time.sleep(0.01)
+                    cache.set("c", 3)
+                    self.assertIsNone(cache.get("b"))
+                    self.assertEqual(3, cache.get("c"))
+                    self.assertEqual({"hits": 2, "misses": 1, "evictions": 1, "size": 2}, cache.stats())
+
+    def test_file_entries_are_json(self):
+        with tempfile.TemporaryDirectory() as location:
+            cache = FileResponseCache(max_size=2, location=location)
+            cache.set("a", {"content": b"\x00body", "headers": {"ETag": "1"}})
+            self.assertEqual({"content": b"\x00body", "headers": {"ETag": "1"}}, cache.get("a"))
+            path, = (entry.path for entry in os.scandir(location))
+            with open(path, "rb") as file:
+                json.loads(file.read())
+
+    def test_file_directory_writable_by_others_is_refused(self):
+        with tempfile.TemporaryDirectory() as location:
+            os.chmod(location, 0o777)
+            with self.assertRaises(ImproperlyConfigured):
+                FileResponseCache(max_size=2, location=location)
+
+    def test_file_entries_are_culled_every_interval(self):
+        with tempfile.TemporaryDirectory() as location:
+            cache = FileResponseCache(max_size=200, location=location)
+            self.assertEqual(2, cache.cull_interval)
+            cache.max_size = 1
+            cache.set("a", 1)
+            cache.set("b", 2)
+            cache.set("c", 3)
+            self.assertEqual(2, len(cache))
+
+    def test_ttl(self):
+        with tempfile.TemporaryDirectory() as location:
+            for cache in (LocMemResponseCache(max_size=2, ttl=0.05),
+                          FileResponseCache(max_size=2, location=location, ttl=0.05)):
+                with self.subTest(cache=type(cache).__name__):
+                    cache.set("a", 1)
+                    self.assertEqual(1, cache.get("a"))
+                    time.sleep(0.06)
+                    self.assertIsNone(cache.get("a"))
+                    cache.clear()
+                    self.assertEqual(0, len(cache))
+
+
+def _without_size(stats: dict) -> dict:
+    return {name: value for name, value in stats.items() if name != "size"}
+
+
+class PostFragmentTestCase(TestCase, HTTPAsserts):
+    def setUp(self):
+        clear_response_cache()
+        post_fragment_cache.clear()
+
+    def _get(self, path: str) -> Response:
+        # responses are cached as a whole, fragments are used when response is missed
+        clear_response_cache()
+        response: Response = APIClient().get(path)
+        self.assert_http_200(response)
+        return response
+
+    def test_list_is_assembled_from_fragments(self):
+        posts = [create_post(rating=i) for i in range(3)]
+        response = self._get("/posts/")
+        self.assertEqual(response.data, json.loads(response.content))
+        with patch.object(PostSerializer, "to_representation", wraps=PostSerializer().to_representation) as serialize:
+            cached_response = self._get("/posts/")
+            self.assertEqual(0, serialize.call_count)
+            posts[1].rating = 9
+            posts[1].save()
+            changed_response = self._get("/posts/")
+            self.assertEqual(1, serialize.call_count)
+        self.assertEqual(response.content, cached_response.content)
+        self.assertIn(9, [post["rating"] for post in changed_response.data])
+
+    def test_page(self):
+        posts = [create_post() for _ in range(3)]
+        response = self._get("/posts/?page_size=2")
+        self.assertEqual(response.data, json.loads(response.content))
+        response = self._get(response.data["next"])
+        self.assertEqual({"next": None, "results": [PostSerializer(posts[2]).data]}, json.loads(response.content))
+
+    def test_shape_of_output_is_part_of_key(self):
+        post = create_post()
+        self._get("/posts/")
+        response = self._get("/posts/?fields=id,title")
+        self.assertEqual([{"id": post.id, "title": post.title}], json.loads(response.content))
+        self._get("/posts/?include=body")
+        post.body.text = "changed text"
+        post.body.save()
+        response = self._get("/posts/?include=body")
+        self.assertEqual("changed text", json.loads(response.content)[0]["body"]["text"])
+        # full, sparse and both versions with body
+        self.assertEqual(4, len(post_fragment_cache))
+
+    def test_indented_output(self):
+        create_post()
+        response: Response = APIClient().get("/posts/", HTTP_ACCEPT="application/json; indent=2")
+        self.assertIn(b'\n  {', response.content)
+        self.assertEqual(response.data, json.loads(response.content))
+
+
+@override_settings(REQUEST_METRICS={"SAMPLE_RATE": 1, "SLOW_REQUEST_MS": 10_000, "SLOW_QUERIES": 2})
+class RequestMetricsTestCase(TestCase, HTTPAsserts):
+    def setUp(self):
+        clear_response_cache()
+
+    def test_server_timing(self):
+        post = create_post()
+        response: Response = APIClient().get(f"/posts/{post.id}/")
+        self.assert_http_200(response)
+        timing = response["Server-Timing"]
+        self.assertIn('db;dur=', timing)
+        self.assertIn('desc="1 queries"', timing)
+        for span in ("permissions;dur=", "serialize;dur=", "render;dur=", "total;dur="):
+            self.assertIn(span, timing)
+
+    def test_serialization_of_list_is_measured(self):
+        for _ in range(3):
+            create_body()
+        response: Response = APIClient().get("/bodies/")
+        self.assertEqual(1, response["Server-Timing"].count("serialize;dur="))
+
+    def test_async_view(self):
+        post = create_post()
+        response: Response = APIClient().get(f"/async/posts/{post.id}/")
+        self.assertIn('desc="1 queries"', response["Server-Timing"])
+
+    def test_slow_request_is_logged_with_slowest_queries(self):
+        create_post()
+        with self.settings(REQUEST_METRICS={"SAMPLE_RATE": 1, "SLOW_REQUEST_MS": 0, "SLOW_QUERIES": 2}), \
+                self.assertLogs("common.instrumentation", level="WARNING") as logs:
+            APIClient().get("/posts/?include=body&fields=id,body")
+        self.assertEqual(1, len(logs.output))
+        self.assertIn("Slow request GET /posts/", logs.output[0])
+        self.assertIn("Posts_post", logs.output[0])
+
+    def test_not_sampled(self):
+        with self.settings(REQUEST_METRICS={"SAMPLE_RATE": 0, "SLOW_REQUEST_MS": 0, "SLOW_QUERIES": 2}):
+            response: Response = APIClient().get("/posts/")
+        self.assertFalse(response.has_header("Server-Timing"))
+
+
+class TrafficCaptureTestCase(TestCase, HTTPAsserts):
+    def setUp(self):
+        file = tempfile.NamedTemporaryFile(suffix=".jsonl", delete=False)
+        file.close()
+        self.path = file.name
+        self.addCleanup(os.remove, self.path)
+        settings = self.settings(TRAFFIC_CAPTURE={"SAMPLE_RATE": 1, "PATH": self.path})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_capture(self):
+        post = create_post()
+        get_superuser_client().get(f"/posts/{post.id}/?fields=id")
+        APIClient().post("/registration/", {"username": "captured", "email": "captured@mail.ru",
+                                            "password": "secret-Password1"}, format="json")
+        records = list(read_records(self.path))
+        self.assertEqual(2, len(records))
+        self.assertEqual({"method": "GET", "path": f"/posts/{post.id}/?fields=id", "content_type": None,
+                          "body": None, "role": "superuser", "status": 200}, records[0])
+        self.assertEqual("anonymous", records[1]["role"])
+        self.assertEqual(201, records[1]["status"])
+        self.assertEqual(REDACTED_PASSWORD, json.loads(records[1]["body"])["password"])
+
+    def test_role_of_writer(self):
+        user = create_unique_user()
+        give_role(user, Role.WRITER)
+        client = APIClient()
+        client.force_authenticate(user)
+        client.get("/posts/")
+        self.assertEqual("writer", next(read_records(self.path))["role"])
+
+    def test_multipart_body_is_not_read(self):
+        # fields are within the limit, whole body with boundaries isn't
+        with self.settings(DATA_UPLOAD_MAX_MEMORY_SIZE=50):
+            response: Response = get_superuser_client().post("/bodies/", {"text": "short"},
+                                                             format="multipart")
+        self.assert_http_201(response)
+        record = next(read_records(self.path))
+        self.assertIsNone(record["body"])
+
+    def test_not_sampled(self):
+        with self.settings(TRAFFIC_CAPTURE={"SAMPLE_RATE": 0, "PATH": self.path}):
+            APIClient().get("/posts/")
+        self.assertEqual([], list(read_records(self.path)))
+
+    def test_invalid_record(self):
+        with open(self.path, "w") as file:
+            file.write('{"method": "GET", "path": "/posts/"}\n\n{"path": "/posts/"}\n')
+        records = read_records(self.path)
+        self.assertEqual("anonymous", next(records)["role"])
+        with self.assertRaises(ValueError):
+            next(records)
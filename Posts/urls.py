@@ -1,7 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from . import views
+from . import views, async_views
 
 app_name = "Posts"
 
@@ -11,4 +11,7 @@ router.register(r'bodies', views.BodyViewSet, basename='body')
 
 urlpatterns = [
     path("", include(router.urls)),
+    path("async/posts/", async_views.post_list, name="async-post-list"),
+    path("async/posts/<int:pk>/", async_views.post_detail, name="async-post-detail"),
+    path("async/bodies/<int:pk>/", async_views.body_detail, name="async-body-detail"),
 ]
@@ -1,12 +1,136 @@
+from django.db import IntegrityError
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import IntegerField
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+
 from Posts import serializers, models
-from common.views import ModelViewSetWithCustomMixin
+from Posts.caching import BODIES_CACHE_NAME, POSTS_CACHE_NAME
+from Posts.ranking import get_hot_posts
+from Posts.search import search_posts
+from common.pagination import KeysetPagination
+from common.renderers import PreRenderedJSONRenderer
+from common.response_cache import ResponseCacheMixin
+from common.views import ConditionalGetMixin, ModelViewSetWithCustomMixin
+
+
+class PostKeysetPagination(KeysetPagination):
+    orderings = {
+        "id": ("id",),
+        "rating": ("rating", "id"),
+        "-rating": ("-rating", "-id"),
+    }
+
 
+class PostSearchPagination(KeysetPagination):
+    orderings = {
+        "rank": ("-rank", "-id"),
+    }
+    default_ordering = "rank"
+    opt_in = False
 
-class PostViewSet(ModelViewSetWithCustomMixin):
+
+class PostViewSet(ResponseCacheMixin, ConditionalGetMixin, ModelViewSetWithCustomMixin):
     queryset = models.Post.objects.all()
     serializer_class = serializers.PostSerializer
+    pagination_class = PostKeysetPagination
+    cache_name = POSTS_CACHE_NAME
+    renderer_classes = [PreRenderedJSONRenderer, BrowsableAPIRenderer]
+    bulk_create_max_size = 1000
+    include_query_param = "include"
+    includable = ("owner", "body")
+
+    def get_queryset(self):
+        return self._select_included(super().get_queryset())
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), "include": self.get_include()}
+
+    def get_include(self) -> tuple[str, ...]:
+        """Return relations requested by 'include' query param, e.g. 'include=owner,body'.
+
+        :raises ValidationError: If a relation can't be included
+        """
+        if self.request is None:
+            return ()
+        value = self.request.query_params.get(self.include_query_param, "")
+        include = tuple(name for name in value.split(",") if name)
+        if any(name not in self.includable for name in include):
+            raise ValidationError({self.include_query_param: f"Must be some of {list(self.includable)}"})
+        return include
+
+    def get_cache_tags(self) -> list[str] | None:
+        tags = super().get_cache_tags()
+        include = self._get_selected_include()
+        if tags is None or "owner" in include:
+            # changes of users don't invalidate responses
+            return None
+        if "body" in include:
+            tags.append(f"{BODIES_CACHE_NAME}:list")
+        return tags
+
+    def get_last_modified_fields(self):
+        fields = super().get_last_modified_fields()
+        include = self._get_selected_include()
+        if "owner" in include:
+            # users have no time of change
+            return None
+        if "body" in include:
+            fields = [*fields, "body__updated_at"]
+        return fields
+
+    def _select_included(self, queryset):
+        include = self._get_selected_include()
+        # select_related without fields would join every relation
+        return queryset.select_related(*include) if include else queryset
+
+    def _get_selected_include(self) -> list[str]:
+        fields = self.get_requested_fields()
+        return [name for name in self.get_include() if fields is None or name in fields]
+
+    @action(detail=False, methods=["get"])
+    def hot(self, request, *args, **kwargs):
+        """Return precomputed top of posts by hot score, size is limited by 'limit' query param."""
+        limit = None
+        if "limit" in request.query_params:
+            try:
+                limit = IntegerField(min_value=1).run_validation(request.query_params["limit"])
+            except ValidationError as error:
+                raise ValidationError({"limit": error.detail})
+        serializer = self.get_serializer(get_hot_posts(limit, related=self.get_include()), many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=["get"])
+    def search(self, request, *args, **kwargs):
+        """Full-text search over title and body of posts, the most relevant first."""
+        text = request.query_params.get("q", "").strip()
+        if not text:
+            raise ValidationError({"q": "This query param is required."})
+        paginator = PostSearchPagination()
+        queryset = self._select_included(self.select_requested_fields(search_posts(text)))
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk_create(self, request, *args, **kwargs):
+        """Create list of posts in one transaction, return their ids or errors per item."""
+        serializer = serializers.PostBulkCreateSerializer(data=request.data,
+                                                          max_length=self.bulk_create_max_size)
+        serializer.is_valid(raise_exception=True)
+        try:
+            posts = serializer.save()
+        except IntegrityError:
+            # concurrent creation of post with the same title or body
+            return Response({"detail": "Posts conflict with existing ones, retry"},
+                            status=status.HTTP_409_CONFLICT)
+        return Response([{"id": post.id} for post in posts], status=status.HTTP_201_CREATED)
 
 
-class BodyViewSet(ModelViewSetWithCustomMixin):
+class BodyViewSet(ResponseCacheMixin, ConditionalGetMixin, ModelViewSetWithCustomMixin):
     queryset = models.Body.objects.all()
     serializer_class = serializers.BodySerializer
+    pagination_class = KeysetPagination
+    cache_name = BODIES_CACHE_NAME
@@ -0,0 +1,47 @@
+"""Compare sync (WSGI) and async (ASGI) read endpoints of posts under high concurrency.
+
+Start both servers from root of project, for example:
+    gunicorn Blog.wsgi -w 1 --threads 4 -b 127.0.0.1:8001
+    uvicorn Blog.asgi:application --workers 1 --port 8002
+and run
+    python benchmarks/async_posts.py --sync http://127.0.0.1:8001 --async http://127.0.0.1:8002
+
+gunicorn and uvicorn are needed only for this benchmark and are not in requirements.
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from http_load import run_load  # noqa: E402
+
+PATHS = {
+    "post list page": ("/posts/?page_size=20", "/async/posts/?page_size=20"),
+    "post detail": ("/posts/{post_id}/", "/async/posts/{post_id}/"),
+    "body detail": ("/bodies/{body_id}/", "/async/bodies/{body_id}/"),
+}
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sync", required=True, help="Base url of WSGI server")
+    parser.add_argument("--async", dest="async_", required=True, help="Base url of ASGI server")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--post-id", type=int, default=1)
+    parser.add_argument("--body-id", type=int, default=1)
+    parser.add_argument("--send-delay", type=float, default=0.0,
+                        help="Seconds every client waits in the middle of request, imitates slow clients")
+    args = parser.parse_args()
+
+    for name, (sync_path, async_path) in PATHS.items():
+        ids = {"post_id": args.post_id, "body_id": args.body_id}
+        for label, url in [("wsgi", args.sync + sync_path), ("asgi", args.async_ + async_path)]:
+            result = await run_load(url.format(**ids), args.requests, args.concurrency, args.send_delay)
+            print(f"{name:>15} {label}: {result.summary()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,322 @@
+"""Benchmark every route of Auth/urls.py and Posts/urls.py and check their query budgets.
+
+Run from root of project with configured database:
+    python benchmarks/endpoints.py --sizes 1000,100000,1000000
+
+For every size the database is filled by seed_blog up to size posts, size / 10 users
+and size / 10 role requests, everything is rolled back at the end. Every endpoint is
+requested through test client, p50/p95/p99 latency, number of SQL queries and peak
+memory traced by tracemalloc are printed. Exit code is 1 if an endpoint makes more queries
+than its budget, fails or a route has no endpoint here.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import django
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Blog.settings")
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.urls import URLPattern, URLResolver, reverse  # noqa: E402
+from rest_framework.authtoken.models import Token  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from Auth import urls as auth_urls  # noqa: E402
+from Auth.enums import Role  # noqa: E402
+from Auth.models import RoleRequest, UserWithRoles  # noqa: E402
+from Auth.tokens import issue_token  # noqa: E402
+from Posts import urls as posts_urls  # noqa: E402
+from Posts.models import Body, Post  # noqa: E402
+from Posts.ranking import refresh_hot_posts  # noqa: E402
+from common.response_cache import clear_response_cache  # noqa: E402
+from http_load import LoadResult  # noqa: E402
+
+PASSWORD = "<PasSWORD1>"
+# role of requests of user authenticated by a new signed token instead of Token
+SIGNED = "signed"
+# suffix of unique names, shared by fixtures of all sizes
+_unique_counter = itertools.count()
+
+
+class Fixtures:
+    """Users of benchmark and factories of objects changed by endpoints."""
+
+    def __init__(self):
+        self.users = {
+            "user": self._create_user([]),
+            "writer": self._create_user([Role.WRITER]),
+            "superuser": self._create_user([Role.SUPERUSER], is_superuser=True),
+        }
+        # objects in the middle of seeded ones, so they are not at the start of any index
+        self.post = Post.objects.order_by("id")[Post.objects.count() // 2]
+        self.user = User.objects.order_by("id")[User.objects.count() // 2]
+
+    def get_client(self, role: str) -> APIClient:
+        client = APIClient(SERVER_NAME="localhost")
+        if role == SIGNED:
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {issue_token(self.users['user'])[0]}")
+        elif role != "anonymous":
+            token, _ = Token.objects.get_or_create(user=self.users[role])
+            client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        return client
+
+    def unique(self, prefix: str) -> str:
+        return f"{prefix}{next(_unique_counter)}"
+
+    def new_user(self) -> User:
+        return self._create_user([])
+
+    def new_body(self) -> Body:
+        return Body.objects.create(text="benchmark text")
+
+    def new_post(self) -> Post:
+        return Post.objects.create(owner=self.users["writer"], body=self.new_body(), title=self.unique("bench"))
+
+    def new_post_data(self) -> dict:
+        return {"owner": self.users["writer"].id, "body": self.new_body().id, "title": self.unique("bench"),
+                "is_restricted": False, "rating": 5}
+
+    def new_user_data(self) -> dict:
+        username = self.unique("bench")
+        return {"username": username, "email": f"{username}@mail.ru", "password": PASSWORD}
+
+    def new_role_request(self) -> RoleRequest:
+        return RoleRequest.objects.create(user=self.users["user"], expected_role=Role.WRITER, message="benchmark")
+
+    def new_role_request_ids(self, count: int) -> list[int]:
+        """Create opened role requests of count new users."""
+        users = [User(username=self.unique("bench")) for _ in range(count)]
+        User.objects.bulk_create(users)
+        role_requests = RoleRequest.objects.bulk_create(
+            RoleRequest(user=user, expected_role=Role.EDITOR, message="benchmark") for user in users)
+        return [role_request.id for role_request in role_requests]
+
+    def _create_user(self, roles: list[str], is_superuser: bool = False) -> User:
+        username = self.unique("bench")
+        user = User.objects.create_user(username=username, email=f"{username}@mail.ru", password=PASSWORD,
+                                        is_superuser=is_superuser)
+        UserWithRoles.objects.create(user=user, roles=roles)
+        return user
+
+
+@dataclass
+class Endpoint:
+    url_name: str
+    method: str
+    role: str
+    # max number of SQL queries of one request
+    budget: int
+    # returns kwargs of url, query string and data of request, isn't measured
+    prepare: Callable[[Fixtures], tuple[dict, str, dict | list | None]]
+    # max estimated total cost of plan of one SQL statement, checked by query_plans.py
+    plan_cost: float = 1000.0
+
+
+def _no_args(fixtures: Fixtures):
+    return {}, "", None
+
+
+ENDPOINTS = [
+    Endpoint("Auth:api-root", "GET", "anonymous", 0, _no_args),
+    Endpoint("Auth:user-list", "GET", "anonymous", 1, lambda f: ({}, "page_size=50", None)),
+    Endpoint("Auth:user-list", "GET", "anonymous", 1, lambda f: ({}, "role=moderator&page_size=50", None)),
+    Endpoint("Auth:user-list", "POST", "superuser", 8, lambda f: ({}, "", f.new_user_data())),
+    Endpoint("Auth:user-detail", "GET", "anonymous", 2, lambda f: ({"pk": f.user.id}, "", None)),
+    Endpoint("Auth:user-detail", "PATCH", "superuser", 3,
+             lambda f: ({"pk": f.new_user().id}, "", {"email": f"{f.unique('bench')}@mail.ru"})),
+    Endpoint("Auth:user-detail", "DELETE", "superuser", 12, lambda f: ({"pk": f.new_user().id}, "", None)),
+    Endpoint("Auth:registration-list", "POST", "anonymous", 3, lambda f: ({}, "", f.new_user_data())),
+    Endpoint("Auth:create-role-request-list", "GET", "user", 2, _no_args),
+    Endpoint("Auth:create-role-request-list", "POST", "user", 3,
+             lambda f: ({}, "", {"expected_role": Role.WRITER, "message": "benchmark"})),
+    Endpoint("Auth:create-role-request-detail", "GET", "user", 4,
+             lambda f: ({"pk": f.new_role_request().id}, "", None)),
+    Endpoint("Auth:create-role-request-detail", "PATCH", "user", 7,
+             lambda f: ({"pk": f.new_role_request().id}, "", {"message": "changed"})),
+    Endpoint("Auth:create-role-request-detail", "DELETE", "user", 5,
+             lambda f: ({"pk": f.new_role_request().id}, "", None)),
+    Endpoint("Auth:create-role-request-list", "GET", SIGNED, 1, _no_args),
+    Endpoint("Auth:create-role-request-moderate", "POST", "superuser", 4,
+             lambda f: ({}, "", {"action": "approve", "ids": f.new_role_request_ids(1000)}), plan_cost=5000),
+    Endpoint("Auth:token-list", "POST", "anonymous", 2,
+             lambda f: ({}, "", {"username": f.users["user"].username, "password": PASSWORD})),
+    Endpoint("Auth:token-revoke", "POST", SIGNED, 5, _no_args),
+    Endpoint("Auth:token-revoke-all", "POST", SIGNED, 4, _no_args),
+    Endpoint("Auth:async-registration", "POST", "anonymous", 3, lambda f: ({}, "", f.new_user_data())),
+    Endpoint("Auth:async-change-password", "PUT", "superuser", 4,
+             lambda f: ({"pk": f.new_user().id}, "", {"password": PASSWORD})),
+    Endpoint("Posts:api-root", "GET", "anonymous", 0, _no_args),
+    Endpoint("Posts:post-list", "GET", "anonymous", 1, lambda f: ({}, "page_size=50", None)),
+    Endpoint("Posts:post-list", "POST", "anonymous", 7, lambda f: ({}, "", f.new_post_data())),
+    Endpoint("Posts:post-detail", "GET", "anonymous", 1, lambda f: ({"pk": f.post.id}, "", None)),
+    Endpoint("Posts:post-detail", "PUT", "anonymous", 8,
+             lambda f: ({"pk": f.new_post().id}, "", f.new_post_data())),
+    Endpoint("Posts:post-detail", "DELETE", "anonymous", 4, lambda f: ({"pk": f.new_post().id}, "", None)),
+    Endpoint("Posts:post-hot", "GET", "anonymous", 1, lambda f: ({}, "include=owner,body", None), plan_cost=1500),
+    Endpoint("Posts:post-search", "GET", "anonymous", 1,
+             lambda f: ({}, f"q=seed+post+{f.post.id}&include=body", None), plan_cost=3000),
+    Endpoint("Posts:post-bulk-create", "POST", "anonymous", 8,
+             lambda f: ({}, "", [f.new_post_data() for _ in range(100)]), plan_cost=2000),
+    Endpoint("Posts:body-list", "GET", "anonymous", 1, lambda f: ({}, "page_size=50", None)),
+    Endpoint("Posts:body-list", "POST", "anonymous", 2, lambda f: ({}, "", {"text": "benchmark text"})),
+    Endpoint("Posts:body-detail", "GET", "anonymous", 1, lambda f: ({"pk": f.post.body_id}, "", None)),
+    Endpoint("Posts:body-detail", "PATCH", "anonymous", 3,
+             lambda f: ({"pk": f.new_body().id}, "", {"text": "changed text"})),
+    Endpoint("Posts:body-detail", "DELETE", "anonymous", 3, lambda f: ({"pk": f.new_body().id}, "", None)),
+    Endpoint("Posts:async-post-list", "GET", "anonymous", 1, lambda f: ({}, "page_size=50", None)),
+    Endpoint("Posts:async-post-detail", "GET", "anonymous", 1, lambda f: ({"pk": f.post.id}, "", None)),
+    Endpoint("Posts:async-body-detail", "GET", "anonymous", 1, lambda f: ({"pk": f.post.body_id}, "", None)),
+]
+
+
+@dataclass
+class Measurement:
+    url_name: str
+    method: str
+    size: int
+    budget: int
+    queries: int = 0
+    peak_memory: int = 0
+    status: int = 0
+    latencies: list[float] = field(default_factory=list)
+
+    @property
+    def is_over_budget(self) -> bool:
+        return self.queries > self.budget
+
+    @property
+    def is_failed(self) -> bool:
+        return self.status >= 400
+
+    def summary(self) -> str:
+        result = LoadResult(latencies=self.latencies)
+        flag = " OVER BUDGET" if self.is_over_budget else ""
+        flag += f" HTTP {self.status}" if self.is_failed else ""
+        return (f"{self.method:>6} {self.url_name:<40} p50 {result.percentile(50) * 1000:8.2f} ms, "
+                f"p95 {result.percentile(95) * 1000:8.2f} ms, p99 {result.percentile(99) * 1000:8.2f} ms, "
+                f"queries {self.queries:>3}/{self.budget:<3} peak {self.peak_memory / 1024:8.1f} KiB{flag}")
+
+
+def measure(endpoint: Endpoint, fixtures: Fixtures, size: int, repeat: int, keep_cache: bool) -> Measurement:
+    client = fixtures.get_client(endpoint.role)
+    measurement = Measurement(endpoint.url_name, endpoint.method, size, endpoint.budget)
+
+    def prepare() -> tuple[APIClient, str, dict]:
+        kwargs, query, data = endpoint.prepare(fixtures)
+        path = reverse(endpoint.url_name, kwargs=kwargs) + (f"?{query}" if query else "")
+        if not keep_cache:
+            clear_response_cache()
+        # signed token may be revoked by the request
+        request_client = fixtures.get_client(endpoint.role) if endpoint.role == SIGNED else client
+        return request_client, path, get_body(data)
+
+    def send(request_client: APIClient, path: str, body: dict):
+        return request_client.generic(endpoint.method, path, **body)
+
+    # the first request warms up caches of roles and connections
+    send(*prepare())
+    for _ in range(repeat):
+        request = prepare()
+        start = time.perf_counter()
+        send(*request)
+        measurement.latencies.append(time.perf_counter() - start)
+
+    request = prepare()
+    with CaptureQueriesContext(connection) as queries:
+        response = send(*request)
+    measurement.queries = len(queries)
+    measurement.status = response.status_code
+
+    request = prepare()
+    tracemalloc.start()
+    send(*request)
+    measurement.peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return measurement
+
+
+def get_body(data) -> dict:
+    if data is None:
+        return {}
+    return {"data": json.dumps(data), "content_type": "application/json"}
+
+
+def get_route_names() -> set[str]:
+    """Return names of all routes of Auth/urls.py and Posts/urls.py."""
+    names = set()
+    for module in (auth_urls, posts_urls):
+        for pattern in _walk_patterns(module.urlpatterns):
+            if pattern.name:
+                names.add(f"{module.app_name}:{pattern.name}")
+    return names
+
+
+def _walk_patterns(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _walk_patterns(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern):
+            yield pattern
+
+
+def seed(size: int, seeded_size: int) -> None:
+    call_command("seed_blog", users=max((size - seeded_size) // 10, 1), posts=size - seeded_size,
+                 role_requests=(size - seeded_size) // 10, seed=size, stdout=open(os.devnull, "w"))
+    refresh_hot_posts(full=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,100000,1000000", help="Comma separated numbers of posts")
+    parser.add_argument("--repeat", type=int, default=30, help="Measured requests per endpoint")
+    parser.add_argument("--keep-cache", action="store_true",
+                        help="Don't clear response cache before requests, measures cached reads")
+    parser.add_argument("--only", help="Measure only routes which names contain this text")
+    parser.add_argument("--json", help="Write measurements into this file")
+    args = parser.parse_args()
+
+    uncovered = get_route_names() - {endpoint.url_name for endpoint in ENDPOINTS}
+    for name in sorted(uncovered):
+        print(f"Route {name} has no endpoint in benchmark")
+    endpoints = [endpoint for endpoint in ENDPOINTS if not args.only or args.only in endpoint.url_name]
+
+    measurements = []
+    with transaction.atomic():
+        seeded_size = 0
+        for size in sorted(int(size) for size in args.sizes.split(",")):
+            start = time.perf_counter()
+            seed(size, seeded_size)
+            seeded_size = size
+            print(f"\n{size} posts, seeded in {time.perf_counter() - start:.1f}s")
+            fixtures = Fixtures()
+            for endpoint in endpoints:
+                measurement = measure(endpoint, fixtures, size, args.repeat, args.keep_cache)
+                print(measurement.summary())
+                measurements.append(measurement)
+        transaction.set_rollback(True)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump([asdict(measurement) for measurement in measurements], file, indent=2)
+    failed = [measurement for measurement in measurements if measurement.is_over_budget or measurement.is_failed]
+    if failed or uncovered:
+        print(f"\n{len(failed)} measurements over budget or failed, {len(uncovered)} routes not covered")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
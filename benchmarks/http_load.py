@@ -0,0 +1,79 @@
+"""Minimal asyncio HTTP/1.1 load generator without third-party dependencies."""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+
+@dataclass
+class LoadResult:
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+    duration: float = 0.0
+
+    @property
+    def requests_per_second(self) -> float:
+        return len(self.latencies) / self.duration if self.duration else 0.0
+
+    def percentile(self, percent: float) -> float:
+        if not self.latencies:
+            return 0.0
+        latencies = sorted(self.latencies)
+        index = min(len(latencies) - 1, int(len(latencies) * percent / 100))
+        return latencies[index]
+
+    def summary(self) -> str:
+        return (f"{self.requests_per_second:8.1f} req/s, p50 {self.percentile(50) * 1000:7.1f} ms, "
+                f"p99 {self.percentile(99) * 1000:7.1f} ms, errors {self.errors}")
+
+
+async def request(method: str, url: str, body: bytes = b"", headers: dict[str, str] = None,
+                  send_delay: float = 0.0) -> int:
+    """Send one request over new connection and return status code.
+
+    :param send_delay: seconds between request line and the rest of request, imitates slow client
+    """
+    parts = urlsplit(url)
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    try:
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {parts.netloc}", "Connection: close",
+                 f"Content-Length: {len(body)}"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode()
+        if send_delay:
+            request_line_end = head.index(b"\r\n") + 2
+            writer.write(head[:request_line_end])
+            await writer.drain()
+            await asyncio.sleep(send_delay)
+            head = head[request_line_end:]
+        writer.write(head + body)
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def run_load(url: str, total: int, concurrency: int, send_delay: float = 0.0) -> LoadResult:
+    """Send total GET requests to url keeping concurrency of them in flight."""
+    result = LoadResult()
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                status = await request("GET", url, send_delay=send_delay)
+            except OSError:
+                result.errors += 1
+                continue
+            if status >= 400:
+                result.errors += 1
+            result.latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.duration = time.perf_counter() - start
+    return result
@@ -0,0 +1,138 @@
+"""Check query plans of every endpoint of benchmarks/endpoints.py.
+
+Run from root of project with configured database:
+    python benchmarks/query_plans.py --size 100000
+
+Database is seeded like in endpoints.py and everything is rolled back at the end. Every
+endpoint is requested once and every statement it made is explained with EXPLAIN (FORMAT JSON).
+Exit code is 1 if a plan scans sequentially a table with more than --max-seq-scan-rows rows
+or estimated total cost of a statement is higher than plan_cost of its endpoint.
+"""
+import argparse
+import json
+import sys
+import time
+from collections.abc import Iterator
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from endpoints import ENDPOINTS, Endpoint, Fixtures, get_body, seed  # noqa: E402
+
+from django.db import connection, transaction  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.urls import reverse  # noqa: E402
+
+from common.response_cache import clear_response_cache  # noqa: E402
+
+# statements which have plans, others like SAVEPOINT are skipped
+EXPLAINED_STATEMENTS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+@dataclass
+class PlanCheck:
+    url_name: str
+    method: str
+    plan_cost: float
+    statements: int = 0
+    max_cost: float = 0.0
+    status: int = 0
+    problems: list[str] = field(default_factory=list)
+
+    def summary(self) -> str:
+        flag = "" if not self.problems else " FAIL"
+        lines = [f"{self.method:>6} {self.url_name:<40} statements {self.statements:>3}, "
+                 f"max cost {self.max_cost:10.1f}/{self.plan_cost:<8.0f}{flag}"]
+        lines += [f"         {problem}" for problem in self.problems]
+        return "\n".join(lines)
+
+
+def explain(sql: str) -> dict:
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+        plan = cursor.fetchone()[0]
+    # psycopg returns parsed json
+    return (json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]
+
+
+def walk(plan: dict) -> Iterator[dict]:
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from walk(child)
+
+
+def get_table_rows() -> dict[str, float]:
+    """Return estimated numbers of rows of tables, they are updated by ANALYZE of seed_blog."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relname, reltuples FROM pg_class WHERE relkind = 'r' AND relnamespace = "
+                       "'public'::regnamespace")
+        return dict(cursor.fetchall())
+
+
+def check(endpoint: Endpoint, fixtures: Fixtures, table_rows: dict[str, float], max_seq_scan_rows: int) -> PlanCheck:
+    result = PlanCheck(endpoint.url_name, endpoint.method, endpoint.plan_cost)
+    kwargs, query, data = endpoint.prepare(fixtures)
+    path = reverse(endpoint.url_name, kwargs=kwargs) + (f"?{query}" if query else "")
+    clear_response_cache()
+    with CaptureQueriesContext(connection) as queries:
+        response = fixtures.get_client(endpoint.role).generic(endpoint.method, path, **get_body(data))
+    result.status = response.status_code
+    if response.status_code >= 400:
+        result.problems.append(f"HTTP {response.status_code}")
+
+    for query in queries:
+        sql = query["sql"]
+        if not sql.lstrip().upper().startswith(EXPLAINED_STATEMENTS):
+            continue
+        result.statements += 1
+        plan = explain(sql)
+        result.max_cost = max(result.max_cost, plan["Total Cost"])
+        if plan["Total Cost"] > endpoint.plan_cost:
+            result.problems.append(f"cost {plan['Total Cost']:.1f} of {_shorten(sql)}")
+        for node in walk(plan):
+            rows = table_rows.get(node.get("Relation Name"), 0)
+            if node["Node Type"] == "Seq Scan" and rows > max_seq_scan_rows:
+                result.problems.append(f"Seq Scan on {node['Relation Name']} ({rows:.0f} rows) in {_shorten(sql)}")
+    return result
+
+
+def _shorten(sql: str, length: int = 200) -> str:
+    sql = " ".join(sql.split())
+    return sql if len(sql) <= length else sql[:length] + "..."
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100_000, help="Number of seeded posts")
+    parser.add_argument("--max-seq-scan-rows", type=int, default=10_000,
+                        help="Tables with more rows must not be scanned sequentially")
+    parser.add_argument("--only", help="Check only routes which names contain this text")
+    parser.add_argument("--json", help="Write results into this file")
+    args = parser.parse_args()
+
+    endpoints = [endpoint for endpoint in ENDPOINTS if not args.only or args.only in endpoint.url_name]
+    results = []
+    with transaction.atomic():
+        start = time.perf_counter()
+        seed(args.size, 0)
+        print(f"{args.size} posts, seeded in {time.perf_counter() - start:.1f}s")
+        fixtures = Fixtures()
+        table_rows = get_table_rows()
+        for endpoint in endpoints:
+            result = check(endpoint, fixtures, table_rows, args.max_seq_scan_rows)
+            print(result.summary())
+            results.append(result)
+        transaction.set_rollback(True)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump([asdict(result) for result in results], file, indent=2)
+    failed = [result for result in results if result.problems]
+    if failed:
+        print(f"\n{len(failed)} endpoints have bad plans or failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""Replay recorded requests and report latency histogram, errors and throughput of every route.
+
+Run from root of project with configured database:
+    python benchmarks/replay.py traffic.jsonl --concurrency 8 --rate 200
+    python benchmarks/replay.py traffic.jsonl --url http://127.0.0.1:8000 --concurrency 32
+
+Records are written by common.traffic.TrafficCaptureMiddleware. Requests are sent in-process
+through test client, or over a socket to server at --url using the same database. For every
+role of records a user with token is created and deleted at the end. Replayed writes are kept,
+so replay against a copy of database. Error is a failed connection or status 5xx, mismatch
+is a status different from the recorded one.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import django
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Blog.settings")
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connections  # noqa: E402
+from django.urls import Resolver404, resolve  # noqa: E402
+from rest_framework.authtoken.models import Token  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from Auth.enums import Role  # noqa: E402
+from Auth.models import UserWithRoles  # noqa: E402
+from common.traffic import ANONYMOUS, REDACTED_PASSWORD, USER, read_records  # noqa: E402
+from http_load import LoadResult, request  # noqa: E402
+
+# upper bounds of histogram buckets in milliseconds
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, float("inf"))
+
+
+@dataclass
+class RouteStats:
+    method: str
+    route: str
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+    mismatches: int = 0
+    statuses: Counter = field(default_factory=Counter)
+
+    @property
+    def count(self) -> int:
+        return len(self.latencies)
+
+    def add(self, latency: float, status: int | None, recorded_status: int | None) -> None:
+        self.latencies.append(latency)
+        self.statuses[status or "failed"] += 1
+        if status is None or status >= 500:
+            self.errors += 1
+        if recorded_status is not None and status != recorded_status:
+            self.mismatches += 1
+
+    def histogram(self) -> list[int]:
+        counts = [0] * len(BUCKETS)
+        for latency in self.latencies:
+            counts[next(i for i, bound in enumerate(BUCKETS) if latency * 1000 <= bound)] += 1
+        return counts
+
+    def summary(self, duration: float) -> str:
+        result = LoadResult(latencies=self.latencies, duration=duration)
+        histogram = " ".join(f"{count:>6}" for count in self.histogram())
+        return (f"{self.method:>6} {self.route:<40} {self.count:>6} {result.requests_per_second:8.1f}/s "
+                f"err {self.errors / self.count:6.1%} mismatch {self.mismatches:>5} "
+                f"p50 {result.percentile(50) * 1000:8.2f} p99 {result.percentile(99) * 1000:8.2f} ms | {histogram}")
+
+
+class Replay:
+    """Shared state of workers: records to send, pacing and statistics."""
+
+    def __init__(self, records: list[dict], rate: float | None):
+        self.records = iter(enumerate(records))
+        self.rate = rate
+        self.stats: dict[tuple[str, str], RouteStats] = {}
+        self._lock = threading.Lock()
+        self.start = time.perf_counter()
+
+    def next(self) -> tuple[dict, float] | None:
+        """Return next record and time to send it at, None if there are no records."""
+        with self._lock:
+            item = next(self.records, None)
+        if item is None:
+            return None
+        index, record = item
+        return record, self.start + index / self.rate if self.rate else 0.0
+
+    def add(self, record: dict, latency: float, status: int | None) -> None:
+        key = (record["method"], get_route(record["path"]))
+        with self._lock:
+            stats = self.stats.setdefault(key, RouteStats(*key))
+            stats.add(latency, status, record.get("status"))
+
+
+def get_route(path: str) -> str:
+    try:
+        return resolve(urlsplit(path).path).view_name
+    except Resolver404:
+        return "unresolved"
+
+
+def create_role_users(roles: set[str]) -> dict[str, User]:
+    users = {}
+    for role in roles - {ANONYMOUS}:
+        username = f"replay-{role}-{time.time_ns()}"
+        user = User.objects.create_user(username=username, email=f"{username}@mail.ru", password=REDACTED_PASSWORD,
+                                        is_superuser=role == Role.SUPERUSER)
+        UserWithRoles.objects.create(user=user, roles=[] if role == USER else [role])
+        users[role] = user
+    return users
+
+
+def get_headers(record: dict, tokens: dict[str, str]) -> dict[str, str]:
+    headers = {}
+    if record["role"] != ANONYMOUS:
+        headers["Authorization"] = f"Token {tokens[record['role']]}"
+    if record["content_type"]:
+        headers["Content-Type"] = record["content_type"]
+    return headers
+
+
+def replay_in_process(replay: Replay, tokens: dict[str, str], concurrency: int) -> None:
+    def worker():
+        client = APIClient(SERVER_NAME="localhost")
+        client.raise_request_exception = False
+        try:
+            while (item := replay.next()) is not None:
+                record, send_at = item
+                time.sleep(max(send_at - time.perf_counter(), 0))
+                headers = get_headers(record, tokens)
+                kwargs = {"content_type": headers.pop("Content-Type")} if "Content-Type" in headers else {}
+                if "Authorization" in headers:
+                    kwargs["HTTP_AUTHORIZATION"] = headers["Authorization"]
+                start = time.perf_counter()
+                response = client.generic(record["method"], record["path"], (record["body"] or "").encode(),
+                                          **kwargs)
+                replay.add(record, time.perf_counter() - start, response.status_code)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+async def replay_over_socket(replay: Replay, tokens: dict[str, str], concurrency: int, url: str) -> None:
+    async def worker():
+        while (item := replay.next()) is not None:
+            record, send_at = item
+            await asyncio.sleep(max(send_at - time.perf_counter(), 0))
+            start = time.perf_counter()
+            try:
+                status = await request(record["method"], url.rstrip("/") + record["path"],
+                                       (record["body"] or "").encode(), get_headers(record, tokens))
+            except OSError:
+                status = None
+            replay.add(record, time.perf_counter() - start, status)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", nargs="?", default=settings.TRAFFIC_CAPTURE["PATH"], help="File of records")
+    parser.add_argument("--url", help="Send requests to server at this url instead of in-process")
+    parser.add_argument("--concurrency", type=int, default=1, help="Requests in flight")
+    parser.add_argument("--rate", type=float, help="Requests per second, as fast as possible by default")
+    parser.add_argument("--repeat", type=int, default=1, help="Times to replay records")
+    parser.add_argument("--json", help="Write statistics of routes into this file")
+    parser.add_argument("--max-error-rate", type=float, help="Exit with 1 if share of errors is higher")
+    args = parser.parse_args()
+
+    records = list(read_records(args.path))
+    records = list(itertools.chain.from_iterable(itertools.repeat(records, args.repeat)))
+    users = create_role_users({record["role"] for record in records})
+    try:
+        tokens = {role: Token.objects.create(user=user).key for role, user in users.items()}
+        replay = Replay(records, args.rate)
+        if args.url:
+            asyncio.run(replay_over_socket(replay, tokens, args.concurrency, args.url))
+        else:
+            replay_in_process(replay, tokens, args.concurrency)
+        duration = time.perf_counter() - replay.start
+    finally:
+        User.objects.filter(pk__in=[user.pk for user in users.values()]).delete()
+
+    histogram = " ".join(f"{'<=' + str(bound) if bound != float('inf') else '>1000':>6}" for bound in BUCKETS)
+    print(f"{len(records)} requests in {duration:.1f}s, {len(records) / duration:.1f} req/s, "
+          f"histogram buckets in ms: {histogram}")
+    for _, stats in sorted(replay.stats.items()):
+        print(stats.summary(duration))
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump([{"method": stats.method, "route": stats.route, "count": stats.count, "errors": stats.errors,
+                        "mismatches": stats.mismatches, "statuses": {str(k): v for k, v in stats.statuses.items()},
+                        "histogram": stats.histogram(), "latencies": stats.latencies}
+                       for stats in replay.stats.values()], file, indent=2)
+    errors = sum(stats.errors for stats in replay.stats.values())
+    if args.max_error_rate is not None and records and errors / len(records) > args.max_error_rate:
+        print(f"\nError rate {errors / len(records):.1%} is higher than {args.max_error_rate:.1%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Compare per-row cost of old and new user list serialization.
+
+Run from root of project with configured database:
+    python benchmarks/user_list.py --users 100000
+
+Users are created inside a transaction which is rolled back at the end.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import django
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "Blog.settings")
+django.setup()
+
+from django.contrib.auth.hashers import make_password  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import transaction  # noqa: E402
+
+from Auth.models import UserSerializer, UserPublicSerializer  # noqa: E402
+
+
+def serialize_full_rows() -> list:
+    """Path used before: full rows, then password is deleted from every dict."""
+    data = UserSerializer(User.objects.all(), many=True).data
+    for instance in data:
+        del instance["password"]
+    return data
+
+
+def select_public_columns() -> list:
+    return list(User.objects.values(*UserPublicSerializer.Meta.fields))
+
+
+def measure(function, rows: int, repeat: int) -> float:
+    """Return best time per row in microseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best / rows * 1_000_000
+
+
+def create_users(count: int) -> None:
+    password = make_password("<PasSWORD1>")
+    users = (User(username=f"bench-{i}", email=f"bench-{i}@mail.ru", password=password)
+             for i in range(count))
+    User.objects.bulk_create(users, batch_size=5000)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with transaction.atomic():
+        create_users(args.users)
+        rows = User.objects.count()
+        for name, function in [("full rows", serialize_full_rows),
+                               ("public columns", select_public_columns)]:
+            print(f"{name:>15}: {measure(function, rows, args.repeat):8.2f} us/row ({rows} rows)")
+        transaction.set_rollback(True)
+
+
+if __name__ == "__main__":
+    main()
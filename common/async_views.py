@@ -0,0 +1,113 @@
+"""Helpers of async views which are served without DRF machinery."""
+import asyncio
+import functools
+from weakref import WeakKeyDictionary
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.contrib.auth.models import AnonymousUser, User
+from django.http import HttpRequest, JsonResponse
+from rest_framework import exceptions
+from rest_framework.authentication import get_authorization_header
+from rest_framework.authtoken.models import Token
+from rest_framework.permissions import AllowAny
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+
+from Auth.tokens import KEYWORD as SIGNED_TOKEN_KEYWORD, SignedTokenAuthentication
+from common.instrumentation import timed
+
+# event loop -> semaphore, semaphore cannot be shared between loops
+_db_semaphores: WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore] = WeakKeyDictionary()
+
+
+def limit_db_connections(view):
+    """Limit number of async views using database at once.
+
+    Every request of async view gets own thread and own database connection,
+    so without limit many slow clients exhaust connections of database.
+    Connection is closed before the next view takes the slot.
+    Size of limit is taken from setting ASYNC_DB_CONNECTIONS.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        async with _get_db_semaphore():
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                await sync_to_async(_close_connections)()
+    return wrapper
+
+
+def _close_connections() -> None:
+    for connection in connections.all(initialized_only=True):
+        # connection in transaction is owned by caller, for example by TestCase
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+def _get_db_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    if loop not in _db_semaphores:
+        _db_semaphores[loop] = asyncio.Semaphore(settings.ASYNC_DB_CONNECTIONS)
+    return _db_semaphores[loop]
+
+
+async def aauthenticate(request: HttpRequest) -> User | None:
+    """Authenticate request by token like rest_framework.authentication.TokenAuthentication
+    or by signed token like Auth.tokens.SignedTokenAuthentication.
+
+    :raises exceptions.AuthenticationFailed: If token is invalid
+    """
+    auth = get_authorization_header(request).split()
+    if auth and auth[0].lower() == SIGNED_TOKEN_KEYWORD.lower().encode():
+        # deny-list may be reloaded from database
+        user, _ = await sync_to_async(SignedTokenAuthentication().authenticate)(request)
+        return user
+    if not auth or auth[0].lower() != b"token":
+        return None
+    if len(auth) != 2:
+        raise exceptions.AuthenticationFailed("Invalid token header.")
+    try:
+        token = await Token.objects.select_related("user").aget(key=auth[1].decode())
+    except (Token.DoesNotExist, UnicodeError):
+        raise exceptions.AuthenticationFailed("Invalid token.")
+    if not token.user.is_active:
+        raise exceptions.AuthenticationFailed("User inactive or deleted.")
+    return token.user
+
+
+async def aget_drf_request(request: HttpRequest, permission_classes) -> Request:
+    """Authenticate request and check permissions of view.
+
+    :param request: request of async view
+    :param permission_classes: DRF permission classes of view
+    :raises exceptions.APIException: If request is not authenticated or permitted
+    :returns: DRF request with user
+    """
+    user = await aauthenticate(request)
+    drf_request = Request(request)
+    drf_request.user = user or AnonymousUser()
+    with timed("permissions"):
+        for permission_class in permission_classes:
+            permission = permission_class()
+            if isinstance(permission, AllowAny):
+                continue
+            if not await sync_to_async(permission.has_permission)(drf_request, None):
+                if user is None:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied()
+    return drf_request
+
+
+def json_response(data, status: int = 200) -> JsonResponse:
+    """Render data like DRF JSONRenderer does."""
+    with timed("render"):
+        return JsonResponse(data, status=status, safe=False, encoder=JSONEncoder,
+                            json_dumps_params={"ensure_ascii": False, "separators": (",", ":")})
+
+
+def exception_response(exc: exceptions.APIException) -> JsonResponse:
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+    return json_response(data, status=exc.status_code)
@@ -0,0 +1,203 @@
+"""Per-request metrics: SQL queries, database time, permission checks and serialization.
+
+RequestMetricsMiddleware measures a sampled share of requests and reports
+the metrics in Server-Timing header, requests slower than threshold are logged
+with their slowest queries. Queries are counted by execute wrapper of every
+database connection, other spans are measured by InstrumentedViewMixin and
+serializers with TimedSerializerMixin.
+Unsampled requests cost one random number and a context variable lookup per query.
+"""
+import heapq
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+
+class RequestMetrics:
+    def __init__(self, slow_queries_limit: int):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        # name of span -> seconds
+        self.spans: dict[str, float] = {}
+        self.slow_queries_limit = slow_queries_limit
+        # min-heap of (seconds, sql) keeping the slowest queries
+        self._slow_queries: list[tuple[float, str]] = []
+
+    def add_query(self, sql: str, duration: float) -> None:
+        self.queries += 1
+        self.db_time += duration
+        if len(self._slow_queries) < self.slow_queries_limit:
+            heapq.heappush(self._slow_queries, (duration, sql))
+        elif self._slow_queries and duration > self._slow_queries[0][0]:
+            heapq.heapreplace(self._slow_queries, (duration, sql))
+
+    def add_span(self, name: str, duration: float) -> None:
+        self.spans[name] = self.spans.get(name, 0.0) + duration
+
+    def get_slow_queries(self) -> list[tuple[float, str]]:
+        return sorted(self._slow_queries, reverse=True)
+
+    def get_total_time(self) -> float:
+        return time.perf_counter() - self.start
+
+    def get_server_timing(self) -> str:
+        entries = [f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"']
+        entries += [f"{name};dur={duration * 1000:.1f}" for name, duration in self.spans.items()]
+        entries.append(f"total;dur={self.get_total_time() * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_request_metrics: ContextVar[RequestMetrics | None] = ContextVar("request_metrics", default=None)
+
+
+def get_request_metrics() -> RequestMetrics | None:
+    """Return metrics of current request, None if it is not measured."""
+    return _request_metrics.get()
+
+
+@contextmanager
+def timed(name: str):
+    """Add time of block to span of current request if it is measured."""
+    metrics = _request_metrics.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_span(name, time.perf_counter() - start)
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _request_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(sql, time.perf_counter() - start)
+
+
+@receiver(connection_created)
+def _install_query_recorder(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+class RequestMetricsMiddleware:
+    """Measure sampled requests, see module docstring."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # connections opened before the middleware was loaded
+        for connection in connections.all(initialized_only=True):
+            _install_query_recorder(sender=None, connection=connection)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._is_sampled():
+            return self.get_response(request)
+        token = _request_metrics.set(self._create_metrics())
+        try:
+            response = self.get_response(request)
+            self._report(request, response)
+            return response
+        finally:
+            _request_metrics.reset(token)
+
+    async def __acall__(self, request):
+        if not self._is_sampled():
+            return await self.get_response(request)
+        token = _request_metrics.set(self._create_metrics())
+        try:
+            response = await self.get_response(request)
+            self._report(request, response)
+            return response
+        finally:
+            _request_metrics.reset(token)
+
+    @staticmethod
+    def _is_sampled() -> bool:
+        return random.random() < settings.REQUEST_METRICS["SAMPLE_RATE"]
+
+    @staticmethod
+    def _create_metrics() -> RequestMetrics:
+        return RequestMetrics(slow_queries_limit=settings.REQUEST_METRICS["SLOW_QUERIES"])
+
+    @staticmethod
+    def _report(request, response) -> None:
+        metrics = _request_metrics.get()
+        # queries of streamed body are made after headers are sent and are not counted
+        response["Server-Timing"] = metrics.get_server_timing()
+        total_time = metrics.get_total_time()
+        if total_time * 1000 < settings.REQUEST_METRICS["SLOW_REQUEST_MS"]:
+            return
+        slow_queries = "".join(f"\n  {duration * 1000:.1f} ms: {sql[:500]}"
+                               for duration, sql in metrics.get_slow_queries())
+        logger.warning("Slow request %s %s: %s %.1f ms, %d queries in %.1f ms%s",
+                       request.method, request.get_full_path(), response.status_code, total_time * 1000,
+                       metrics.queries, metrics.db_time * 1000, slow_queries)
+
+
+_serializing: ContextVar[bool] = ContextVar("serializing", default=False)
+
+
+@contextmanager
+def timed_serialization():
+    """Add time of block to 'serialize' span, serialization nested into it is not counted twice."""
+    if _request_metrics.get() is None or _serializing.get():
+        yield
+        return
+    token = _serializing.set(True)
+    try:
+        with timed("serialize"):
+            yield
+    finally:
+        _serializing.reset(token)
+
+
+class TimedSerializerMixin:
+    """Measure to_representation of serializer in measured requests, it goes before base serializer class."""
+
+    def to_representation(self, instance):
+        with timed_serialization():
+            return super().to_representation(instance)
+
+
+class InstrumentedViewMixin:
+    """Measure permission checks and rendering of DRF view in measured requests."""
+
+    def check_permissions(self, request):
+        with timed("permissions"):
+            return super().check_permissions(request)
+
+    def check_object_permissions(self, request, obj):
+        with timed("permissions"):
+            return super().check_object_permissions(request, obj)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        # response is rendered here instead of handler, so rendering is measured apart from view
+        if _request_metrics.get() is not None and hasattr(response, "render") and not response.is_rendered:
+            with timed("render"):
+                response.render()
+        return response
+
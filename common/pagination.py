@@ -0,0 +1,167 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Opt-in keyset (cursor) pagination.
+
+    If opt_in is set, pagination is enabled only if request has 'cursor' or 'page_size'
+    query param, otherwise list is returned as before. Position of the next page is an opaque cursor
+    with values of ordering fields of the last row, so every page costs one indexed range scan
+    regardless of its depth.
+    """
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    ordering_query_param = "ordering"
+    invalid_cursor_message = "Invalid cursor"
+    opt_in = True
+
+    # name from query param -> fields; all fields of one ordering must have the same direction
+    # and the last one must be unique
+    orderings: dict[str, tuple[str, ...]] = {
+        "id": ("id",),
+    }
+    default_ordering = "id"
+
+    def __init__(self):
+        self.request: Request | None = None
+        self.ordering_name = self.default_ordering
+        self.next_position: list | None = None
+
+    def paginate_queryset(self, queryset: QuerySet, request: Request, view=None) -> list | None:
+        if not self._is_requested(request):
+            return None
+        page_size = self.get_page_size(request)
+        results = list(self._get_page_queryset(queryset, request, page_size))
+        return self._cut_page(results, page_size)
+
+    async def apaginate_queryset(self, queryset: QuerySet, request: Request) -> list | None:
+        """Same as paginate_queryset for async views."""
+        if not self._is_requested(request):
+            return None
+        page_size = self.get_page_size(request)
+        results = [row async for row in self._get_page_queryset(queryset, request, page_size)]
+        return self._cut_page(results, page_size)
+
+    def _get_page_queryset(self, queryset: QuerySet, request: Request, page_size: int) -> QuerySet:
+        """Return queryset of page with one extra row showing that next page exists."""
+        self.request = request
+        self.ordering_name = self._get_ordering_name(request)
+        ordering = self.orderings[self.ordering_name]
+
+        queryset = queryset.order_by(*ordering)
+        position = self._decode_cursor(request, queryset)
+        if position is not None:
+            queryset = queryset.filter(_get_after_position_filter(ordering, position))
+        return queryset[:page_size + 1]
+
+    def _cut_page(self, results: list, page_size: int) -> list:
+        page = results[:page_size]
+        self.next_position = None
+        if len(results) > page_size:
+            ordering = self.orderings[self.ordering_name]
+            self.next_position = [_get_field_value(page[-1], field) for field in ordering]
+        return page
+
+    def get_paginated_response(self, data) -> Response:
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_next_link(self) -> str | None:
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self._encode_cursor(self.next_position))
+
+    def get_page_size(self, request: Request) -> int:
+        default_page_size = settings.PAGINATION["PAGE_SIZE"]
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, default_page_size))
+        except ValueError:
+            return default_page_size
+        if page_size <= 0:
+            return default_page_size
+        return min(page_size, settings.PAGINATION["MAX_PAGE_SIZE"])
+
+    def _is_requested(self, request: Request) -> bool:
+        if not self.opt_in:
+            return True
+        return (self.cursor_query_param in request.query_params or
+                self.page_size_query_param in request.query_params)
+
+    def _get_ordering_name(self, request: Request) -> str:
+        ordering_name = request.query_params.get(self.ordering_query_param, self.default_ordering)
+        if ordering_name not in self.orderings:
+            raise ValidationError({self.ordering_query_param: f"Must be one of {list(self.orderings)}"})
+        return ordering_name
+
+    def _encode_cursor(self, position: list) -> str:
+        # dates are encoded in ISO format and parsed back by their model fields
+        data = json.dumps({"o": self.ordering_name, "p": position}, separators=(",", ":"), cls=DjangoJSONEncoder)
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def _decode_cursor(self, request: Request, queryset: QuerySet) -> list | None:
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            ordering_name, position = data["o"], data["p"]
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(ordering_name, str) or not isinstance(position, list):
+            raise NotFound(self.invalid_cursor_message)
+        ordering = self.orderings[self.ordering_name]
+        if ordering_name != self.ordering_name or len(position) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            return [_to_python(queryset, field, value) for field, value in zip(ordering, position)]
+        except (DjangoValidationError, ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+def _to_python(queryset: QuerySet, field: str, value):
+    """Convert value of cursor to type of ordering field, which is a model field or an annotation.
+
+    :raises ValueError: If value is null, ordering fields are not nullable
+    """
+    if value is None:
+        raise ValueError("Null position")
+    name = field.lstrip("-")
+    annotation = queryset.query.annotations.get(name)
+    model_field = annotation.output_field if annotation is not None else queryset.model._meta.get_field(name)
+    return model_field.to_python(value)
+
+
+def _get_field_value(row, field: str):
+    name = field.lstrip("-")
+    # rows of queryset.values() are dicts
+    if isinstance(row, dict):
+        return row[name]
+    return getattr(row, name)
+
+
+def _get_after_position_filter(ordering: tuple[str, ...], position: list) -> Q:
+    """Build filter of rows placed after position in ordering.
+
+    For (a, b) ascending it is 'a >= x AND (a > x OR b > y)', the first condition
+    lets database use range scan over index on (a, b).
+    """
+    field, *rest_fields = ordering
+    value, *rest_values = position
+    name = field.lstrip("-")
+    strict, loose = ("lt", "lte") if field.startswith("-") else ("gt", "gte")
+    if not rest_fields:
+        return Q(**{f"{name}__{strict}": value})
+    after_rest = _get_after_position_filter(tuple(rest_fields), rest_values)
+    return Q(**{f"{name}__{loose}": value}) & (Q(**{f"{name}__{strict}": value}) | after_rest)
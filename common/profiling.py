@@ -0,0 +1,85 @@
+"""Bounded on-disk ring buffer of cProfile dumps of single requests.
+
+Every profile is a pstats dump '<id>.prof' with metadata '<id>.json', ids grow with time.
+When there are more than MAX_PROFILES profiles, the oldest ones are removed.
+"""
+import cProfile
+import json
+import os
+import pstats
+import tempfile
+import time
+import uuid
+
+from django.conf import settings
+
+_PROFILE_SUFFIX = ".prof"
+_META_SUFFIX = ".json"
+
+
+def get_profiles_dir() -> str:
+    return settings.PROFILING["DIR"] or os.path.join(tempfile.gettempdir(), "blog-profiles")
+
+
+def save_profile(profiler: cProfile.Profile, meta: dict) -> str:
+    """Write stats of stopped profiler and its metadata, remove the oldest profiles over limit.
+
+    :returns: id of profile
+    """
+    directory = get_profiles_dir()
+    os.makedirs(directory, exist_ok=True)
+    profile_id = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+    profiler.dump_stats(_get_path(profile_id, _PROFILE_SUFFIX))
+    # metadata is written the last and atomically, profile without it is not listed
+    fd, temp_path = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, "w") as file:
+        json.dump({**meta, "id": profile_id, "created_at": time.time()}, file)
+    os.replace(temp_path, _get_path(profile_id, _META_SUFFIX))
+    _cull(settings.PROFILING["MAX_PROFILES"])
+    return profile_id
+
+
+def list_profiles() -> list[dict]:
+    """Return metadata of profiles, the newest first."""
+    profiles = []
+    for profile_id in sorted(_list_ids(), reverse=True):
+        try:
+            with open(_get_path(profile_id, _META_SUFFIX)) as file:
+                profiles.append(json.load(file))
+        except (OSError, ValueError):
+            # removed by another process
+            continue
+    return profiles
+
+
+def load_stats(profile_id: str, stream=None) -> pstats.Stats:
+    """Return stats of profile.
+
+    :raises FileNotFoundError: If there is no profile with profile_id
+    """
+    if os.sep in profile_id or profile_id not in _list_ids():
+        raise FileNotFoundError(profile_id)
+    return pstats.Stats(_get_path(profile_id, _PROFILE_SUFFIX), stream=stream)
+
+
+def _cull(max_profiles: int) -> None:
+    profile_ids = sorted(_list_ids())
+    for profile_id in profile_ids[:max(len(profile_ids) - max_profiles, 0)]:
+        for suffix in (_META_SUFFIX, _PROFILE_SUFFIX):
+            try:
+                os.remove(_get_path(profile_id, suffix))
+            except FileNotFoundError:
+                pass
+
+
+def _list_ids() -> list[str]:
+    try:
+        entries = os.scandir(get_profiles_dir())
+    except FileNotFoundError:
+        return []
+    with entries:
+        return [entry.name[:-len(_META_SUFFIX)] for entry in entries if entry.name.endswith(_META_SUFFIX)]
+
+
+def _get_path(profile_id: str, suffix: str) -> str:
+    return os.path.join(get_profiles_dir(), profile_id + suffix)
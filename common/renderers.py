@@ -0,0 +1,46 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnList
+
+
+class PreRenderedList(ReturnList):
+    """List of serialized items which also keeps their compact JSON rendered beforehand."""
+
+    def __init__(self, *args, fragments: list[bytes], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fragments = fragments
+
+
+class PreRenderedJSONRenderer(JSONRenderer):
+    """JSONRenderer joining fragments of PreRenderedList instead of encoding its items again.
+
+    PreRenderedList may be the data itself or a value of data dict, e.g. 'results' of a page.
+    Indented output is rendered as usual.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if isinstance(data, PreRenderedList):
+            return self._join(data)
+        if isinstance(data, dict) and any(isinstance(value, PreRenderedList) for value in data.values()):
+            items = (super(PreRenderedJSONRenderer, self).render(key) + b":" + self._render_value(value)
+                     for key, value in data.items())
+            return b"{" + b",".join(items) + b"}"
+        return super().render(data, accepted_media_type, renderer_context)
+
+    def _render_value(self, value) -> bytes:
+        if isinstance(value, PreRenderedList):
+            return self._join(value)
+        # JSONRenderer renders None as empty body
+        if value is None:
+            return b"null"
+        return super().render(value)
+
+    @staticmethod
+    def _join(data: PreRenderedList) -> bytes:
+        return b"[" + b",".join(data.fragments) + b"]"
+
+
+def render_json_fragment(data) -> bytes:
+    """Render data as PreRenderedJSONRenderer renders it."""
+    return JSONRenderer().render(data)
@@ -0,0 +1,349 @@
+"""Cache of rendered GET responses of viewsets, invalidated on writes.
+
+Key of a response includes versions of its tags, e.g. 'posts:5' or 'posts:list'.
+Writes replace versions of tags of changed objects with new random ones, so
+stale responses can't be read anymore and are evicted as least recently used.
+
+Versions are replaced only in the cache of the writing process, so processes of one host
+share FileResponseCache and other caches are bounded only by RESPONSE_CACHE['TTL'].
+"""
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from stat import S_IWGRP, S_IWOTH
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse, HttpResponseBase
+from django.utils.cache import get_conditional_response
+from django.utils.module_loading import import_string
+from django.utils.http import parse_http_date_safe
+
+
+class ResponseCache:
+    """Size-bounded LRU of JSON serializable values and bytes with hit, miss and eviction counters.
+
+    :param ttl: seconds after which an entry expires, entries don't expire if None
+    """
+
+    def __init__(self, max_size: int, location: str | None = None, ttl: float | None = None):
+        self.max_size = max_size
+        self.location = location
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, count: bool = True):
+        """Return value of key or None.
+
+        :param count: count the lookup as hit or miss
+        """
+        value = self._get(key)
+        if value is not None:
+            expires_at, value = value
+            if expires_at is not None and expires_at <= time.time():
+                value = None
+        if not count:
+            return value
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value) -> None:
+        expires_at = None if self.ttl is None else time.time() + self.ttl
+        evicted = self._set(key, (expires_at, value))
+        if evicted:
+            with self._lock:
+                self.evictions += evicted
+
+    def clear(self) -> None:
+        self._clear()
+        with self._lock:
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": len(self)}
+
+    def _get(self, key: str):
+        raise NotImplementedError
+
+    def _set(self, key: str, value) -> int:
+        """Store value and return number of evicted entries."""
+        raise NotImplementedError
+
+    def _clear(self) -> None:
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+class LocMemResponseCache(ResponseCache):
+    """Cache in memory of process."""
+
+    def __init__(self, max_size: int, location: str | None = None, ttl: float | None = None):
+        super().__init__(max_size, location, ttl)
+        self._entries: OrderedDict[str, object] = OrderedDict()
+
+    def _get(self, key: str):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def _set(self, key: str, value) -> int:
+        evicted = 0
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                evicted += 1
+        return evicted
+
+    def _clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FileResponseCache(ResponseCache):
+    """Cache in directory 'location' shared by processes of one host.
+
+    Every entry is a JSON file, time of its modification is time of the last access. Directory
+    is created only accessible by its owner and is refused if it is owned or writable by another user.
+    Entries over max_size are removed every cull_interval writes of process, so the directory
+    may exceed max_size by that number of entries of every process.
+    """
+    suffix = ".cache"
+
+    def __init__(self, max_size: int, location: str | None = None, ttl: float | None = None):
+        super().__init__(max_size, location or os.path.join(tempfile.gettempdir(), "blog-response-cache"), ttl)
+        os.makedirs(self.location, mode=0o700, exist_ok=True)
+        _check_private_directory(self.location)
+        self.cull_interval = max(1, max_size // 100)
+        self._writes = 0
+
+    def _get(self, key: str):
+        path = self._get_path(key)
+        try:
+            with open(path, "rb") as file:
+                value = _loads(file.read())
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return value
+
+    def _set(self, key: str, value) -> int:
+        # entry is written into temporary file and renamed, so readers never see a part of it
+        fd, temp_path = tempfile.mkstemp(dir=self.location)
+        with os.fdopen(fd, "wb") as file:
+            file.write(_dumps(value))
+        os.replace(temp_path, self._get_path(key))
+        with self._lock:
+            self._writes += 1
+            if self._writes < self.cull_interval:
+                return 0
+            self._writes = 0
+        return self._cull()
+
+    def _cull(self) -> int:
+        paths = self._list_paths()
+        if len(paths) <= self.max_size:
+            return 0
+        paths.sort(key=_get_mtime)
+        evicted = 0
+        for path in paths[:len(paths) - self.max_size]:
+            try:
+                os.remove(path)
+                evicted += 1
+            except FileNotFoundError:
+                # removed by another process
+                pass
+        return evicted
+
+    def _clear(self) -> None:
+        for path in self._list_paths():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _get_path(self, key: str) -> str:
+        name = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(self.location, name + self.suffix)
+
+    def _list_paths(self) -> list[str]:
+        return [entry.path for entry in os.scandir(self.location) if entry.name.endswith(self.suffix)]
+
+    def __len__(self):
+        return len(self._list_paths())
+
+
+def _check_private_directory(path: str) -> None:
+    """Refuse directory which another user can plant entries into.
+
+    :raises ImproperlyConfigured: If directory is a symlink, is owned by another user or is writable by others
+    """
+    stat = os.lstat(path)
+    if (not os.path.isdir(path) or os.path.islink(path) or stat.st_uid != os.getuid()
+            or stat.st_mode & (S_IWGRP | S_IWOTH)):
+        raise ImproperlyConfigured(f"Directory of response cache {path} must be owned and writable only by "
+                                   f"user of the app")
+
+
+def _dumps(value) -> bytes:
+    return json.dumps(value, default=_encode_bytes, separators=(",", ":")).encode()
+
+
+def _loads(data: bytes):
+    return json.loads(data, object_hook=_decode_bytes)
+
+
+_BYTES_KEY = "__bytes__"
+
+
+def _encode_bytes(value) -> dict:
+    if isinstance(value, bytes):
+        return {_BYTES_KEY: base64.b64encode(value).decode()}
+    raise TypeError(f"{type(value).__name__} can't be stored in response cache")
+
+
+def _decode_bytes(value: dict):
+    if value.keys() == {_BYTES_KEY}:
+        return base64.b64decode(value[_BYTES_KEY])
+    return value
+
+
+def _get_mtime(path: str) -> float:
+    try:
+        return os.path.getmtime(path)
+    except FileNotFoundError:
+        return 0
+
+
+response_cache: ResponseCache = import_string(settings.RESPONSE_CACHE["BACKEND"])(
+    max_size=settings.RESPONSE_CACHE["MAX_SIZE"],
+    location=settings.RESPONSE_CACHE["LOCATION"],
+    ttl=settings.RESPONSE_CACHE["TTL"],
+)
+
+
+def get_response_cache_stats() -> dict[str, int]:
+    return response_cache.stats()
+
+
+def clear_response_cache() -> None:
+    response_cache.clear()
+
+
+def invalidate_responses(tags: Iterable[str]) -> None:
+    """Make cached responses with any of tags stale."""
+    for tag in tags:
+        response_cache.set(_get_version_key(tag), uuid.uuid4().hex)
+
+
+def _get_version(tag: str) -> str:
+    version = response_cache.get(_get_version_key(tag), count=False)
+    if version is None:
+        # version was never set or evicted, new one doesn't match responses cached before
+        version = uuid.uuid4().hex
+        response_cache.set(_get_version_key(tag), version)
+    return version
+
+
+def _get_version_key(tag: str) -> str:
+    return f"version:{tag}"
+
+
+class ResponseCacheMixin:
+    """Serve list and retrieve from response_cache.
+
+    Responses are cached per set of permission classes granting the request, not per user,
+    so they must not depend on user otherwise. Only JSON is cached, because pages of browsable API
+    contain username and CSRF token. Tags of responses are returned by get_cache_tags.
+    """
+    cache_name: str = None
+    cache_actions = ("list", "retrieve")
+
+    def get_cache_tags(self) -> list[str] | None:
+        """Return tags of response of current action, None if it must not be cached."""
+        if self.action == "list":
+            if self.is_stream_requested(self.request):
+                return None
+            return [f"{self.cache_name}:list"]
+        return [f"{self.cache_name}:{self.kwargs[self.lookup_url_kwarg or self.lookup_field]}"]
+
+    def get_cache_scope(self) -> list[str]:
+        """Return names of permission classes granting the request."""
+        return [type(permission).__name__ for permission in self.get_permissions()
+                if permission.has_permission(self.request, self)]
+
+    def _get_cached_response(self, get_response: Callable[[], HttpResponseBase]) -> HttpResponseBase:
+        tags = None
+        if self.action in self.cache_actions and self.request.accepted_renderer.format == "json":
+            tags = self.get_cache_tags()
+        if tags is None:
+            return get_response()
+        key = self._get_cache_key(tags)
+        entry = response_cache.get(key)
+        if entry is not None:
+            return self._get_response_from_entry(entry)
+
+        response = get_response()
+        if response.status_code == 200:
+            response.add_post_render_callback(lambda rendered: self._store(key, rendered))
+        response["X-Cache"] = "MISS"
+        return response
+
+    def _get_cache_key(self, tags: list[str]) -> str:
+        data = [
+            self.cache_name,
+            self.action,
+            self.get_cache_scope(),
+            self.request.get_full_path(),
+            [_get_version(tag) for tag in tags],
+        ]
+        return "response:" + hashlib.sha1(json.dumps(data).encode()).hexdigest()
+
+    @staticmethod
+    def _store(key: str, response: HttpResponse) -> None:
+        headers = {name: response[name] for name in ("ETag", "Last-Modified") if response.has_header(name)}
+        response_cache.set(key, {
+            "content": response.content,
+            "content_type": response["Content-Type"],
+            "headers": headers,
+        })
+
+    def _get_response_from_entry(self, entry: dict) -> HttpResponseBase:
+        headers = entry["headers"]
+        last_modified = parse_http_date_safe(headers["Last-Modified"]) if "Last-Modified" in headers else None
+        response = get_conditional_response(self.request, etag=headers.get("ETag"), last_modified=last_modified)
+        if response is None:
+            response = HttpResponse(entry["content"], content_type=entry["content_type"])
+        for name, value in headers.items():
+            response[name] = value
+        response["X-Cache"] = "HIT"
+        return response
+
+    # defined after annotations with list[...] which they would shadow
+    def list(self, request, *args, **kwargs):
+        return self._get_cached_response(lambda: super(ResponseCacheMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._get_cached_response(lambda: super(ResponseCacheMixin, self).retrieve(request, *args, **kwargs))
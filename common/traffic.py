@@ -0,0 +1,145 @@
+"""Recorded traffic: capture of sampled requests into JSON lines and reading them for replay.
+
+Every line is a record like
+    {"method": "POST", "path": "/posts/?fields=id", "content_type": "application/json",
+     "body": "{...}", "role": "writer", "status": 201}
+Role is 'anonymous', 'user' for a user without roles, or the highest role of user,
+credentials are never recorded. Passwords in JSON and form bodies are replaced with
+REDACTED_PASSWORD, which passes validation, so registrations can be replayed.
+"""
+import json
+import random
+import threading
+from collections.abc import Iterator
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import RequestDataTooBig
+from django.http import QueryDict
+
+from Auth.enums import Role
+from Auth.roles import get_user_roles
+from common.views import is_superuser
+
+ANONYMOUS = "anonymous"
+USER = "user"
+REDACTED_PASSWORD = "<PasSWORD1>"
+_REDACTED_FIELDS = ("password",)
+_RECORDED_CONTENT_TYPES = ("application/json", "application/x-www-form-urlencoded")
+
+
+def get_request_role(user: User) -> str:
+    """Return role of user in records."""
+    if not user.is_authenticated:
+        return ANONYMOUS
+    if is_superuser(user):
+        return Role.SUPERUSER.value
+    roles = get_user_roles(user)
+    ordered_roles = [role.value for role in Role if role != Role.SUPERUSER and role in roles]
+    return ordered_roles[-1] if ordered_roles else USER
+
+
+def read_records(path: str) -> Iterator[dict]:
+    """Yield records of file, empty lines are skipped.
+
+    :raises ValueError: If a line is not a record
+    """
+    with open(path) as file:
+        for number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if not isinstance(record, dict) or not {"method", "path"} <= record.keys():
+                raise ValueError(f"Line {number} of {path} is not a request record")
+            record.setdefault("body", None)
+            record.setdefault("content_type", None)
+            record.setdefault("role", ANONYMOUS)
+            yield record
+
+
+class TrafficCaptureMiddleware:
+    """Append sampled requests to TRAFFIC_CAPTURE['PATH'] as records.
+
+    Body is read before the view, so it must be placed before middlewares reading request.POST.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._lock = threading.Lock()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._is_sampled():
+            return self.get_response(request)
+        body = self._get_body(request)
+        response = self.get_response(request)
+        self._write(self._get_record(request, body, response.status_code))
+        return response
+
+    async def __acall__(self, request):
+        if not self._is_sampled():
+            return await self.get_response(request)
+        body = self._get_body(request)
+        response = await self.get_response(request)
+        record = await sync_to_async(self._get_record)(request, body, response.status_code)
+        await sync_to_async(self._write)(record)
+        return response
+
+    @staticmethod
+    def _is_sampled() -> bool:
+        return random.random() < settings.TRAFFIC_CAPTURE["SAMPLE_RATE"]
+
+    @staticmethod
+    def _get_body(request) -> str | None:
+        """Return redacted body of request, None if it is empty or can't be recorded."""
+        # multipart and other bodies may contain files, they are not read
+        if request.content_type not in _RECORDED_CONTENT_TYPES:
+            return None
+        try:
+            body = request.body.decode()
+        except (RequestDataTooBig, UnicodeDecodeError):
+            return None
+        if not body:
+            return None
+        if request.content_type == "application/json":
+            try:
+                data = json.loads(body)
+            except ValueError:
+                return body
+            return json.dumps(_redact(data))
+        data = QueryDict(body, mutable=True)
+        for name in _REDACTED_FIELDS:
+            if name in data:
+                data.setlist(name, [REDACTED_PASSWORD] * len(data.getlist(name)))
+        return data.urlencode()
+
+    @staticmethod
+    def _get_record(request, body: str | None, status: int) -> dict:
+        # DRF sets user authenticated by view on request
+        return {
+            "method": request.method,
+            "path": request.get_full_path(),
+            "content_type": request.content_type if body is not None else None,
+            "body": body,
+            "role": get_request_role(request.user) if hasattr(request, "user") else ANONYMOUS,
+            "status": status,
+        }
+
+    def _write(self, record: dict) -> None:
+        line = json.dumps(record) + "\n"
+        with self._lock, open(settings.TRAFFIC_CAPTURE["PATH"], "a") as file:
+            file.write(line)
+
+
+def _redact(data):
+    if isinstance(data, dict):
+        return {key: REDACTED_PASSWORD if key in _REDACTED_FIELDS else _redact(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [_redact(value) for value in data]
+    return data
@@ -1,10 +1,27 @@
+import cProfile
+import hashlib
+import json
+import time
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from datetime import datetime
+
+from django.db.models import Count, Max
+from django.db.models.functions import Greatest
+from django.http import HttpResponseBase, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from rest_framework.authtoken.admin import User
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.mixins import CreateModelMixin
 from rest_framework.viewsets import ModelViewSet
 
 from Auth.enums import Role
-from Auth.models import UserWithRoles
+from Auth.roles import user_have_role
+from common.instrumentation import InstrumentedViewMixin
+from common.profiling import save_profile
 
 
 def return_id_only(response: Response) -> Response:
@@ -19,7 +36,262 @@ class ReturnIdOnlyInCreateMixin(CreateModelMixin):
         return create_result
 
 
-class ModelViewSetWithCustomMixin(ModelViewSet, ReturnIdOnlyInCreateMixin):
+class StreamingListMixin:
+    """Stream list as JSON array if request has query param 'stream=true'.
+
+    Queryset is read with server-side cursor chunk by chunk and every chunk is written
+    into response as soon as it is serialized, so memory doesn't depend on size of list.
+    Streamed list is never paginated.
+    """
+    stream_query_param = "stream"
+    stream_chunk_size = 2000
+
+    def list(self, request, *args, **kwargs):
+        if self.is_stream_requested(request):
+            queryset = self.filter_queryset(self.get_queryset())
+            return self.get_streaming_response(queryset)
+        return super().list(request, *args, **kwargs)
+
+    def is_stream_requested(self, request) -> bool:
+        return request.query_params.get(self.stream_query_param, "").lower() in ("1", "true")
+
+    def get_streaming_response(self, queryset, to_representation: Callable = None) -> StreamingHttpResponse:
+        """Return response streaming queryset.
+
+        :param queryset: queryset to stream
+        :param to_representation: converts instance to data, serializer of view by default
+        """
+        if to_representation is None:
+            to_representation = self.get_serializer().to_representation
+        rows = queryset.iterator(chunk_size=self.stream_chunk_size)
+        content = stream_json_array(rows, to_representation, self.stream_chunk_size)
+        return StreamingHttpResponse(content, content_type="application/json")
+
+
+def stream_json_array(rows: Iterable, to_representation: Callable, chunk_size: int) -> Iterator[bytes]:
+    encoder = JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    yield b"["
+    chunk = []
+    is_first_chunk = True
+    for row in rows:
+        chunk.append(encoder.encode(to_representation(row)))
+        if len(chunk) == chunk_size:
+            yield _join_json_chunk(chunk, is_first_chunk)
+            chunk = []
+            is_first_chunk = False
+    if chunk:
+        yield _join_json_chunk(chunk, is_first_chunk)
+    yield b"]"
+
+
+def _join_json_chunk(chunk: list[str], is_first_chunk: bool) -> bytes:
+    joined = ",".join(chunk)
+    if not is_first_chunk:
+        joined = "," + joined
+    return joined.encode()
+
+
+class SparseFieldsetsMixin:
+    """Return only fields listed in query param 'fields', e.g. 'fields=id,title'.
+
+    Fields are validated against readable fields of serializer, only columns of them
+    are loaded from database. Writes ignore the param.
+    """
+    fields_query_param = "fields"
+
+    def get_queryset(self):
+        return self.select_requested_fields(super().get_queryset())
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        fields = self.get_requested_fields()
+        if fields is not None:
+            child = getattr(serializer, "child", serializer)
+            for name in list(child.fields):
+                if name not in fields:
+                    child.fields.pop(name)
+        return serializer
+
+    def get_requested_fields(self) -> tuple[str, ...] | None:
+        """Return fields from query param or None if all fields are requested.
+
+        :raises ValidationError: If a field is not readable field of serializer
+        """
+        request = getattr(self, "request", None)
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+        value = request.query_params.get(self.fields_query_param)
+        if value is None:
+            return None
+        fields = tuple(name for name in value.split(",") if name)
+        readable_fields = self.get_readable_fields()
+        if not fields or any(name not in readable_fields for name in fields):
+            raise ValidationError({self.fields_query_param: f"Must be some of {readable_fields}"})
+        return fields
+
+    def get_readable_fields(self) -> list[str]:
+        serializer = self.get_serializer_class()()
+        return [name for name, field in serializer.fields.items() if not field.write_only]
+
+    def select_requested_fields(self, queryset):
+        """Defer columns of model fields which are not requested."""
+        fields = self.get_requested_fields()
+        if fields is None:
+            return queryset
+        serializer = self.get_serializer_class()()
+        sources = {serializer.fields[name].source for name in fields} | self.get_always_loaded_fields()
+        model_fields = {field.name for field in queryset.model._meta.concrete_fields}
+        return queryset.only(*(source for source in sources if source in model_fields))
+
+    def get_always_loaded_fields(self) -> set[str]:
+        """Return model fields loaded even if they are not requested."""
+        fields = set()
+        # rows of keyset pagination must have values of ordering fields
+        for ordering in getattr(self.paginator, "orderings", {}).values():
+            fields.update(field.lstrip("-") for field in ordering)
+        return fields
+
+
+class ConditionalGetMixin:
+    """Answer GET with 304 if client has actual version of retrieved object or list page.
+
+    Version is the latest value of last modified fields. Retrieve has strong ETag and Last-Modified, list has
+    only weak ETag of versions of its rows, because deletion of a row or rows shifting into the page
+    don't change the latest version. Unpaginated list is versioned by count and the latest version of its rows,
+    which are aggregated by one query. If-None-Match and If-Modified-Since are checked before serialization.
+    Streamed lists are not conditional.
+    """
+    last_modified_field = "updated_at"
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        last_modified = self.get_last_modified(instance)
+        if last_modified is None:
+            return Response(self.get_serializer(instance).data)
+        etag = quote_etag(self._get_versions_hash([(instance.pk, last_modified)]))
+        return self._get_conditional_response(etag, last_modified,
+                                              lambda: Response(self.get_serializer(instance).data))
+
+    def list(self, request, *args, **kwargs):
+        if self.is_stream_requested(request):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return self._get_unpaginated_list_response(queryset)
+        versions = [(row.pk, self.get_last_modified(row)) for row in page]
+        if any(last_modified is None for _, last_modified in versions):
+            return self._get_list_response(page, True)
+        etag = "W/" + quote_etag(self._get_versions_hash(versions))
+        return self._get_conditional_response(etag, None, lambda: self._get_list_response(page, True))
+
+    def get_last_modified_fields(self) -> Sequence[str] | None:
+        """Return lookups of fields whose latest value is version of object, None if it is unknown
+        and response is not conditional."""
+        return [self.last_modified_field]
+
+    def get_last_modified(self, instance) -> datetime | None:
+        """Return time of the last change of instance, None if it is unknown and response is not conditional."""
+        fields = self.get_last_modified_fields()
+        if fields is None:
+            return None
+        return max(_get_lookup_value(instance, field) for field in fields)
+
+    def get_always_loaded_fields(self) -> set[str]:
+        return {*super().get_always_loaded_fields(), self.last_modified_field}
+
+    def _get_unpaginated_list_response(self, queryset) -> HttpResponseBase:
+        fields = self.get_last_modified_fields()
+        if fields is None:
+            return self._get_list_response(queryset, False)
+        latest = Max(fields[0]) if len(fields) == 1 else Max(Greatest(*fields))
+        # 304 costs only this query, rows are loaded by serialization of changed list
+        aggregate = queryset.order_by().aggregate(count=Count("pk"), last_modified=latest)
+        etag = "W/" + quote_etag(self._get_versions_hash([(aggregate["count"], aggregate["last_modified"])]))
+        return self._get_conditional_response(etag, None, lambda: self._get_list_response(queryset, False))
+
+    def _get_list_response(self, rows: Iterable, is_paginated: bool) -> Response:
+        serializer = self.get_serializer(rows, many=True)
+        if is_paginated:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
+    def _get_conditional_response(self, etag: str, last_modified: datetime | None,
+                                  get_response: Callable[[], Response]) -> HttpResponseBase:
+        timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+        response = get_conditional_response(self.request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = get_response()
+        response["ETag"] = etag
+        if timestamp is not None:
+            response["Last-Modified"] = http_date(timestamp)
+        return response
+
+    def _get_versions_hash(self, versions: Sequence[tuple]) -> str:
+        # representation depends on query params, e.g. 'fields'
+        # latest version of empty list is None
+        versions = [(pk, last_modified and last_modified.isoformat()) for pk, last_modified in versions]
+        data = json.dumps([self.request.get_full_path(), versions])
+        return hashlib.sha1(data.encode()).hexdigest()
+
+
+def _get_lookup_value(instance, lookup: str):
+    for name in lookup.split("__"):
+        instance = getattr(instance, name)
+    return instance
+
+
+class ProfilingMixin:
+    """Run request of superuser under cProfile if it has header 'X-Profile: 1' or query param 'profile=1'.
+
+    Profile covers permission checks, handler and rendering, it is saved by common.profiling.save_profile
+    and its id is returned in header X-Profile-Id. The flag of other users is ignored.
+    """
+    profile_header = "HTTP_X_PROFILE"
+    profile_param = "profile"
+    _profiler: cProfile.Profile | None = None
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            # exception was not handled and response was not finalized
+            if self._profiler is not None:
+                self._profiler.disable()
+                self._profiler = None
+
+    def perform_authentication(self, request):
+        super().perform_authentication(request)
+        if self._is_profile_requested(request) and is_superuser(request.user):
+            self._profile_start = time.perf_counter()
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self._profiler is None:
+            return response
+        if hasattr(response, "render") and not response.is_rendered:
+            response.render()
+        self._profiler.disable()
+        profile_id = save_profile(self._profiler, {
+            "method": request.method,
+            "path": request.get_full_path(),
+            "view": f"{type(self).__name__}.{getattr(self, 'action', None) or request.method.lower()}",
+            "user": request.user.pk,
+            "status": response.status_code,
+            "duration_ms": (time.perf_counter() - self._profile_start) * 1000,
+        })
+        self._profiler = None
+        response["X-Profile-Id"] = profile_id
+        return response
+
+    def _is_profile_requested(self, request) -> bool:
+        return "1" in (request.META.get(self.profile_header), request.query_params.get(self.profile_param))
+
+
+class ModelViewSetWithCustomMixin(ProfilingMixin, InstrumentedViewMixin, SparseFieldsetsMixin, StreamingListMixin,
+                                  ModelViewSet, ReturnIdOnlyInCreateMixin):
     ...
 
 
@@ -32,11 +304,7 @@ def get_dict_from_request(request):
 
 
 def is_superuser(user: User) -> bool:
-    try:
-        user_roles = UserWithRoles.objects.get(user=user)
-    except UserWithRoles.DoesNotExist:
-        return False
-    return Role.SUPERUSER in user_roles.roles and user.is_superuser
+    return user.is_superuser and user_have_role(user, Role.SUPERUSER)
 
 
 def return_modified_response(response: Response, **kwargs) -> Response: